@@ -14,20 +14,23 @@ import urllib3
 sys.path.append('src')
 from config import load_config
 from config_loader import load_metrics_config
-from grafana_service import create_session, build_grafana_url, download_metric
-from utils import to_utc_iso
+from grafana_service import create_session_registry, build_grafana_url, download_metric
+from utils import to_utc_iso, setup_logging, LOG_LEVELS
+from profiling import profile_stage, profiler
 
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
+OUTPUT_DIR = "/tmp/grafana_test"
 
-def test_connection(cfg) -> bool:
-    import requests
+
+def test_connection(cfg, sessions) -> bool:
     base_url = cfg['grafana']['base_url']
     api_key = str(cfg['grafana']['api_key'])
     if not api_key.lower().startswith('bearer '):
         api_key = f"Bearer {api_key}"
     try:
-        resp = requests.get(f"{base_url}/api/health", headers={"Authorization": api_key}, verify=False, timeout=10)
+        resp = sessions.get(base_url).get(f"{base_url}/api/health", headers={"Authorization": api_key},
+                                          verify=False, timeout=10)
         if resp.status_code == 200:
             logging.info("✅ Grafana API connection successful")
             return True
@@ -45,7 +48,7 @@ def list_metrics(metrics):
         print(f"{i:2d}. {name}")
 
 
-def download_single_metric(cfg, metric):
+def download_single_metric(cfg, metric, sessions):
     metric_name = getattr(metric, 'name', None) or metric['name']
     base_url = cfg['grafana']['base_url']
     timezone = cfg['mainConfig']['timezone']
@@ -73,11 +76,11 @@ def download_single_metric(cfg, metric):
         api_key = f"Bearer {api_key}"
     headers = {"Authorization": api_key}
 
-    session = create_session()
-    output_dir = "/tmp/grafana_test"
-    os.makedirs(output_dir, exist_ok=True)
-    output_file = os.path.join(output_dir, f"{metric_name}.png")
-    ok = download_metric(session, url, headers, output_file)
+    session = sessions.get(url)
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    output_file = os.path.join(OUTPUT_DIR, f"{metric_name}.png")
+    with profile_stage("grafana.render"):
+        ok = download_metric(session, url, headers, output_file)
     if ok:
         logging.info(f"✅ Saved: {output_file}")
     else:
@@ -85,19 +88,38 @@ def download_single_metric(cfg, metric):
     return ok
 
 
-def main():
-    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+def main(argv=None):
     parser = argparse.ArgumentParser(description='Grafana debug client')
     parser.add_argument('--test-connection', action='store_true')
     parser.add_argument('--list-metrics', action='store_true')
     parser.add_argument('--test-metric', type=str)
-    args = parser.parse_args()
+    parser.add_argument('--profile', action='store_true',
+                        help=f'Profile stages (cProfile + tracemalloc), save to {OUTPUT_DIR}/profile')
+    parser.add_argument('--log-level', metavar='LEVEL', type=str.upper, choices=LOG_LEVELS,
+                        help='Console log level (DEBUG, INFO, WARNING...), default logging.level or INFO')
+    args = parser.parse_args(argv)
+    # Записи из очереди дописывает stop_logging, зарегистрированный в utils через atexit
+    setup_logging(level=args.log_level)
+    profiler.enabled = args.profile
+    try:
+        run(parser, args)
+    finally:
+        profile_dir = profiler.write(OUTPUT_DIR)
+        if profile_dir:
+            logging.info(f"Profiles saved: {profile_dir}")
+
 
-    cfg = load_config('config.yml')
-    metrics = load_metrics_config(cfg['grafana']['metrics_config'])
+def run(parser, args):
+    with profile_stage("config.load"):
+        cfg = load_config('config.yml')
+        metrics = load_metrics_config(cfg['grafana']['metrics_config'])
+    setup_logging(cfg.get('logging'), level=args.log_level)
+    # Рендер идёт в обход планировщика: повторы 5xx/обрывов делает HTTP-адаптер
+    sessions = create_session_registry(cfg, adapter_retries=True)
 
     if args.test_connection:
-        test_connection(cfg)
+        with profile_stage("connection"):
+            test_connection(cfg, sessions)
         return
 
     if args.list_metrics:
@@ -109,7 +131,7 @@ def main():
         if not m:
             logging.error(f"Metric '{args.test_metric}' not found")
             return
-        download_single_metric(cfg, m)
+        download_single_metric(cfg, m, sessions)
         return
 
     parser.print_help()
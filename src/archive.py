@@ -0,0 +1,303 @@
+import os
+import json
+import queue
+import shutil
+import logging
+import tarfile
+import tempfile
+import threading
+import warnings
+import zipfile
+from typing import Dict, List, Optional
+
+from utils import create_main_folder_name
+
+try:
+    import zstandard
+except ImportError:  # zstandard — необязательная зависимость: без неё формат tar.zst недоступен
+    zstandard = None
+
+_DEFAULT_ARCHIVE = {
+    'enabled': False,
+    'format': 'zip',         # zip | tar | tar.zst
+    'level': 3,              # Уровень сжатия: deflate 1–9 для zip, 1–22 для zstd
+    'staging_dir': '',       # Локальная папка для файлов до записи в архив (пусто — системная временная)
+    'keep_files': False,     # Не удалять файлы из staging после записи в архив
+}
+
+FORMATS = ('zip', 'tar', 'tar.zst')
+
+# Уже сжатые форматы: в zip хранятся без повторного сжатия
+_STORED_SUFFIXES = ('.png', '.jpg', '.jpeg', '.webp', '.avif', '.gz', '.zip', '.zst', '.woff', '.woff2')
+
+_BLOCK = tarfile.BLOCKSIZE
+_CHUNK = 1024 * 1024
+
+
+def archive_settings(cfg) -> dict:
+    """Настройки секции ``archive`` со значениями по умолчанию (tar.zst без zstandard заменяется на zip)."""
+    settings = dict(_DEFAULT_ARCHIVE)
+    settings.update(cfg.get('archive') or {})
+    if settings['format'] not in FORMATS:
+        raise ValueError(f"Неизвестный формат архива '{settings['format']}': ожидается один из {', '.join(FORMATS)}")
+    if settings['format'] == 'tar.zst' and zstandard is None:
+        logging.warning("⚠️  archive.format: tar.zst требует пакет zstandard — используем zip")
+        settings['format'] = 'zip'
+    return settings
+
+
+def output_root(cfg) -> str:
+    """
+    Папка, в которой создаются папки запусков.
+
+    В режиме архива файлы запуска сначала пишутся в локальную папку staging,
+    а в REPORTS_BASE_DIR попадает только архив с индексом.
+    """
+    settings = cfg.get('archive') or {}
+    if not settings.get('enabled'):
+        return cfg['main_folder']
+    return settings.get('staging_dir') or os.path.join(tempfile.gettempdir(), 'grafana-report-staging')
+
+
+def archive_path(cfg) -> str:
+    """Путь архива запуска: ``<REPORTS_BASE_DIR>/<from> <scenario> <type_of_script>.<формат>``."""
+    return os.path.join(cfg['main_folder'], f"{create_main_folder_name(cfg)}.{archive_settings(cfg)['format']}")
+
+
+def index_path(path: str) -> str:
+    """Путь индекса архива (JSON рядом с архивом)."""
+    return f"{path}.index.json"
+
+
+class ArchiveWriter:
+    """
+    Архив одного запуска, дописываемый по одному файлу.
+
+    Для каждого файла в индекс записывается смещение его данных: в zip — смещение
+    локального заголовка, в tar — смещение данных в потоке tar. В tar.zst каждый файл
+    сжимается отдельным кадром zstd, поэтому член архива читается без распаковки
+    всего потока (смещение и длина кадра хранятся в индексе). Не потокобезопасен:
+    пишет только поток RunArchives.
+
+    Существующий архив с индексом дописывается (например, -grafana после -gatling за то же
+    окно): файл с уже записанным именем добавляется ещё раз, и индекс указывает на новую копию.
+    Архив без индекса или другого формата не перезаписывается — это ошибка.
+    """
+
+    def __init__(self, path: str, fmt: str = 'zip', level: int = 3):
+        self.path = path
+        self.format = fmt
+        self.level = int(level)
+        self.members: Dict[str, dict] = {}
+        self.names = set()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        existing = os.path.exists(path)
+        if existing:
+            self.members = {member['name']: member for member in self._load_index()}
+            logging.info(f"🗜️  Дописываем существующий архив {path} (файлов: {len(self.members)})")
+        if fmt == 'zip':
+            self._zip = zipfile.ZipFile(path, 'a' if existing else 'w', allowZip64=True)
+        else:
+            self._file = open(path, 'r+b' if existing else 'wb')
+            if existing:
+                # Отрезаем завершающие блоки tar (и их кадр zstd): новые файлы пишутся после последнего
+                self._file.seek(self._data_end())
+                self._file.truncate()
+            self._compressor = zstandard.ZstdCompressor(level=self.level) if fmt == 'tar.zst' else None
+
+    def _load_index(self) -> List[dict]:
+        try:
+            with open(index_path(self.path), 'r', encoding='utf-8') as f:
+                index = json.load(f)
+        except FileNotFoundError:
+            raise FileExistsError(f"Архив {self.path} уже существует, но без индекса {index_path(self.path)}: "
+                                  f"дописать его нельзя, перезаписывать не будем") from None
+        if index['format'] != self.format:
+            raise ValueError(f"Архив {self.path} записан в формате {index['format']}, а archive.format — {self.format}")
+        return index['members']
+
+    def _data_end(self) -> int:
+        """Смещение конца данных последнего файла (до завершающих блоков tar)."""
+        end = 0
+        for member in self.members.values():
+            if self.format == 'tar.zst':
+                end = max(end, member['frame_offset'] + member['frame_size'])
+            else:
+                end = max(end, member['offset'] + member['size'] + (-member['size'] % _BLOCK))
+        return end
+
+    def add(self, arcname: str, source: str) -> None:
+        """Дописывает файл ``source`` под именем ``arcname`` (повторное имя в этой записи пропускается)."""
+        arcname = arcname.replace(os.sep, '/')
+        if arcname in self.names:
+            return
+        self.names.add(arcname)
+        size = os.path.getsize(source)
+        if self.format == 'zip':
+            stored = arcname.lower().endswith(_STORED_SUFFIXES)
+            with warnings.catch_warnings():
+                # Новая копия файла из прошлой записи: ZipFile читает последнюю запись с этим именем
+                warnings.filterwarnings('ignore', message='Duplicate name')
+                self._zip.write(source, arcname, compress_type=zipfile.ZIP_STORED if stored else zipfile.ZIP_DEFLATED,
+                                compresslevel=None if stored else self.level)
+            self.members.pop(arcname, None)
+            self.members[arcname] = {'name': arcname, 'size': size,
+                                     'offset': self._zip.getinfo(arcname).header_offset}
+            return
+
+        info = tarfile.TarInfo(arcname)
+        info.size = size
+        info.mtime = int(os.path.getmtime(source))
+        header = info.tobuf(tarfile.PAX_FORMAT, 'utf-8', 'surrogateescape')
+        padding = b'\0' * (-size % _BLOCK)
+        member = {'name': arcname, 'size': size}
+        if self._compressor is None:
+            member['offset'] = self._file.tell() + len(header)
+            self._file.write(header)
+            with open(source, 'rb') as src:
+                shutil.copyfileobj(src, self._file, _CHUNK)
+            self._file.write(padding)
+        else:
+            # Отдельный кадр zstd на файл: заголовок tar + данные + выравнивание
+            member['frame_offset'] = self._file.tell()
+            member['offset'] = len(header)
+            compressor = self._compressor.compressobj()
+            self._file.write(compressor.compress(header))
+            with open(source, 'rb') as src:
+                for chunk in iter(lambda: src.read(_CHUNK), b''):
+                    self._file.write(compressor.compress(chunk))
+            self._file.write(compressor.compress(padding) + compressor.flush())
+            member['frame_size'] = self._file.tell() - member['frame_offset']
+        self.members.pop(arcname, None)
+        self.members[arcname] = member
+
+    def close(self) -> str:
+        """Завершает архив и записывает индекс; возвращает путь индекса."""
+        if self.format == 'zip':
+            self._zip.close()
+        else:
+            end = b'\0' * (2 * _BLOCK)
+            self._file.write(self._compressor.compress(end) if self._compressor is not None else end)
+            self._file.close()
+        path = index_path(self.path)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'archive': os.path.basename(self.path), 'format': self.format,
+                       'members': list(self.members.values())},
+                      f, ensure_ascii=False, indent=1)
+        return path
+
+
+def read_member(path: str, name: str) -> bytes:
+    """
+    Читает один файл из архива запуска по индексу, не распаковывая остальные.
+
+    Raises:
+        KeyError: Если файла нет в индексе
+    """
+    with open(index_path(path), 'r', encoding='utf-8') as f:
+        index = json.load(f)
+    # При дописывании архива имя может встречаться несколько раз: действительна последняя копия
+    member = next((member for member in reversed(index['members']) if member['name'] == name), None)
+    if member is None:
+        raise KeyError(name)
+    if index['format'] == 'zip':
+        with zipfile.ZipFile(path) as archive:
+            return archive.read(name)
+    with open(path, 'rb') as f:
+        if index['format'] == 'tar':
+            f.seek(member['offset'])
+            return f.read(member['size'])
+        f.seek(member['frame_offset'])
+        frame = zstandard.ZstdDecompressor().decompressobj().decompress(f.read(member['frame_size']))
+    return frame[member['offset']:member['offset'] + member['size']]
+
+
+class RunArchives:
+    """
+    Архивы запусков с единственным потоком записи.
+
+    Стадии передают готовые файлы через ``add``/``add_tree`` в очередь; поток записи
+    дописывает их в архив того запуска, в папке которого лежит файл (запуски окружений —
+    в архив родительского запуска), и удаляет исходный файл из staging. ``close`` добавляет
+    всё, что осталось в папках запусков (тайминги, трассы), и записывает индексы.
+
+    С ``keep_until_close`` файлы остаются в staging до ``close``: по папке запуска после стадий
+    ещё строится сводный отчет (секция ``report``).
+    """
+
+    def __init__(self, runs, settings: dict, keep_until_close: bool = False):
+        self.settings = settings
+        self.keep_until_close = keep_until_close
+        self.writers: Dict[str, ArchiveWriter] = {}
+        for run in runs:
+            folder = os.path.normpath(run.folder)
+            self.writers[folder] = ArchiveWriter(archive_path(run.cfg), settings['format'], settings['level'])
+        self._queue: queue.Queue = queue.Queue()
+        self._thread = threading.Thread(target=self._write, name='archive-writer', daemon=True)
+        self._thread.start()
+
+    def _writer_for(self, path: str):
+        path = os.path.normpath(path)
+        for folder, writer in self.writers.items():
+            if path.startswith(folder + os.sep):
+                return folder, writer
+        return None, None
+
+    def add(self, path: str) -> None:
+        """Ставит файл в очередь записи (файлы вне папок запусков игнорируются)."""
+        self._queue.put(path)
+
+    def add_tree(self, folder: str) -> None:
+        """Ставит в очередь все файлы каталога."""
+        for root, _, files in os.walk(folder):
+            for name in sorted(files):
+                self.add(os.path.join(root, name))
+
+    def _write(self) -> None:
+        while True:
+            path = self._queue.get()
+            if path is None:
+                return
+            folder, writer = self._writer_for(path)
+            if writer is None or not os.path.isfile(path):
+                continue
+            try:
+                writer.add(os.path.relpath(path, folder), path)
+                if not self.settings['keep_files'] and not self.keep_until_close:
+                    os.remove(path)
+            except Exception as e:
+                logging.error(f"Не удалось добавить {path} в архив {writer.path}: {e}")
+
+    def close(self) -> List[str]:
+        """
+        Дописывает оставшиеся файлы запусков, завершает архивы и удаляет staging.
+
+        Returns:
+            list: Пути архивов
+        """
+        for folder in self.writers:
+            self.add_tree(folder)
+        self._queue.put(None)
+        self._thread.join()
+        paths = []
+        for folder, writer in self.writers.items():
+            writer.close()
+            if not self.settings['keep_files']:
+                shutil.rmtree(folder, ignore_errors=True)
+            logging.info(f"🗜️  Архив запуска: {writer.path} (файлов: {len(writer.members)}, "
+                         f"{os.path.getsize(writer.path) / 1024 / 1024:.1f} МБ)")
+            paths.append(writer.path)
+        return paths
+
+
+def open_run_archives(cfg, runs, keep_until_close: bool = False) -> Optional[RunArchives]:
+    """
+    Архивы запусков, если включена секция ``archive`` (иначе None).
+
+    Args:
+        keep_until_close (bool): Удалять файлы из staging только в ``close`` (нужны для сводного отчета)
+    """
+    settings = archive_settings(cfg)
+    if not settings['enabled']:
+        return None
+    return RunArchives(runs, settings, keep_until_close)
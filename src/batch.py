@@ -0,0 +1,198 @@
+import os
+import logging
+from dataclasses import dataclass
+from typing import List, Optional
+
+import yaml
+
+from config import deep_merge
+from archive import output_root
+from utils import create_main_folder, create_main_folder_name, ensure_file_exists, get_run_label
+
+# Поля запуска, которые попадают в mainConfig
+RUN_MAIN_KEYS = ('from', 'to', 'scenario', 'type_of_script', 'timezone')
+
+# Поля окружения, которые не являются переопределениями конфига
+ENVIRONMENT_KEYS = ('name', 'namespace', 'grafana_url', 'api_key', 'vars')
+
+
+@dataclass
+class Run:
+    """Один запуск пакета: итоговый конфиг, папка результатов и (опционально) имя отчёта Gatling."""
+    cfg: dict
+    folder: str
+    report: Optional[str] = None
+
+    @property
+    def label(self) -> str:
+        """Метка запуска — имя его основной папки (для окружения — ``<запуск>/<окружение>``)."""
+        return get_run_label(self.folder, self.cfg)
+
+
+def parse_run_spec(spec: str) -> dict:
+    """
+    Разбирает описание запуска из командной строки.
+
+    Формат: ``from|to[|scenario[|type_of_script[|report]]]``, например
+    ``"2025-12-09 13:03:39|2025-12-09 14:16:36|getById|35rps"``.
+
+    Returns:
+        dict: Описание запуска
+
+    Raises:
+        ValueError: Если не заданы from и to
+    """
+    parts = [part.strip() for part in spec.split('|')]
+    if len(parts) < 2 or not parts[0] or not parts[1]:
+        raise ValueError(f"Некорректное описание запуска '{spec}': ожидается from|to[|scenario[|type_of_script[|report]]]")
+    run = {'from': parts[0], 'to': parts[1]}
+    for key, value in zip(('scenario', 'type_of_script', 'report'), parts[2:]):
+        if value:
+            run[key] = value
+    return run
+
+
+def load_runs_file(path: str) -> List[dict]:
+    """
+    Загружает список запусков из YAML/JSON файла.
+
+    Файл содержит либо список запусков, либо словарь с ключом ``runs``.
+    Каждый запуск задаёт from/to и, при необходимости, scenario, type_of_script,
+    report (имя отчёта Gatling на сервере) и любые переопределения конфига (например, services).
+
+    Returns:
+        list: Список описаний запусков
+    """
+    ensure_file_exists(path)
+    with open(path, 'r', encoding='utf-8') as f:
+        data = yaml.safe_load(f) or []
+    runs = data.get('runs', []) if isinstance(data, dict) else data
+    if not isinstance(runs, list):
+        raise ValueError(f"Ожидается список запусков в {path}")
+    return runs
+
+
+def build_run_config(cfg: dict, run: dict) -> dict:
+    """
+    Формирует конфиг запуска: базовый конфиг + поля mainConfig и переопределения из описания.
+
+    Args:
+        cfg (dict): Базовый конфиг из config.yml
+        run (dict): Описание запуска
+
+    Returns:
+        dict: Новый конфиг (исходный не изменяется)
+    """
+    overrides = {key: value for key, value in run.items() if key not in RUN_MAIN_KEYS and key != 'report'}
+    overrides['mainConfig'] = deep_merge(overrides.get('mainConfig') or {},
+                                         {key: run[key] for key in RUN_MAIN_KEYS if key in run})
+    return deep_merge(cfg, overrides)
+
+
+def run_folder(cfg: dict, create: bool = True) -> str:
+    """
+    Папка запуска: ``<REPORTS_BASE_DIR>/<from> <scenario> <type_of_script>``.
+
+    В режиме архива (секция ``archive``) папка создаётся в локальной папке staging,
+    а в REPORTS_BASE_DIR записывается только архив запуска.
+    """
+    root_cfg = dict(cfg, main_folder=output_root(cfg))
+    if create:
+        return create_main_folder(root_cfg)
+    return os.path.join(root_cfg['main_folder'], create_main_folder_name(root_cfg))
+
+
+def plan_runs(cfg: dict, run_specs: List[dict], create: bool = True) -> List[Run]:
+    """
+    Готовит все запуски пакета: конфиги и папки результатов.
+
+    Без описаний запусков возвращает один запуск по mainConfig из config.yml.
+
+    Args:
+        cfg (dict): Базовый конфиг
+        run_specs (list): Описания запусков
+        create (bool): Создавать папки запусков (False — только вычислить пути, для --plan)
+
+    Returns:
+        list: Список Run в исходном порядке
+    """
+    if not run_specs:
+        return [Run(cfg=cfg, folder=run_folder(cfg, create))]
+
+    runs = []
+    seen_folders = set()
+    for run_spec in run_specs:
+        run_cfg = build_run_config(cfg, run_spec)
+        folder = run_folder(run_cfg, create)
+        if folder in seen_folders:
+            logging.warning(f"Несколько запусков пишут в одну папку: {folder}")
+        seen_folders.add(folder)
+        runs.append(Run(cfg=run_cfg, folder=folder, report=run_spec.get('report')))
+    return runs
+
+
+def build_environment_config(cfg: dict, environment: dict) -> dict:
+    """
+    Формирует конфиг окружения: конфиг запуска + хост Grafana, переменные и переопределения окружения.
+
+    ``namespace`` становится переменной ``var-namespace``, ``grafana_url``/``api_key`` —
+    адресом и ключом основной Grafana (и PostgreSQL-дашбордов, если их адрес не задан отдельно),
+    остальные поля — переопределениями конфига, как у запусков пакета.
+
+    Returns:
+        dict: Новый конфиг с секцией ``environment`` (name, vars) и без ``environments``
+
+    Raises:
+        ValueError: Если у окружения не задано имя
+    """
+    name = str(environment.get('name') or environment.get('namespace') or '')
+    if not name:
+        raise ValueError(f"У окружения не задано имя (name или namespace): {environment}")
+    env_vars = dict(environment.get('vars') or {})
+    if environment.get('namespace'):
+        env_vars.setdefault('var-namespace', environment['namespace'])
+
+    overrides = {key: value for key, value in environment.items() if key not in ENVIRONMENT_KEYS}
+    grafana = {key: environment[source] for key, source in (('base_url', 'grafana_url'), ('api_key', 'api_key'))
+               if environment.get(source)}
+    if grafana:
+        overrides['grafana'] = deep_merge(overrides.get('grafana') or {}, grafana)
+        postgresql_url = cfg.get('postgresql_grafana', {}).get('base_url')
+        if not postgresql_url or postgresql_url == cfg.get('grafana', {}).get('base_url'):
+            overrides['postgresql_grafana'] = deep_merge(overrides.get('postgresql_grafana') or {}, grafana)
+
+    env_cfg = deep_merge({key: value for key, value in cfg.items() if key != 'environments'}, overrides)
+    env_cfg['environment'] = {'name': name, 'vars': env_vars}
+    return env_cfg
+
+
+def expand_environments(runs: List[Run]) -> List[Run]:
+    """
+    Разворачивает запуски по окружениям из секции ``environments`` конфига.
+
+    Для каждого окружения создаётся запуск в подпапке ``<папка запуска>/<окружение>``
+    с метриками сервисов и PostgreSQL. Метрики Gatling не зависят от окружения и
+    остаются в папке самого запуска (один рендер на запуск). Все запуски затем
+    планируются вместе и выполняются одним планировщиком.
+
+    Returns:
+        list: Запуски без окружений — как есть, с окружениями — запуск Gatling метрик и запуски окружений
+    """
+    expanded = []
+    for run in runs:
+        environments = run.cfg.get('environments') or []
+        if not environments:
+            expanded.append(run)
+            continue
+        services = run.cfg.get('services', {})
+        if services.get('gatling_metrics_service', False):
+            # Метрики Gatling — один раз на запуск, в его основную папку
+            gatling_cfg = deep_merge(run.cfg, {'services': {'grafana_service': False}})
+            gatling_cfg.pop('environments', None)
+            expanded.append(Run(cfg=gatling_cfg, folder=run.folder, report=run.report))
+        for environment in environments:
+            env_cfg = build_environment_config(run.cfg, environment)
+            env_cfg = deep_merge(env_cfg, {'services': {'gatling_metrics_service': False}})
+            expanded.append(Run(cfg=env_cfg, folder=os.path.join(run.folder, env_cfg['environment']['name']),
+                                report=run.report))
+    return expanded
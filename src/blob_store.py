@@ -0,0 +1,192 @@
+import os
+import shutil
+import hashlib
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+_DEFAULT_BLOB_STORE = {
+    'enabled': False,
+    'path': '',              # Папка хранилища (пусто — <REPORTS_BASE_DIR>/.blobs)
+    'link': 'hardlink',      # hardlink | symlink
+    'workers': 4,            # Потоков для хеширования файлов запуска
+    'gc_min_age': 3600,      # Не удалять блобы, созданные позже, чем столько секунд назад
+}
+
+LINK_MODES = ('hardlink', 'symlink')
+
+_CHUNK = 1024 * 1024
+
+
+def blob_store_settings(cfg) -> dict:
+    """Настройки секции ``blob_store`` со значениями по умолчанию."""
+    settings = dict(_DEFAULT_BLOB_STORE)
+    settings.update(cfg.get('blob_store') or {})
+    if settings['link'] not in LINK_MODES:
+        raise ValueError(f"Неизвестный режим ссылок '{settings['link']}': ожидается hardlink или symlink")
+    if not settings['path']:
+        settings['path'] = os.path.join(cfg['main_folder'], '.blobs')
+    return settings
+
+
+def file_digest(path: str) -> str:
+    """SHA-256 содержимого файла (читается блоками)."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_CHUNK), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class BlobStore:
+    """
+    Хранилище артефактов запусков, адресуемое по содержимому.
+
+    Каждое уникальное содержимое хранится один раз в ``<path>/<xx>/<sha256>``; файлы
+    в папках запусков становятся жёсткими ссылками на блоб (или символическими, если
+    жёсткие ссылки недоступны). Блоб, на который больше не ссылается ни один запуск,
+    удаляется командой ``gc``: для жёстких ссылок это блоб с единственной ссылкой.
+
+    Файлы запусков после ``ingest`` разделяют содержимое с другими запусками,
+    поэтому перед повторной записью в ту же папку вызывается ``detach_tree``.
+    """
+
+    def __init__(self, root: str, link: str = 'hardlink'):
+        self.root = os.path.realpath(root)
+        self.link = link
+
+    def blob_path(self, digest: str) -> str:
+        """Путь блоба по хешу содержимого."""
+        return os.path.join(self.root, digest[:2], digest)
+
+    def _is_blob_link(self, path: str) -> bool:
+        return os.path.islink(path) and os.path.realpath(path).startswith(self.root + os.sep)
+
+    def ingest(self, path: str) -> int:
+        """
+        Заменяет файл запуска ссылкой на блоб с тем же содержимым.
+
+        Returns:
+            int: Сэкономлено байт (размер файла, если такое содержимое уже было в хранилище)
+        """
+        if os.path.islink(path) or not os.path.isfile(path):
+            return 0
+        stat = os.stat(path)
+        if stat.st_nlink > 1:
+            # Уже ссылка на блоб
+            return 0
+        blob = self.blob_path(file_digest(path))
+        os.makedirs(os.path.dirname(blob), exist_ok=True)
+        tmp = f"{path}.blob-tmp"
+        if self.link == 'hardlink':
+            try:
+                # Новое содержимое: файл запуска сам становится блобом, без копирования
+                os.link(path, blob)
+                return 0
+            except FileExistsError:
+                os.link(blob, tmp)
+                os.replace(tmp, path)
+                return stat.st_size
+            except OSError as e:
+                # Другое устройство или ФС без жёстких ссылок
+                logging.debug(f"Жёсткая ссылка {path} -> {blob} недоступна ({e}), используем символическую")
+        saved = stat.st_size if os.path.exists(blob) else 0
+        if not saved:
+            shutil.move(path, blob)
+        os.symlink(blob, tmp)
+        os.replace(tmp, path)
+        return saved
+
+    def ingest_tree(self, folder: str, workers: int = 4) -> Tuple[int, int]:
+        """
+        Переносит все файлы папки запуска в хранилище (хеширование — в пуле потоков).
+
+        Returns:
+            tuple: (файлов, сэкономлено байт)
+        """
+        paths = [os.path.join(root, name) for root, _, files in os.walk(folder) for name in files]
+        if not paths:
+            return 0, 0
+
+        def ingest(path):
+            try:
+                return self.ingest(path)
+            except OSError as e:
+                logging.error(f"Не удалось перенести {path} в хранилище {self.root}: {e}")
+                return 0
+
+        with ThreadPoolExecutor(max_workers=max(1, int(workers)), thread_name_prefix='blob') as executor:
+            saved = sum(executor.map(ingest, paths))
+        return len(paths), saved
+
+    def detach_tree(self, folder: str) -> int:
+        """
+        Отвязывает файлы папки от хранилища (копия вместо ссылки), чтобы повторная
+        запись в папку не изменила содержимое других запусков.
+
+        Returns:
+            int: Отвязано файлов
+        """
+        detached = 0
+        for root, _, files in os.walk(folder):
+            for name in files:
+                path = os.path.join(root, name)
+                linked = self._is_blob_link(path) or (not os.path.islink(path) and os.stat(path).st_nlink > 1)
+                if not linked:
+                    continue
+                tmp = f"{path}.blob-tmp"
+                shutil.copyfile(path, tmp)
+                os.replace(tmp, path)
+                detached += 1
+        return detached
+
+    def gc(self, reports_root: str, min_age: float = 3600) -> Tuple[int, int]:
+        """
+        Удаляет блобы, на которые не ссылается ни один файл запусков.
+
+        Блоб без жёстких ссылок (st_nlink == 1) считается мусором, если на него не
+        указывает символическая ссылка из ``reports_root``. Блобы моложе ``min_age``
+        (по ctime — времени последней привязки) не трогаются: их может привязывать идущий запуск.
+
+        Returns:
+            tuple: (удалено блобов, освобождено байт)
+        """
+        referenced = set()
+        for root, dirs, files in os.walk(reports_root):
+            dirs[:] = [name for name in dirs if os.path.realpath(os.path.join(root, name)) != self.root]
+            for name in files:
+                path = os.path.join(root, name)
+                if self._is_blob_link(path):
+                    referenced.add(os.path.realpath(path))
+
+        removed = freed = 0
+        now = time.time()
+        if not os.path.isdir(self.root):
+            return removed, freed
+        for shard in os.listdir(self.root):
+            shard_path = os.path.join(self.root, shard)
+            if not os.path.isdir(shard_path):
+                continue
+            for name in os.listdir(shard_path):
+                blob = os.path.join(shard_path, name)
+                stat = os.stat(blob)
+                if stat.st_nlink > 1 or blob in referenced or now - stat.st_ctime < min_age:
+                    continue
+                os.remove(blob)
+                removed += 1
+                freed += stat.st_size
+            if not os.listdir(shard_path):
+                os.rmdir(shard_path)
+        return removed, freed
+
+
+def open_blob_store(cfg) -> Optional[BlobStore]:
+    """Хранилище артефактов, если включена секция ``blob_store`` (в режиме архива — None)."""
+    settings = blob_store_settings(cfg)
+    if not settings['enabled']:
+        return None
+    if (cfg.get('archive') or {}).get('enabled'):
+        logging.warning("⚠️  blob_store не используется вместе с archive: файлы запуска пишутся в архив")
+        return None
+    return BlobStore(settings['path'], settings['link'])
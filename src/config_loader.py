@@ -7,6 +7,22 @@ from utils import ensure_file_exists
 
 logger = logging.getLogger(__name__)
 
+# Именованные приоритеты панелей: чем больше значение, тем раньше рендер
+PRIORITY_NAMES = {"critical": 100, "high": 50, "normal": 0, "low": -50}
+
+
+def parse_priority(value: Any) -> int:
+    """Приводит приоритет метрики (число или critical/high/normal/low) к целому числу."""
+    if value is None:
+        return 0
+    if isinstance(value, str) and value.lower() in PRIORITY_NAMES:
+        return PRIORITY_NAMES[value.lower()]
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Unknown priority '{value}', expected a number or one of {', '.join(PRIORITY_NAMES)}")
+
+
 @dataclass
 class Metric:
     name: str
@@ -17,6 +33,9 @@ class Metric:
     width: Any = None
     height: Any = None
     timeout: int = 60
+    priority: int = 0
+    resolution: Any = None
+    grouped: bool = False
     vars: Dict[str, Any] = field(default_factory=dict)
 
 
@@ -64,6 +83,9 @@ def load_metrics_config(path: str = "metrics_urls.yml") -> List[Metric]:
                 width=metric.get("width"),
                 height=metric.get("height"),
                 timeout=metric.get("timeout", 60),
+                priority=parse_priority(metric.get("priority")),
+                resolution=metric.get("resolution"),
+                grouped=bool(metric.get("grouped", False)),
                 vars=metric.get("vars", {}),
             )
         )
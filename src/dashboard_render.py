@@ -0,0 +1,259 @@
+import os
+import math
+import logging
+import urllib.parse
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from scheduler import RenderJob, JobResult
+from dashboards import grafana_base_url, fetch_dashboard, cached_dashboard
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow — необязательная зависимость: без неё панели рендерятся по одной
+    Image = None
+
+# Сетка дашборда Grafana: 24 колонки, высота строки 30 px, отступ между панелями 8 px
+GRID_COLUMNS = 24
+
+_DEFAULT_DASHBOARD_RENDER = {
+    'enabled': False,
+    'dashboards': [],        # UID дашбордов (пусто — все дашборды метрик сервисов)
+    'width': 1920,           # Ширина рендера дашборда, px
+    'cell_height': 30,       # Высота строки сетки, px
+    'margin': 8,             # Отступ между панелями, px
+    'padding': 0,            # Отступ страницы в режиме kiosk, px
+    'timeout': None,         # Таймаут рендера дашборда, с (по умолчанию — максимальный из панелей)
+    'crop_workers': 4,       # Процессов для вырезания панелей
+    'keep_dashboard': False,  # Сохранять полный снимок дашборда рядом с панелями
+}
+
+# Параметры запроса, относящиеся к одной панели (не входят в рендер дашборда)
+_PANEL_PARAMS = ('panelId', 'width', 'height')
+
+# Текст ошибки панели, если не удалось отрендерить дашборд целиком
+DASHBOARD_ERROR = 'dashboard render failed'
+
+
+@dataclass
+class DashboardJob(RenderJob):
+    """Рендер дашборда целиком; панели ``crops`` вырезаются из снимка после рендера."""
+    crops: List[RenderJob] = field(default_factory=list)
+    grid: Dict[str, int] = field(default_factory=dict)
+
+
+@dataclass
+class DashboardLayout:
+    """Положение панелей на снимке дашборда: panel_id -> (left, top, right, bottom), px."""
+    height: int
+    boxes: Dict[str, Tuple[int, int, int, int]]
+
+
+def dashboard_render_settings(cfg) -> dict:
+    """Настройки ``grafana.dashboard_render`` со значениями по умолчанию."""
+    settings = dict(_DEFAULT_DASHBOARD_RENDER)
+    settings.update((cfg.get('grafana') or {}).get('dashboard_render') or {})
+    return settings
+
+
+def panel_boxes(dashboard: dict, width: int, cell_height: int = 30, margin: int = 8,
+                padding: int = 0) -> DashboardLayout:
+    """
+    Пересчитывает gridPos панелей дашборда в пиксели снимка шириной ``width``.
+
+    Панели свернутых строк (row с ``collapsed: true``) на снимок не попадают и пропускаются.
+    """
+    inner = max(1, int(width) - 2 * padding)
+    column = (inner - margin * (GRID_COLUMNS - 1)) / GRID_COLUMNS
+    boxes = {}
+    bottom = 0
+    for panel in dashboard.get('panels') or []:
+        pos = panel.get('gridPos') or {}
+        if panel.get('type') == 'row' or not pos:
+            continue
+        x, y, w, h = (int(pos.get(key, 0)) for key in ('x', 'y', 'w', 'h'))
+        left = padding + x * (column + margin)
+        top = padding + y * (cell_height + margin)
+        right = left + w * column + (w - 1) * margin
+        box = (int(round(left)), int(round(top)), int(round(right)), int(top + h * cell_height + (h - 1) * margin))
+        boxes[str(panel.get('id'))] = box
+        bottom = max(bottom, box[3])
+    return DashboardLayout(height=bottom + margin + padding, boxes=boxes)
+
+
+def dashboard_url(panel_url: str, width: int) -> str:
+    """URL рендера дашборда (``/render/d/``) с теми же переменными и окном, что у панели."""
+    parts = urllib.parse.urlsplit(panel_url)
+    query = [(key, value) for key, value in urllib.parse.parse_qsl(parts.query, keep_blank_values=True)
+             if key not in _PANEL_PARAMS]
+    query += [('width', str(width)), ('kiosk', '')]
+    path = parts.path.replace('/render/d-solo/', '/render/d/', 1)
+    return urllib.parse.urlunsplit((parts.scheme, parts.netloc, path, urllib.parse.urlencode(query), ''))
+
+
+def group_dashboard_jobs(jobs: List[RenderJob], settings: dict) -> List[RenderJob]:
+    """
+    Заменяет задачи панелей одного дашборда (один сервис, окно и переменные) одной задачей
+    рендера дашборда целиком. Без Pillow или при выключенном режиме возвращает ``jobs`` как есть.
+    """
+    if not settings.get('enabled') or not jobs:
+        return jobs
+    if Image is None:
+        logging.warning("⚠️  grafana.dashboard_render включен, но Pillow не установлен — панели рендерятся по одной")
+        return jobs
+
+    dashboards = {str(uid) for uid in settings.get('dashboards') or []}
+    grid = {key: int(settings[key]) for key in ('width', 'cell_height', 'margin', 'padding')}
+    grouped: Dict[tuple, List[RenderJob]] = {}
+    result = []
+    for job in jobs:
+        if dashboards and str(job.dashboard_uid) not in dashboards:
+            result.append(job)
+            continue
+        url = dashboard_url(job.url, grid['width'])
+        key = (url, tuple(sorted(job.headers.items())), job.run, os.path.dirname(job.output_file))
+        if key not in grouped:
+            grouped[key] = []
+            result.append(key)
+        grouped[key].append(job)
+
+    planned = []
+    for item in result:
+        if isinstance(item, RenderJob):
+            planned.append(item)
+            continue
+        crops = grouped[item]
+        if len(crops) == 1:
+            # Одну панель дешевле отрендерить отдельно
+            planned.append(crops[0])
+            continue
+        first = crops[0]
+        planned.append(DashboardJob(
+            run=first.run,
+            source=first.source,
+            group=first.group,
+            name=f"dashboard_{first.dashboard_uid}",
+            url=item[0],
+            headers=first.headers,
+            output_file=os.path.join(os.path.dirname(first.output_file), f"_dashboard_{first.dashboard_uid}.png"),
+            timeout=float(settings.get('timeout') or max(job.timeout for job in crops)),
+            dashboard_uid=first.dashboard_uid,
+            priority=max(job.priority for job in crops),
+            window=first.window,
+            crops=crops,
+            grid=grid,
+        ))
+    if len(planned) < len(jobs):
+        logging.info(f"🧩 Рендер дашбордов целиком: {len(jobs)} панелей → {len(planned)} рендеров")
+    return planned
+
+
+def fetch_dashboard_layout(session, job: DashboardJob, timing=None) -> Optional[DashboardLayout]:
+    """
+    Загружает JSON дашборда (кэшируется на процесс) и вычисляет положение панелей.
+
+    HTTP-статус неудачного запроса записывается в ``timing.status``.
+    """
+    dashboard = fetch_dashboard(session, grafana_base_url(job.url), job.dashboard_uid, job.headers, job.timeout,
+                                timing)
+    return panel_boxes(dashboard, **job.grid) if dashboard is not None else None
+
+
+def cached_layout(job: DashboardJob) -> Optional[DashboardLayout]:
+    """Положение панелей по JSON дашборда, загруженному при рендере задачи (None, если не загружен)."""
+    dashboard = cached_dashboard(grafana_base_url(job.url), job.dashboard_uid)
+    return panel_boxes(dashboard, **job.grid) if dashboard is not None else None
+
+
+def dashboard_render_url(job: DashboardJob, layout: DashboardLayout) -> str:
+    """URL рендера дашборда с высотой, вмещающей все панели."""
+    return f"{job.url}&height={int(math.ceil(layout.height))}"
+
+
+def crop_image(image_path: str, crops: List[Tuple[Tuple[int, int, int, int], str]]) -> List[str]:
+    """
+    Вырезает панели из снимка дашборда (выполняется в процессе пула).
+
+    Returns:
+        list: Текст ошибки для каждой панели ('' — панель сохранена)
+    """
+    errors = []
+    with Image.open(image_path) as image:
+        image.load()
+        for box, output_file in crops:
+            try:
+                if box[2] > image.width or box[3] > image.height:
+                    raise ValueError(f"панель {box} за пределами снимка {image.width}x{image.height}")
+                image.crop(box).save(output_file, format='PNG')
+                errors.append('')
+            except Exception as e:
+                errors.append(str(e))
+    return errors
+
+
+def _panel_results(result: JobResult, crops: List[RenderJob], ok: bool, error: str = '') -> List[JobResult]:
+    # Время рендера дашборда приписывается первой панели, остальные — как полученные без рендера
+    return [
+        JobResult(
+            job=crop,
+            ok=ok,
+            duration=result.duration if index == 0 else 0.0,
+            deduplicated=index > 0,
+            error=error,
+            timing=result.timing if index == 0 else None,
+        )
+        for index, crop in enumerate(crops)
+    ]
+
+
+def crop_dashboard_results(results: List[JobResult], scheduler, settings: dict) -> List[JobResult]:
+    """
+    Вырезает панели из снимков дашбордов в пуле процессов и возвращает результаты по панелям.
+
+    Панели, которых нет на снимке (свернутая строка, ошибка вырезания), рендерятся
+    отдельно через ``scheduler``, как без режима рендера дашбордов.
+
+    Returns:
+        list: Результаты без задач DashboardJob — по одному на панель
+    """
+    dashboards = [result for result in results if isinstance(result.job, DashboardJob)]
+    if not dashboards:
+        return results
+
+    expanded = [result for result in results if not isinstance(result.job, DashboardJob)]
+    fallback: List[RenderJob] = []
+    tasks = []
+    for result in dashboards:
+        job = result.job
+        layout = cached_layout(job) if result.ok else None
+        if layout is None:
+            expanded += _panel_results(result, job.crops, ok=False, error=result.error or DASHBOARD_ERROR)
+            continue
+        present = [crop for crop in job.crops if str(crop.panel_id) in layout.boxes]
+        fallback += [crop for crop in job.crops if str(crop.panel_id) not in layout.boxes]
+        tasks.append((result, present, [(layout.boxes[str(crop.panel_id)], crop.output_file) for crop in present]))
+
+    workers = max(1, int(settings.get('crop_workers') or 1))
+    with ProcessPoolExecutor(max_workers=min(workers, max(1, len(tasks)))) as executor:
+        futures = [(result, present, executor.submit(crop_image, result.job.output_file, boxes))
+                   for result, present, boxes in tasks]
+        for result, present, future in futures:
+            try:
+                errors = future.result()
+            except Exception as e:
+                logging.error(f"Не удалось вырезать панели из {result.job.output_file}: {e}")
+                errors = [str(e)] * len(present)
+            expanded += _panel_results(result, [crop for crop, error in zip(present, errors) if not error], ok=True)
+            fallback += [crop for crop, error in zip(present, errors) if error]
+            if not settings.get('keep_dashboard'):
+                try:
+                    os.remove(result.job.output_file)
+                except OSError:
+                    pass
+
+    if fallback:
+        logging.info(f"🧩 Панелей не найдено на снимках дашбордов, рендерим отдельно: {len(fallback)}")
+        expanded += scheduler.run(fallback)
+    return expanded
+
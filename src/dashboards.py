@@ -0,0 +1,67 @@
+import logging
+import threading
+import urllib.parse
+from typing import Dict, Optional
+
+# JSON дашбордов по (base_url, uid): запрашивается один раз на процесс
+_dashboards: Dict[tuple, Optional[dict]] = {}
+_lock = threading.Lock()
+
+
+def grafana_base_url(render_url: str) -> str:
+    """Базовый URL Grafana для URL рендера (всё до ``/render/``)."""
+    return render_url.split('/render/', 1)[0]
+
+
+def fetch_dashboard(session, base_url: str, uid: str, headers: dict, timeout: float = 30,
+                    timing=None) -> Optional[dict]:
+    """
+    Загружает JSON дашборда (``/api/dashboards/uid/<uid>``) с кэшированием на процесс.
+
+    В ``timing.status`` (если передан) записывается HTTP-статус неудачного запроса: 404/403
+    неверного uid — ошибка задачи, а не сбой хоста, планировщик не повторяет её и не открывает breaker.
+
+    Returns:
+        dict | None: Модель дашборда или None, если запрос не удался (неудача не кэшируется)
+    """
+    key = (base_url, str(uid))
+    with _lock:
+        if key in _dashboards:
+            return _dashboards[key]
+    url = f"{base_url}/api/dashboards/uid/{urllib.parse.quote(str(uid))}"
+    response = None
+    try:
+        response = session.get(url, headers=headers, verify=False, timeout=timeout)
+        response.raise_for_status()
+        dashboard = response.json().get('dashboard') or {}
+    except Exception as e:
+        logging.error(f"Не удалось получить JSON дашборда {uid} ({url}): {e}")
+        if timing is not None and response is not None:
+            timing.status = response.status_code
+        return None
+    with _lock:
+        _dashboards[key] = dashboard
+    return dashboard
+
+
+def cached_dashboard(base_url: str, uid: str) -> Optional[dict]:
+    """JSON дашборда, уже загруженный fetch_dashboard (None, если не загружен)."""
+    with _lock:
+        return _dashboards.get((base_url, str(uid)))
+
+
+def find_panel(dashboard: dict, panel_id) -> Optional[dict]:
+    """Ищет панель по id, включая панели внутри строк (в том числе свернутых)."""
+    for panel in dashboard.get('panels') or []:
+        if str(panel.get('id')) == str(panel_id):
+            return panel
+        nested = find_panel(panel, panel_id) if panel.get('panels') else None
+        if nested is not None:
+            return nested
+    return None
+
+
+def clear_dashboards() -> None:
+    """Сбрасывает кэш JSON дашбордов (например, между прогонами режима наблюдения)."""
+    with _lock:
+        _dashboards.clear()
@@ -0,0 +1,112 @@
+import logging
+import urllib.parse
+from typing import Dict, List, Optional, Tuple
+
+from utils import to_utc_epoch_ms
+
+_DEFAULT_DISCOVERY = {
+    'enabled': False,
+    'on_empty': 'skip',   # skip — не рендерить, flag — рендерить, но отметить в сводке
+    'timeout': 30,
+}
+
+# Секции discovery: (ключ, секция Grafana в config.yml, лейбл по умолчанию)
+_TARGETS = {
+    'services': ('grafana', 'application'),
+    'gatling_scripts': ('gatling_grafana', 'script_name'),
+}
+
+
+def discovery_settings(cfg) -> dict:
+    """Настройки ``discovery`` со значениями по умолчанию."""
+    settings = dict(_DEFAULT_DISCOVERY)
+    settings.update(cfg.get('discovery') or {})
+    return settings
+
+
+def _auth_headers(api_key) -> Dict[str, str]:
+    api_key = str(api_key or '')
+    if not api_key.lower().startswith('bearer '):
+        api_key = f"Bearer {api_key}"
+    return {'Authorization': api_key}
+
+
+def label_values(session, base_url: str, headers: dict, datasource_uid: str, label: str,
+                 start: float, end: float, match: str = '', timeout: float = 30) -> Optional[set]:
+    """
+    Значения лейбла, у которых есть серии в окне ``start``..``end`` (секунды).
+
+    Запрос идёт в Prometheus через прокси источника данных Grafana:
+    ``/api/datasources/proxy/uid/<uid>/api/v1/label/<label>/values``.
+
+    Returns:
+        set | None: Значения лейбла или None, если запрос не удался
+    """
+    url = (f"{base_url.rstrip('/')}/api/datasources/proxy/uid/{urllib.parse.quote(str(datasource_uid))}"
+           f"/api/v1/label/{urllib.parse.quote(label)}/values")
+    params = {'start': int(start), 'end': int(end)}
+    if match:
+        params['match[]'] = match
+    try:
+        response = session.get(url, params=params, headers=headers, verify=False, timeout=timeout)
+        response.raise_for_status()
+        payload = response.json()
+        if payload.get('status') != 'success':
+            raise ValueError(payload.get('error') or payload)
+        return set(payload.get('data') or [])
+    except Exception as e:
+        logging.warning(f"⚠️  Не удалось получить значения {label} из источника {datasource_uid}: {e}")
+        return None
+
+
+def discover_targets(cfg, sessions, services: List[str], scripts: List[str]) -> Tuple[List[str], List[str], dict]:
+    """
+    Проверяет, у каких сервисов и Gatling-скриптов есть данные в окне запуска (from..to).
+
+    Секция ``discovery.services`` / ``discovery.gatling_scripts`` без ``datasource_uid``
+    не проверяется; при ошибке запроса список остаётся без изменений.
+
+    Returns:
+        tuple: (сервисы, скрипты, {'services': [...], 'gatling_scripts': [...]} — без данных)
+    """
+    settings = discovery_settings(cfg)
+    targets = {'services': list(services), 'gatling_scripts': list(scripts)}
+    empty = {'services': [], 'gatling_scripts': []}
+    if not settings['enabled']:
+        return targets['services'], targets['gatling_scripts'], empty
+
+    timezone = cfg['mainConfig']['timezone']
+    start = to_utc_epoch_ms(cfg['mainConfig']['from'], timezone) / 1000
+    end = to_utc_epoch_ms(cfg['mainConfig']['to'], timezone) / 1000
+
+    for key, (section, default_label) in _TARGETS.items():
+        target_cfg = settings.get(key) or {}
+        names = targets[key]
+        if not names or not target_cfg.get('datasource_uid'):
+            continue
+        grafana_cfg = cfg.get(section) or {}
+        base_url = str(grafana_cfg.get('base_url') or (cfg.get('grafana') or {}).get('base_url') or '')
+        if not base_url.startswith('http'):
+            continue
+        values = label_values(
+            sessions.get(base_url), base_url, _auth_headers(grafana_cfg.get('api_key')),
+            target_cfg['datasource_uid'], target_cfg.get('label', default_label),
+            start, end, target_cfg.get('match', ''), settings['timeout'],
+        )
+        if values is None:
+            continue
+        empty[key] = [name for name in names if name not in values]
+        if settings['on_empty'] == 'skip':
+            targets[key] = [name for name in names if name in values]
+
+    log_discovery(empty, settings['on_empty'])
+    return targets['services'], targets['gatling_scripts'], empty
+
+
+def log_discovery(empty: dict, on_empty: str) -> None:
+    """Сводка по сервисам и скриптам без данных в окне запуска."""
+    titles = {'services': 'Сервисы', 'gatling_scripts': 'Gatling-скрипты'}
+    action = "пропущены" if on_empty == 'skip' else "будут отрендерены, панели могут быть пустыми"
+    for key, names in empty.items():
+        if names:
+            logging.warning(f"🔍 {titles[key]} без данных в окне запуска ({action}): {', '.join(names)}")
@@ -2,28 +2,54 @@ import os
 import requests
 import logging
 import urllib.parse
+import time
 import urllib3
+from functools import lru_cache, partial
 from typing import List, Tuple, Optional
-from requests.adapters import HTTPAdapter, Retry
+from requests.adapters import Retry
 from requests.exceptions import Timeout, ConnectionError, HTTPError
-from utils import to_utc_iso, to_utc_epoch_ms
+from utils import to_utc_iso, to_utc_epoch_ms, get_run_label, PANEL_LOGGER
+from scheduler import RenderJob, JobResult, RenderScheduler, DEADLINE_ERROR
+from http_pool import SessionRegistry
+from resilience import RetryBudget, CIRCUIT_OPEN_ERROR
+from config_loader import parse_priority
+from latency_store import open_latency_store
+from dashboard_render import (DashboardJob, dashboard_render_settings, group_dashboard_jobs, fetch_dashboard_layout,
+                              dashboard_render_url, crop_dashboard_results)
+from timings import RenderTiming, TimedHTTPAdapter, reset_connect_timing, get_connect_timing
+from tracing import span
+from discovery import discovery_settings, discover_targets
+from probe import probe_settings, probe_empty, write_placeholder
+from image_check import image_check_settings, check_results
+from image_optimize import open_image_optimizer
 
 # Отключаем предупреждения о небезопасном SSL
 
 from config import load_metrics_config
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
+# Построчные сообщения о панелях: ограничены по частоте (см. utils.setup_logging)
+panel_logger = logging.getLogger(PANEL_LOGGER)
 
-def create_session(retries: int = 3, backoff_factor: float = 0.5) -> requests.Session:
-    """Return a requests session configured with retry logic."""
+# Папка (и группа в статистике) для метрик с ``grouped: true``: одна картинка на все сервисы/скрипты
+GROUPED_FOLDER = "grouped"
+
+
+def create_session(retries: int = 3, backoff_factor: float = 0.5,
+                   pool_maxsize: int = requests.adapters.DEFAULT_POOLSIZE) -> requests.Session:
+    """Return a requests session configured with retry logic.
+
+    ``pool_maxsize`` limits keep-alive connections kept per host.
+    """
     session = requests.Session()
     retry = Retry(
         total=retries,
         backoff_factor=backoff_factor,
-        status_forcelist=[500, 502, 503, 504],
+        status_forcelist=[500, 502, 503, 504] if retries else [],
         allowed_methods=["GET"],
     )
-    adapter = HTTPAdapter(max_retries=retry)
+    # Адаптер замеряет время установки соединений (connect/TLS) для отчета о таймингах
+    adapter = TimedHTTPAdapter(max_retries=retry, pool_maxsize=pool_maxsize)
     session.mount("http://", adapter)
     session.mount("https://", adapter)
     return session
@@ -61,6 +87,77 @@ def build_grafana_url(params: dict) -> str:
     return f"{render_url}?{query_string}"
 
 
+# «Круглые» шаги интервала, с: Grafana и Prometheus лучше кэшируют выровненные шаги
+_NICE_STEPS = (1, 2, 5, 10, 15, 30, 60, 120, 300, 600, 900, 1800, 3600, 7200, 10800, 21600, 43200, 86400)
+
+_DEFAULT_RESOLUTION = {
+    'enabled': False,
+    'interval_var': 'interval',  # Переменная дашборда с шагом запросов (var-interval)
+    'points_per_pixel': 1.0,     # Точек данных на пиксель ширины панели
+    'min_interval': 15,          # Минимальный шаг, с (не меньше интервала scrape)
+}
+
+
+def format_interval(seconds: int) -> str:
+    """Форматирует шаг в секундах как длительность Grafana: 15s, 5m, 2h, 1d."""
+    for unit, size in (('d', 86400), ('h', 3600), ('m', 60)):
+        if seconds >= size and seconds % size == 0:
+            return f"{seconds // size}{unit}"
+    return f"{seconds}s"
+
+
+def resolution_interval(window_seconds: float, width: int, points_per_pixel: float = 1.0,
+                        min_interval: float = 15) -> int:
+    """
+    Шаг запросов, при котором на панель приходится не больше ``width * points_per_pixel`` точек.
+
+    Returns:
+        int: Ближайший «круглый» шаг в секундах, не меньше ``min_interval``
+    """
+    max_points = max(1.0, float(width or 1000) * float(points_per_pixel))
+    raw = max(float(min_interval), float(window_seconds) / max_points)
+    return next((step for step in _NICE_STEPS if step >= raw), int(raw))
+
+
+def apply_resolution_hints(vars_dict: dict, cfg, section: str, metric_resolution, window_seconds: float,
+                           width) -> None:
+    """
+    Добавляет в переменные панели шаг запросов по длине окна и ширине панели.
+
+    Настройки берутся из ``grafana.resolution``, секции источника (``gatling_grafana.resolution``,
+    ``postgresql_grafana.resolution``) и поля ``resolution`` метрики: ``false`` отключает подсказку,
+    словарь переопределяет interval_var, points_per_pixel, min_interval или задаёт фиксированный ``interval``.
+    Переменная добавляется, только если окно требует прореживания (шаг больше ``min_interval``):
+    на коротких окнах шаг по умолчанию задаёт сам дашборд. Явно заданная в ``vars`` переменная
+    не перезаписывается.
+    """
+    if metric_resolution is False:
+        return
+    settings = dict(_DEFAULT_RESOLUTION)
+    settings.update(cfg.get('grafana', {}).get('resolution') or {})
+    if section != 'grafana':
+        settings.update(cfg.get(section, {}).get('resolution') or {})
+    if isinstance(metric_resolution, dict):
+        # Настройка на метрике включает подсказку, даже если глобально она выключена
+        settings.update({'enabled': True, **metric_resolution})
+    if not settings['enabled'] or not settings['interval_var']:
+        return
+
+    name = settings['interval_var']
+    name = name if name.startswith('var-') else f"var-{name}"
+    if name in vars_dict or name[len('var-'):] in vars_dict:
+        return
+    interval = settings.get('interval')
+    if interval is None:
+        max_points = max(1.0, float(width or 1000) * float(settings['points_per_pixel']))
+        if float(window_seconds) / max_points <= float(settings['min_interval']):
+            # Прореживание не нужно: шаг остаётся за дашбордом
+            return
+        interval = format_interval(resolution_interval(window_seconds, width, settings['points_per_pixel'],
+                                                       settings['min_interval']))
+    vars_dict[name] = interval
+
+
 def _is_png_file(path: str) -> bool:
     """Проверяет PNG по сигнатуре файла."""
     try:
@@ -71,19 +168,29 @@ def _is_png_file(path: str) -> bool:
         return False
 
 
-def download_metric(session: requests.Session, url: str, headers: dict, output_file: str) -> bool:
+def download_metric(session: requests.Session, url: str, headers: dict, output_file: str,
+                    timing: Optional[RenderTiming] = None, timeout: float = 120) -> bool:
     """Download a single Grafana panel image to ``output_file``.
 
+    If ``timing`` is given, it is filled with connect/TLS, TTFB and transfer
+    durations, response size, HTTP retries and the final status.
+    ``timeout`` is the per-panel request timeout in seconds.
+
     Returns ``True`` on success, ``False`` otherwise.
     """
+    timing = timing if timing is not None else RenderTiming()
+    reset_connect_timing()
+    started = time.perf_counter()
     try:
         req_headers = dict(headers or {})
         req_headers.setdefault("Accept", "image/png")
-        response = session.get(url, headers=req_headers, verify=False, timeout=120)
+        response = session.get(url, headers=req_headers, verify=False, timeout=timeout, stream=True)
+        timing.ttfb = response.elapsed.total_seconds()
+        timing.status = response.status_code
+        retries = getattr(response.raw, "retries", None)
+        timing.retries = len(getattr(retries, "history", None) or ())
         if response.status_code != 200:
-            logging.error(
-                f"HTTP {response.status_code} while downloading {url}: {response.text}"
-            )
+            logging.error("HTTP %s while downloading %s: %s", response.status_code, url, response.text)
             return False
 
         content_type = response.headers.get("Content-Type", "").lower()
@@ -92,330 +199,761 @@ def download_metric(session: requests.Session, url: str, headers: dict, output_f
         # Если это не PNG – вероятно, ошибка авторизации/HTML страница
         if "image/png" not in content_type:
             snippet = response.text[:200] if hasattr(response, "text") else ""
-            logging.error(f"Неверный Content-Type '{content_type}' для {url}. Фрагмент ответа: {snippet}")
+            logging.error("Неверный Content-Type '%s' для %s. Фрагмент ответа: %s", content_type, url, snippet)
             return False
 
+        # Получаем тело ответа отдельно, чтобы разделить TTFB и передачу
+        content = response.content
+        timing.bytes = len(content)
+        timing.transfer = max(0.0, time.perf_counter() - started - timing.ttfb)
+
         # Сохраняем файл
         with open(output_file, "wb") as f:
-            f.write(response.content)
+            f.write(content)
 
         # Проверка содержимого файла: размер и PNG-сигнатура
         if content_length and content_length < 8000:
-            logging.warning(f"Возможна пустая картинка (<8KB): {output_file} ({content_length} байт)")
+            logging.warning("Возможна пустая картинка (<8KB): %s (%s байт)", output_file, content_length)
         if not _is_png_file(output_file):
-            logging.error(f"Файл {output_file} не является валидным PNG")
+            logging.error("Файл %s не является валидным PNG", output_file)
             try:
                 os.remove(output_file)
             except Exception:
                 pass
             return False
 
-        logging.info(f"Файл сохранен: {output_file}")
+        panel_logger.debug("Файл сохранен: %s", output_file)
         return True
 
     except (Timeout, ConnectionError, HTTPError, FileNotFoundError) as e:
-        logging.error(f"Ошибка при скачивании {url}: {e}")
+        logging.error("Ошибка при скачивании %s: %s", url, e)
         return False
+    finally:
+        timing.total = time.perf_counter() - started
+        timing.connect, timing.new_connections = get_connect_timing()
 
-def download_gatling_metrics(cfg, main_folder_path, session: Optional[requests.Session] = None):
+def create_session_registry(cfg, adapter_retries: bool = False) -> SessionRegistry:
     """
-    Скачивает метрики Gatling для всех включенных скриптов.
-    
+    Создаёт реестр сессий по хостам Grafana; пул соединений каждой сессии
+    равен ``scheduler.per_host_limit``. Повторы выполняет планировщик,
+    поэтому HTTP-адаптер сессий их не делает.
+
     Args:
         cfg (dict): Конфигурационный словарь из config.yml
-        main_folder_path (str): Путь к основной папке для сохранения метрик
+        adapter_retries (bool): Повторы в HTTP-адаптере (``scheduler.retries``, ``backoff_factor``) —
+            для запросов в обход планировщика, например в grafana_enhanced.py
+    """
+    scheduler_cfg = cfg.get('scheduler') or {}
+    retries = scheduler_cfg.get('retries', 3) if adapter_retries else 0
+    backoff_factor = scheduler_cfg.get('backoff_factor', 0.5)
+    return SessionRegistry(
+        session_factory=lambda pool_maxsize: create_session(retries=retries, backoff_factor=backoff_factor,
+                                                            pool_maxsize=pool_maxsize),
+        pool_maxsize=scheduler_cfg.get('per_host_limit', 2),
+    )
+
+
+def create_scheduler(cfg, sessions: Optional[SessionRegistry] = None, read_only: bool = False) -> RenderScheduler:
+    """
+    Создаёт планировщик рендеров по секции ``scheduler`` конфига.
+
+    Args:
+        cfg (dict): Конфигурационный словарь из config.yml
+        sessions (SessionRegistry, optional): Общий реестр сессий (создаётся, если не передан)
+        read_only (bool): Только планирование (--plan): история длительностей открывается на чтение,
+            если файл уже есть, и ничего не создаётся в папке отчетов
+
+    Returns:
+        RenderScheduler: Планировщик с сессиями по хостам
+    """
+    scheduler_cfg = cfg.get('scheduler') or {}
+    breaker_cfg = scheduler_cfg.get('breaker') or {}
+    return RenderScheduler(
+        fetch=partial(_fetch_job, probe=probe_settings(cfg)),
+        sessions=sessions or create_session_registry(cfg),
+        max_workers=scheduler_cfg.get('max_workers', 4),
+        per_host_limit=scheduler_cfg.get('per_host_limit', 2),
+        retries=scheduler_cfg.get('retries', 3),
+        backoff_factor=scheduler_cfg.get('backoff_factor', 0.5),
+        retry_budget=RetryBudget(
+            max_retries=scheduler_cfg.get('retry_budget'),
+            max_seconds=scheduler_cfg.get('retry_budget_seconds', 300),
+        ),
+        breaker_threshold=breaker_cfg.get('failure_threshold', 5) if breaker_cfg.get('enabled', True) else None,
+        breaker_reset=breaker_cfg.get('reset_timeout', 30),
+        defer_open=breaker_cfg.get('on_open', 'defer') == 'defer',
+        deadline=scheduler_cfg.get('deadline_seconds'),
+        latency_store=open_latency_store(cfg, read_only=read_only),
+        optimizer=open_image_optimizer(cfg),
+    )
+
+
+def _fetch_job(session: requests.Session, job: RenderJob, timing: RenderTiming,
+               probe: Optional[dict] = None) -> bool:
+    """
+    Выполняет одну задачу рендера (используется планировщиком).
+
+    При включенной пробе (``grafana.probe``) сначала запрашиваются данные панели;
+    если точек нет, вместо рендера записывается PNG-заглушка.
+    """
+    # Папки создаются при выполнении, поэтому планирование (и --plan) не трогает диск
+    os.makedirs(os.path.dirname(job.output_file), exist_ok=True)
+    if probe and probe['enabled'] and not isinstance(job, DashboardJob) and job.panel_id is not None:
+        started = time.perf_counter()
+        with span("probe", cat="render", host=job.host, dashboard_uid=job.dashboard_uid,
+                  panel_id=job.panel_id) as span_args:
+            timing.empty = probe_empty(session, job, probe)
+            span_args['empty'] = timing.empty
+        if timing.empty:
+            write_placeholder(job)
+            timing.total = time.perf_counter() - started
+            panel_logger.info("    ∅ Нет данных, записана заглушка: %s/%s.png", job.group, job.name)
+            return True
+    panel_logger.info("  📈 [%s] %s: скачиваем метрику %s", job.run, job.group, job.name)
+    url = job.url
+    if isinstance(job, DashboardJob):
+        # Высота снимка дашборда зависит от раскладки панелей
+        layout = fetch_dashboard_layout(session, job, timing)
+        if layout is None:
+            # Статус запроса JSON (404/403) — в timing: неверный uid не считается сбоем хоста
+            return False
+        url = dashboard_render_url(job, layout)
+    with span("render", cat="render", run=job.run, host=job.host, dashboard_uid=job.dashboard_uid,
+              panel_id=job.panel_id, service=job.group, metric=job.name) as span_args:
+        ok = download_metric(session, url, job.headers, job.output_file, timing, timeout=job.timeout)
+        span_args.update(ok=ok, status=timing.status, ttfb=round(timing.ttfb, 4),
+                         connect=round(timing.connect, 4), bytes=timing.bytes, retries=timing.retries)
+    if ok:
+        panel_logger.info("    ✅ Успешно: %s/%s.png", job.group, job.name)
+    else:
+        panel_logger.warning("    ❌ Ошибка: %s/%s.png", job.group, job.name)
+    return ok
+
+
+def _metric_options(metric) -> dict:
+    """
+    Таймаут и приоритет метрики для задачи рендера.
+
+    Метрики сервисов приходят как Metric (config_loader), Gatling и PostgreSQL — как словари
+    (config), где таймаут может лежать и в ``vars``.
     """
+    if isinstance(metric, dict):
+        timeout = metric.get('timeout', (metric.get('vars') or {}).get('timeout', 60))
+        priority = parse_priority(metric.get('priority'))
+    else:
+        timeout, priority = metric.timeout, metric.priority
+    return {'timeout': float(timeout or 60), 'priority': priority}
+
+
+def substitute_placeholder(vars_dict: dict, names) -> None:
+    """
+    Заменяет PLACEHOLDER в переменных Grafana на имя сервиса (скрипта).
+
+    Если ``names`` — список, переменная становится мульти-значением: по одному
+    значению на имя (``var-application=a&var-application=b``).
+    """
+    for full_var_name, value in vars_dict.items():
+        if isinstance(value, str) and "PLACEHOLDER" in value:
+            if isinstance(names, list):
+                vars_dict[full_var_name] = [value.replace("PLACEHOLDER", name) for name in names]
+            else:
+                vars_dict[full_var_name] = value.replace("PLACEHOLDER", names)
+
+
+def apply_environment_vars(vars_dict: dict, cfg) -> None:
+    """
+    Подставляет переменные окружения (секция ``environments``, например ``var-namespace``).
+
+    Заменяются только переменные, которые уже есть у метрики: дашборды без переменной
+    namespace рендерятся в каждом окружении как есть.
+    """
+    for name, value in ((cfg.get('environment') or {}).get('vars') or {}).items():
+        full_var_name = name if name.startswith('var-') else f"var-{name}"
+        if full_var_name in vars_dict:
+            vars_dict[full_var_name] = value
+
+
+def _load_metrics_cached(path: str) -> list:
+    """Загружает конфиг метрик (список словарей) с кэшированием по пути и времени изменения."""
     try:
-        if not cfg['services'].get('gatling_metrics_service', False):
-            return
-            
-        logging.info("\n🚀 Начинаем скачивание Gatling метрик")
-        
-        # Получаем включенные Gatling скрипты (поддерживаем разные размещения в конфиге)
-        gatling_scripts = {}
-        source_hint = ""
+        mtime = os.path.getmtime(path)
+    except OSError:
+        mtime = None
+    return _load_metrics_by_mtime(path, mtime)
+
+
+@lru_cache(maxsize=None)
+def _load_metrics_by_mtime(path: str, mtime) -> list:
+    return load_metrics_config(path)
+
+
+def log_job_statistics(results: List[JobResult], title: str) -> None:
+    """
+    Логирует статистику по результатам рендера: по каждому запуску/сервису и общую.
 
-        cand = (cfg.get('gatling_grafana') or {}).get('gatling_scripts') or {}
+    Args:
+        results (list): Результаты JobResult
+        title (str): Заголовок общей статистики
+    """
+    groups = {}
+    for result in results:
+        key = (result.job.run, result.job.source, result.job.group)
+        successful, failed = groups.get(key, (0, 0))
+        groups[key] = (successful + 1, failed) if result.ok else (successful, failed + 1)
+
+    multiple_runs = len({result.job.run for result in results}) > 1
+    for (run, source, group), (successful, failed) in groups.items():
+        prefix = f"[{run}] " if multiple_runs else ""
+        logging.info(f"\n📊 {prefix}Статистика для {source}/{group}:")
+        logging.info(f"  ✅ Успешно скачано: {successful}")
+        logging.info(f"  ❌ Ошибок: {failed}")
+        logging.info(f"  📈 Процент успеха: {(successful/(successful+failed)*100):.1f}%")
+
+    total_successful = sum(1 for result in results if result.ok)
+    deduplicated = sum(1 for result in results if result.ok and result.deduplicated)
+    grand_total = len(results)
+    logging.info(f"\n🎉 Общая статистика {title}:")
+    logging.info(f"  ✅ Всего успешно скачано: {total_successful}")
+    logging.info(f"  ❌ Всего ошибок: {grand_total - total_successful}")
+    if deduplicated:
+        logging.info(f"  ♻️  Получено без повторного рендера: {deduplicated}")
+    retries = sum(result.timing.retries for result in results if result.timing and not result.deduplicated)
+    if retries:
+        logging.info(f"  🔁 Повторов запросов: {retries}")
+    empty = sum(1 for result in results if result.timing and result.timing.empty)
+    if empty:
+        logging.info(f"  ∅ Панелей без данных (заглушка вместо рендера): {empty}")
+    rejected = sum(1 for result in results if result.error == CIRCUIT_OPEN_ERROR)
+    if rejected:
+        logging.info(f"  ⛔ Отклонено circuit breaker (хост недоступен): {rejected}")
+    skipped = [result for result in results if result.error == DEADLINE_ERROR]
+    if skipped:
+        logging.warning(f"  ⌛ Не запущено из-за дедлайна: {len(skipped)} "
+                        f"(макс. приоритет {max(result.job.priority for result in skipped)})")
+    if grand_total > 0:
+        logging.info(f"  📈 Общий процент успеха: {(total_successful/grand_total*100):.1f}%")
+
+
+def _get_gatling_scripts(cfg) -> List[str]:
+    """Возвращает включенные Gatling скрипты (поддерживаем разные размещения в конфиге)."""
+    gatling_scripts = {}
+    source_hint = ""
+
+    cand = (cfg.get('gatling_grafana') or {}).get('gatling_scripts') or {}
+    if isinstance(cand, dict) and cand:
+        gatling_scripts = cand
+        source_hint = "gatling_grafana.gatling_scripts"
+    else:
+        cand = (cfg.get('services') or {}).get('gatling_scripts') or {}
         if isinstance(cand, dict) and cand:
             gatling_scripts = cand
-            source_hint = "gatling_grafana.gatling_scripts"
+            source_hint = "services.gatling_scripts"
         else:
-            cand = (cfg.get('services') or {}).get('gatling_scripts') or {}
+            cand = cfg.get('gatling_scripts') or {}
             if isinstance(cand, dict) and cand:
                 gatling_scripts = cand
-                source_hint = "services.gatling_scripts"
-            else:
-                cand = cfg.get('gatling_scripts') or {}
-                if isinstance(cand, dict) and cand:
-                    gatling_scripts = cand
-                    source_hint = "gatling_scripts"
+                source_hint = "gatling_scripts"
 
-        enabled_scripts = [script_name for script_name, enabled in gatling_scripts.items() if enabled]
+    enabled_scripts = [script_name for script_name, enabled in gatling_scripts.items() if enabled]
+    if enabled_scripts and source_hint:
+        logging.info(f"📋 Использую список Gatling-скриптов из: {source_hint}")
+    return enabled_scripts
 
-        if not enabled_scripts:
-            logging.info("⚠️  Нет включенных Gatling скриптов для скачивания")
-            return
+
+def plan_gatling_jobs(cfg, main_folder_path, scripts: Optional[List[str]] = None) -> List[RenderJob]:
+    """
+    Формирует задачи рендера Gatling метрик для всех включенных скриптов.
+
+    Метрики с ``grouped: true`` рендерятся один раз со всеми скриптами в папку grouped.
+
+    Args:
+        cfg (dict): Конфигурационный словарь из config.yml
+        main_folder_path (str): Путь к основной папке для сохранения метрик
+        scripts (list, optional): Скрипты для рендера (по умолчанию — включенные в конфиге)
+
+    Returns:
+        list: Список задач RenderJob (пустой, если сервис выключен)
+    """
+    if not cfg['services'].get('gatling_metrics_service', False):
+        return []
+
+    run_label = get_run_label(main_folder_path, cfg)
+    enabled_scripts = _get_gatling_scripts(cfg) if scripts is None else scripts
+    if not enabled_scripts:
+        logging.info("⚠️  Нет включенных Gatling скриптов для скачивания")
+        return []
+
+    logging.info(f"📋 Включенные Gatling скрипты: {', '.join(enabled_scripts)}")
+
+    # Получаем конфигурацию для Gatling метрик
+    gatling_metrics_config = _load_metrics_cached(cfg['gatling_grafana']['gatling_metrics_config'])
+
+    # Настраиваем заголовки для аутентификации в Gatling Grafana
+    base_url = str(cfg['gatling_grafana'].get('base_url', '') or '')
+    if (not base_url) or base_url.startswith('/'):
+        fallback = str(cfg.get('grafana', {}).get('base_url', '') or '')
+        if fallback:
+            logging.warning("GATLING_GRAFANA_BASE_URL не задан. Использую grafana.base_url как fallback")
+            base_url = fallback
         else:
-            if source_hint:
-                logging.info(f"📋 Использую список Gatling-скриптов из: {source_hint}")
-            
-        logging.info(f"📋 Включенные Gatling скрипты: {', '.join(enabled_scripts)}")
+            logging.error("GATLING_GRAFANA_BASE_URL не задан или некорректен. Укажите корректный URL в .env")
+            return []
+
+    api_key = str(cfg['gatling_grafana']['api_key'])
+    if not api_key.lower().startswith('bearer '):
+        api_key = f"Bearer {api_key}"
+    gatling_headers = {
+        'Authorization': api_key
+    }
+
+    # Параметры времени
+    timezone = cfg['mainConfig']['timezone']
+    from_time = to_utc_epoch_ms(cfg['mainConfig']['from'], timezone)
+    to_time = to_utc_epoch_ms(cfg['mainConfig']['to'], timezone)
+
+    # Метрики с grouped: true рендерятся один раз со всеми скриптами в мульти-значении переменной
+    gatling_folder = os.path.join(main_folder_path, "metrics", "gatling_metrics")
+    targets = [(script_name, script_name, [metric for metric in gatling_metrics_config if not metric.get('grouped')])
+               for script_name in enabled_scripts]
+    grouped_metrics = [metric for metric in gatling_metrics_config if metric.get('grouped')]
+    if grouped_metrics:
+        targets.append((GROUPED_FOLDER, list(enabled_scripts), grouped_metrics))
+
+    jobs = []
+    for script_name, placeholder, script_metrics in targets:
+        # Папка для каждого скрипта (создаётся при сохранении первой панели)
+        script_folder = os.path.join(gatling_folder, script_name)
+        logging.info(f"📁 Папка скрипта: {script_folder}")
+
+        for metric_index, metric in enumerate(script_metrics, 1):
+            metric_name = metric.get('name', f'metric_{metric_index}')
 
+            # Копируем переменные метрики для модификации
+            vars_dict = metric.get('vars', {}).copy()
+
+            # Заменяем PLACEHOLDER в переменных Grafana на текущее имя скрипта (или список скриптов)
+            substitute_placeholder(vars_dict, placeholder)
+            apply_environment_vars(vars_dict, cfg)
+            apply_resolution_hints(vars_dict, cfg, 'gatling_grafana', metric.get('resolution'),
+                                   (to_time - from_time) / 1000, metric.get('width'))
+
+            # Параметры запроса
+            params = {
+                'base_url': base_url,
+                'dashboard_uid': metric['dashboard_uid'],
+                'dashboard_name': metric['dashboard_name'],
+                'orgId': metric['orgId'],
+                'panelId': metric['panelId'],
+                'width': metric['width'],
+                'height': metric['height'],
+                'timeout': vars_dict.get('timeout', 60),
+                'timezone': timezone,
+                'from': from_time,
+                'to': to_time,
+                'vars': vars_dict
+            }
+
+            # Формируем полный URL для скачивания панели
+            render_url = build_grafana_url(params)
+            if not render_url.startswith('http'):
+                render_url = base_url.rstrip('/') + render_url
+
+            jobs.append(RenderJob(
+                run=run_label,
+                source='gatling',
+                group=script_name,
+                name=metric_name,
+                url=render_url,
+                headers=gatling_headers,
+                output_file=os.path.join(script_folder, f"{metric_name}.png"),
+                dashboard_uid=metric['dashboard_uid'],
+                panel_id=metric['panelId'],
+                window=(to_time - from_time) // 1000,
+                **_metric_options(metric),
+            ))
+    return jobs
+
+
+def plan_postgresql_jobs(cfg, main_folder_path) -> List[RenderJob]:
+    """
+    Формирует задачи рендера PostgreSQL метрик (метрики с префиксом ``postgresql_``).
 
-        # Создаём/переиспользуем HTTP сессию
-        session = session or create_session()
-        
-        # Получаем конфигурацию для Gatling метрик
-        gatling_metrics_config = load_metrics_config(cfg['gatling_grafana']['gatling_metrics_config'])
-        
-        # Настраиваем заголовки для аутентификации в Gatling Grafana
-        base_url = str(cfg['gatling_grafana'].get('base_url', '') or '')
-        if (not base_url) or base_url.startswith('/'):
-            fallback = str(cfg.get('grafana', {}).get('base_url', '') or '')
-            if fallback:
-                logging.warning("GATLING_GRAFANA_BASE_URL не задан. Использую grafana.base_url как fallback")
-                base_url = fallback
-            else:
-                logging.error("GATLING_GRAFANA_BASE_URL не задан или некорректен. Укажите корректный URL в .env")
-                return
-
-        api_key = str(cfg['gatling_grafana']['api_key'])
-        if not api_key.lower().startswith('bearer '):
-            api_key = f"Bearer {api_key}"
-        gatling_headers = {
-            'Authorization': api_key
+    Args:
+        cfg (dict): Конфигурационный словарь из config.yml
+        main_folder_path (str): Путь к основной папке для сохранения метрик
+
+    Returns:
+        list: Список задач RenderJob (пустой, если сервис выключен)
+    """
+    if not cfg['services'].get('postgresql_metrics_service', False):
+        return []
+
+    run_label = get_run_label(main_folder_path, cfg)
+
+    # Получаем конфигурацию и фильтруем только PostgreSQL метрики
+    all_metrics_config = _load_metrics_cached(cfg['postgresql_grafana']['metrics_config'])
+    postgresql_metrics_config = [
+        metric for metric in all_metrics_config
+        if metric.get('name', '').startswith('postgresql_')
+    ]
+
+    if not postgresql_metrics_config:
+        logging.info("⚠️  Нет PostgreSQL метрик для скачивания")
+        return []
+
+    # Настраиваем заголовки для аутентификации в основной Grafana
+    pg_base_url = str(cfg['postgresql_grafana'].get('base_url', '') or '')
+    if (not pg_base_url) or pg_base_url.startswith('/'):
+        fallback = str(cfg.get('grafana', {}).get('base_url', '') or '')
+        if fallback:
+            logging.warning("POSTGRESQL_GRAFANA_BASE_URL не задан. Использую grafana.base_url как fallback")
+            pg_base_url = fallback
+        else:
+            logging.error("POSTGRESQL_GRAFANA_BASE_URL не задан или некорректен. Укажите корректный URL в .env")
+            return []
+
+    pg_api_key = str(cfg['postgresql_grafana']['api_key'])
+    if not pg_api_key.lower().startswith('bearer '):
+        pg_api_key = f"Bearer {pg_api_key}"
+    headers = {
+        'Authorization': pg_api_key
+    }
+
+    # Параметры времени
+    timezone = cfg['mainConfig']['timezone']
+    from_time = to_utc_epoch_ms(cfg['mainConfig']['from'], timezone)
+    to_time = to_utc_epoch_ms(cfg['mainConfig']['to'], timezone)
+
+    # Папка для метрик PostgreSQL
+    postgresql_folder = os.path.join(main_folder_path, "metrics", "postgresql_metrics")
+    logging.info(f"📁 Папка для метрик PostgreSQL: {postgresql_folder}")
+
+    jobs = []
+    for metric_index, metric in enumerate(postgresql_metrics_config, 1):
+        metric_name = metric.get('name', f'metric_{metric_index}')
+
+        # Берём переменные из метрики (и убираем служебные ключи вроде timeout)
+        vars_dict = dict(metric.get('vars', {})) if isinstance(metric.get('vars', {}), dict) else {}
+        if 'timeout' in vars_dict:
+            vars_dict.pop('timeout', None)
+        apply_environment_vars(vars_dict, cfg)
+        apply_resolution_hints(vars_dict, cfg, 'postgresql_grafana', metric.get('resolution'),
+                               (to_time - from_time) / 1000, metric.get('width'))
+
+        # Параметры запроса
+        params = {
+            'base_url': pg_base_url,
+            'dashboard_uid': metric['dashboard_uid'],
+            'dashboard_name': metric['dashboard_name'],
+            'orgId': metric['orgId'],
+            'panelId': metric['panelId'],
+            'width': metric['width'],
+            'height': metric['height'],
+            'timezone': timezone,
+            'from': from_time,
+            'to': to_time,
+            'vars': vars_dict
         }
-        
-        # Параметры времени
-        timezone = cfg['mainConfig']['timezone']
-        from_time = to_utc_epoch_ms(cfg['mainConfig']['from'], timezone)
-        to_time = to_utc_epoch_ms(cfg['mainConfig']['to'], timezone)
-        
-        # Создаем/переиспользуем HTTP сессию
-        session = session or create_session()
-        
-        total_successful = 0
-        total_failed = 0
-        
-        # Проходим по каждому включенному скрипту
-        for script_index, script_name in enumerate(enabled_scripts, 1):
-            logging.info(f"\n📝 [{script_index}/{len(enabled_scripts)}] Обрабатываем скрипт: {script_name}")
-            
-            # Создаем папку для каждого скрипта
-            script_folder = os.path.join(main_folder_path, "metrics", "gatling_metrics", script_name)
-            os.makedirs(script_folder, exist_ok=True)
-            logging.info(f"📁 Папка скрипта: {script_folder}")
-            
-            successful_downloads = 0
-            failed_downloads = 0
-            
-            # Скачиваем все метрики для текущего скрипта
-            for metric_index, metric in enumerate(gatling_metrics_config, 1):
-                metric_name = metric.get('name', f'metric_{metric_index}')
-                logging.info(f"  📈 [{metric_index}/{len(gatling_metrics_config)}] Скачиваем метрику: {metric_name}")
-                
-                try:
-                    # Копируем переменные метрики для модификации
-                    vars_dict = metric.get('vars', {}).copy()
-                    
-                    # Заменяем PLACEHOLDER в переменных Grafana на текущее имя скрипта
-                    for full_var_name, value in vars_dict.items():
-                        if isinstance(value, str) and "PLACEHOLDER" in value:
-                            vars_dict[full_var_name] = value.replace("PLACEHOLDER", script_name)
-                            logging.debug(f"    🔄 Заменили {full_var_name}: {vars_dict[full_var_name]}")
-                    
-                    # Параметры запроса
-                    params = {
-                        'base_url': base_url,
-                        'dashboard_uid': metric['dashboard_uid'],
-                        'dashboard_name': metric['dashboard_name'],
-                        'orgId': metric['orgId'],
-                        'panelId': metric['panelId'],
-                        'width': metric['width'],
-                        'height': metric['height'],
-                        'timeout': vars_dict.get('timeout', 60),
-                        'timezone': timezone,
-                        'from': from_time,
-                        'to': to_time,
-                        'vars': vars_dict
-                    }
-                    
-                    # Формируем полный URL для скачивания панели
-                    render_url = build_grafana_url(params)
-                    if not render_url.startswith('http'):
-                        render_url = base_url.rstrip('/') + render_url
-                    logging.debug(f"    🌐 URL: {render_url}")
-                    
-                    # Определяем имя файла
-                    file_name = f"{metric_name}.png"
-                    output_file = os.path.join(script_folder, file_name)
-                    
-                    # Скачиваем метрику
-                    if download_metric(session, render_url, gatling_headers, output_file):
-                        successful_downloads += 1
-                        logging.info(f"    ✅ Успешно загружено: {file_name}")
-                    else:
-                        failed_downloads += 1
-                        logging.error(f"    ❌ Ошибка при загрузке: {file_name}")
-                        
-                except Exception as e:
-                    failed_downloads += 1
-                    logging.error(f"    💥 Критическая ошибка при скачивании метрики {metric_name}: {str(e)}")
-                    continue
-            
-            # Статистика по скрипту
-            logging.info(f"\n📊 Статистика для скрипта {script_name}:")
-            logging.info(f"  ✅ Успешно скачано: {successful_downloads}")
-            logging.info(f"  ❌ Ошибок: {failed_downloads}")
-            script_total = successful_downloads + failed_downloads
-            if script_total > 0:
-                logging.info(f"  📈 Процент успеха: {(successful_downloads/script_total*100):.1f}%")
-                
-            total_successful += successful_downloads
-            total_failed += failed_downloads
-        
-        # Общая статистика по всем Gatling метрикам
-        logging.info(f"\n🎉 Общая статистика Gatling метрик:")
-        logging.info(f"  ✅ Всего успешно скачано: {total_successful}")
-        logging.info(f"  ❌ Всего ошибок: {total_failed}")
-        grand_total = total_successful + total_failed
-        if grand_total > 0:
-            logging.info(f"  📈 Общий процент успеха: {(total_successful/grand_total*100):.1f}%")
-            
-    except Exception as e:
-        logging.error(f"💥 Критическая ошибка при скачивании Gatling метрик: {str(e)}")
-        raise
 
+        # Формируем полный URL для скачивания панели
+        render_url = build_grafana_url(params)
+        if not render_url.startswith('http'):
+            render_url = pg_base_url.rstrip('/') + render_url
+
+        jobs.append(RenderJob(
+            run=run_label,
+            source='postgresql',
+            group='postgresql_metrics',
+            name=metric_name,
+            url=render_url,
+            headers=headers,
+            output_file=os.path.join(postgresql_folder, f"{metric_name}.png"),
+            dashboard_uid=metric['dashboard_uid'],
+            panel_id=metric['panelId'],
+            window=(to_time - from_time) // 1000,
+            **_metric_options(metric),
+        ))
+    return jobs
+
+
+def plan_service_jobs(cfg, metrics, main_folder_path, services) -> List[RenderJob]:
+    """
+    Формирует задачи рендера метрик для всех включенных сервисов приложений.
+
+    Для каждого сервиса создаёт отдельную папку и заменяет PLACEHOLDER
+    в переменных Grafana на название сервиса. Метрики с ``grouped: true``
+    рендерятся один раз со всеми сервисами (мульти-значение переменной) в папку grouped.
+
+    Args:
+        cfg (dict): Конфигурационный словарь из config.yml
+        metrics (list): Список метрик из metrics_urls.yml
+        main_folder_path (str): Путь к основной папке для сохранения метрик
+        services (list): Список названий включенных сервисов приложений
 
-def download_postgresql_metrics(cfg, main_folder_path, session: Optional[requests.Session] = None):
+    Returns:
+        list: Список задач RenderJob
     """
-    Скачивает метрики PostgreSQL.
+    run_label = get_run_label(main_folder_path, cfg)
+
+    # Базовая папка для всех метрик
+    base_metrics_folder = os.path.join(main_folder_path, "metrics")
+    logging.info(f"📁 Базовая папка для метрик: {base_metrics_folder}")
+
+    # Настраиваем заголовки для аутентификации в основной Grafana
+    gr_base_url = str(cfg['grafana'].get('base_url', '') or '')
+    if (not gr_base_url) or gr_base_url.startswith('/'):
+        logging.error("GRAFANA_BASE_URL не задан или некорректен. Укажите корректный URL в .env")
+        return []
+
+    gr_api_key = str(cfg['grafana']['api_key'])
+    if not gr_api_key.lower().startswith('bearer '):
+        gr_api_key = f"Bearer {gr_api_key}"
+    headers = {
+        'Authorization': gr_api_key  # Bearer token для доступа к API
+    }
+
+    # Извлекаем параметры времени из конфигурации
+    timezone = cfg['mainConfig']['timezone']        # Часовой пояс (например, Europe/Moscow)
+    from_time = to_utc_epoch_ms(cfg['mainConfig']['from'], timezone)  # Начальное время (epoch ms)
+    to_time = to_utc_epoch_ms(cfg['mainConfig']['to'], timezone)      # Конечное время (epoch ms)
+
+    logging.info(f"⏰ Временной диапазон: {cfg['mainConfig']['from']} - {cfg['mainConfig']['to']} ({timezone})")
+    logging.info(f"🔄 Конвертировано в UTC: {from_time} - {to_time}")
+
+    # Фильтруем PostgreSQL метрики, так как они скачиваются отдельно
+    service_metrics = [metric for metric in metrics if not getattr(metric, 'name', '').startswith('postgresql_')]
+
+    logging.info(f"🚀 Планируем скачивание метрик для {len(services)} сервисов: {', '.join(services)}")
+
+    # Метрики с grouped: true рендерятся один раз со всеми сервисами в мульти-значении переменной
+    targets = [(service, service, [metric for metric in service_metrics if not metric.grouped])
+               for service in services]
+    grouped_metrics = [metric for metric in service_metrics if metric.grouped]
+    if grouped_metrics and services:
+        targets.append((GROUPED_FOLDER, list(services), grouped_metrics))
+
+    jobs = []
+    for service, placeholder, group_metrics in targets:
+        # Отдельная папка для каждого сервиса
+        service_folder = os.path.join(base_metrics_folder, service)
+        logging.info(f"📁 Папка сервиса: {service_folder}")
+
+        for metric_index, metric in enumerate(group_metrics, 1):
+            metric_name = getattr(metric, 'name', f'metric_{metric_index}')
+
+            # Копируем переменные метрики для модификации
+            vars_dict = getattr(metric, 'vars', {}).copy()
+
+            # Заменяем PLACEHOLDER в переменных Grafana на название текущего сервиса (или список сервисов)
+            # Переменные уже имеют префикс var- в конфиге, поэтому работаем с полными именами
+            substitute_placeholder(vars_dict, placeholder)
+            apply_environment_vars(vars_dict, cfg)
+            apply_resolution_hints(vars_dict, cfg, 'grafana', metric.resolution,
+                                   (to_time - from_time) / 1000, metric.width)
+
+            params = {
+                'base_url': gr_base_url,           # URL Grafana сервера
+                'dashboard_uid': metric.dashboard_uid,         # Уникальный ID dashboard'а
+                'dashboard_name': metric.dashboard_name,       # Название dashboard'а
+                'orgId': metric.orgId,                         # ID организации
+                'panelId': metric.panelId,                     # ID панели
+                'width': metric.width,                         # Ширина изображения
+                'height': metric.height,                       # Высота изображения
+                'timeout': getattr(metric, 'timeout', vars_dict.get('timeout', 60)),  # Таймаут
+                'timezone': timezone,                             # Часовой пояс
+                'from': from_time,                                # Начальное время (UTC)
+                'to': to_time,                                    # Конечное время (UTC)
+                'vars': vars_dict                                 # Переменные dashboard'а
+            }
+
+            # Формируем полный URL для скачивания панели
+            render_url = build_grafana_url(params)
+            if not render_url.startswith('http'):
+                render_url = gr_base_url.rstrip('/') + render_url
+            panel_logger.debug("    🌐 Полный URL: %s", render_url)
+
+            jobs.append(RenderJob(
+                run=run_label,
+                source='grafana',
+                group=service,
+                name=metric_name,
+                url=render_url,
+                headers=headers,
+                output_file=os.path.join(service_folder, f"{metric_name}.png"),
+                dashboard_uid=metric.dashboard_uid,
+                panel_id=metric.panelId,
+                window=(to_time - from_time) // 1000,
+                **_metric_options(metric),
+            ))
+    # Опционально: один рендер дашборда на сервис и окно вместо рендера каждой панели
+    return group_dashboard_jobs(jobs, dashboard_render_settings(cfg))
+
+
+def group_by_run_settings(results: List[JobResult], cfg, runs, settings_func) -> List[Tuple[dict, List[int]]]:
+    """
+    Группирует результаты по настройкам их запусков: секции ``grafana`` могут быть
+    переопределены для отдельного запуска в runs.yml.
 
+    Args:
+        results (list): Результаты стадии (запуск задачи — ``job.run``)
+        cfg (dict): Конфиг для задач без запуска в ``runs``
+        runs (list, optional): Запуски стадии (Run с label и cfg)
+        settings_func (callable): Функция настроек секции, например image_check_settings
+
+    Returns:
+        list: Пары (настройки, индексы результатов) — по одной на различающиеся настройки
+    """
+    settings_by_run = {run.label: settings_func(run.cfg) for run in runs or ()}
+    default = settings_func(cfg)
+    groups: List[Tuple[dict, List[int]]] = []
+    for index, result in enumerate(results):
+        settings = settings_by_run.get(result.job.run, default)
+        for existing, indexes in groups:
+            if existing == settings:
+                indexes.append(index)
+                break
+        else:
+            groups.append((settings, [index]))
+    return groups
+
+
+def finish_dashboard_renders(results: List[JobResult], scheduler: RenderScheduler, cfg,
+                             runs=None) -> List[JobResult]:
+    """
+    Вырезает панели из снимков дашбордов (режим ``grafana.dashboard_render``)
+    с настройками запуска каждой задачи.
+
+    Returns:
+        list: Результаты по панелям (без задач рендера дашбордов)
+    """
+    expanded = []
+    with span("dashboard.crop"):
+        for settings, indexes in group_by_run_settings(results, cfg, runs, dashboard_render_settings):
+            expanded += crop_dashboard_results([results[index] for index in indexes], scheduler, settings)
+    return expanded
+
+
+def check_images(results: List[JobResult], scheduler: RenderScheduler, cfg, runs=None) -> List[JobResult]:
+    """
+    Проверяет скачанные PNG (режим ``grafana.image_check``) с настройками запуска каждой
+    задачи и повторяет рендер пустых и ошибочных панелей.
+
+    Returns:
+        list: Результаты в исходном порядке с заменёнными результатами повторённых задач
+    """
+    results = list(results)
+    with span("images.check"):
+        for settings, indexes in group_by_run_settings(results, cfg, runs, image_check_settings):
+            checked = check_results([results[index] for index in indexes], scheduler, settings)
+            for index, result in zip(indexes, checked):
+                results[index] = result
+    return results
+
+
+def finish_optimization(results: List[JobResult], scheduler: RenderScheduler) -> List[JobResult]:
+    """
+    Завершает пересжатие картинок (режим ``grafana.optimize``): копии дублей, вырезанные
+    и повторённые панели, конвертация в webp/avif; выводит сэкономленный объём.
+
+    Returns:
+        list: Результаты (при конвертации — с новыми путями файлов)
+    """
+    if scheduler.optimizer is None:
+        return results
+    with span("images.optimize"):
+        return scheduler.optimizer.finish(results)
+
+
+def plan_grafana_jobs(cfg, metrics, main_folder_path, services,
+                      sessions: Optional[SessionRegistry] = None) -> List[RenderJob]:
+    """
+    Формирует все задачи стадии -grafana для одного запуска.
+
+    При ``grafana_service: false`` планируются только Gatling метрики
+    (если включён ``gatling_metrics_service``). Если переданы ``sessions`` и включён
+    ``discovery``, сервисы и скрипты без данных в окне запуска отбрасываются до рендера.
+
+    Returns:
+        list: Список задач RenderJob (Gatling, PostgreSQL и метрики сервисов)
+    """
+    scripts = None
+    if sessions is not None and discovery_settings(cfg)['enabled']:
+        with span("plan.discovery"):
+            scripts = _get_gatling_scripts(cfg) if cfg['services'].get('gatling_metrics_service', False) else []
+            if not cfg.get('services', {}).get('grafana_service', True):
+                services = []
+            services, scripts, _ = discover_targets(cfg, sessions, services, scripts)
+    with span("plan.gatling"):
+        jobs = plan_gatling_jobs(cfg, main_folder_path, scripts)
+    if not cfg.get('services', {}).get('grafana_service', True):
+        return jobs
+    with span("plan.postgresql"):
+        jobs += plan_postgresql_jobs(cfg, main_folder_path)
+    with span("plan.services", services=len(services)):
+        jobs += plan_service_jobs(cfg, metrics, main_folder_path, services)
+    return jobs
+
+
+def download_gatling_metrics(cfg, main_folder_path, sessions: Optional[SessionRegistry] = None):
+    """
+    Скачивает метрики Gatling для всех включенных скриптов.
+    
     Args:
         cfg (dict): Конфигурационный словарь из config.yml
         main_folder_path (str): Путь к основной папке для сохранения метрик
+        sessions (SessionRegistry, optional): Общий реестр сессий
     """
     try:
-        if not cfg['services'].get('postgresql_metrics_service', False):
+        if not cfg['services'].get('gatling_metrics_service', False):
             return
 
-        logging.info("\n🚀 Начинаем скачивание PostgreSQL метрик")
-
-        # Получаем конфигурацию для PostgreSQL метрик
-        all_metrics_config = load_metrics_config(cfg['postgresql_grafana']['metrics_config'])
-        
-        # Фильтруем только PostgreSQL метрики
-        postgresql_metrics_config = [
-            metric for metric in all_metrics_config 
-            if metric.get('name', '').startswith('postgresql_')
-        ]
-        
-        if not postgresql_metrics_config:
-            logging.info("⚠️  Нет PostgreSQL метрик для скачивания")
+        logging.info("\n🚀 Начинаем скачивание Gatling метрик")
+        jobs = plan_gatling_jobs(cfg, main_folder_path)
+        if not jobs:
             return
 
-        # Настраиваем заголовки для аутентификации в основной Grafana
-        pg_base_url = str(cfg['postgresql_grafana'].get('base_url', '') or '')
-        if (not pg_base_url) or pg_base_url.startswith('/'):
-            fallback = str(cfg.get('grafana', {}).get('base_url', '') or '')
-            if fallback:
-                logging.warning("POSTGRESQL_GRAFANA_BASE_URL не задан. Использую grafana.base_url как fallback")
-                pg_base_url = fallback
-            else:
-                logging.error("POSTGRESQL_GRAFANA_BASE_URL не задан или некорректен. Укажите корректный URL в .env")
-                return
-
-        pg_api_key = str(cfg['postgresql_grafana']['api_key'])
-        if not pg_api_key.lower().startswith('bearer '):
-            pg_api_key = f"Bearer {pg_api_key}"
-        headers = {
-            'Authorization': pg_api_key
-        }
-
-        # Параметры времени
-        timezone = cfg['mainConfig']['timezone']
-        from_time = to_utc_epoch_ms(cfg['mainConfig']['from'], timezone)
-        to_time = to_utc_epoch_ms(cfg['mainConfig']['to'], timezone)
+        scheduler = create_scheduler(cfg, sessions)
+        try:
+            results = scheduler.run(jobs)
+        finally:
+            scheduler.close()
+        log_job_statistics(results, "Gatling метрик")
 
-        # Создаем/переиспользуем HTTP сессию
-        session = session or create_session()
+    except Exception as e:
+        logging.error(f"💥 Критическая ошибка при скачивании Gatling метрик: {str(e)}")
+        raise
 
-        successful_downloads = 0
-        failed_downloads = 0
 
-        # Переменные Grafana берём из каждой метрики (metrics_urls.yml)
+def download_postgresql_metrics(cfg, main_folder_path, sessions: Optional[SessionRegistry] = None):
+    """
+    Скачивает метрики PostgreSQL.
 
-        # Создаем папку для метрик PostgreSQL
-        postgresql_folder = os.path.join(main_folder_path, "metrics", "postgresql_metrics")
-        os.makedirs(postgresql_folder, exist_ok=True)
-        logging.info(f"📁 Папка для метрик PostgreSQL: {postgresql_folder}")
+    Args:
+        cfg (dict): Конфигурационный словарь из config.yml
+        main_folder_path (str): Путь к основной папке для сохранения метрик
+        sessions (SessionRegistry, optional): Общий реестр сессий
+    """
+    try:
+        if not cfg['services'].get('postgresql_metrics_service', False):
+            return
 
-        # Проходим по PostgreSQL метрикам
-        for metric_index, metric in enumerate(postgresql_metrics_config, 1):
-            metric_name = metric.get('name', f'metric_{metric_index}')
-            logging.info(f"  📈 [{metric_index}/{len(postgresql_metrics_config)}] Скачиваем метрику: {metric_name}")
+        logging.info("\n🚀 Начинаем скачивание PostgreSQL метрик")
+        jobs = plan_postgresql_jobs(cfg, main_folder_path)
+        if not jobs:
+            return
 
-            try:
-                # Берём переменные из метрики (и убираем служебные ключи вроде timeout)
-                vars_dict = dict(metric.get('vars', {})) if isinstance(metric.get('vars', {}), dict) else {}
-                if 'timeout' in vars_dict:
-                    vars_dict.pop('timeout', None)
-
-                # Параметры запроса
-                params = {
-                    'base_url': pg_base_url,
-                    'dashboard_uid': metric['dashboard_uid'],
-                    'dashboard_name': metric['dashboard_name'],
-                    'orgId': metric['orgId'],
-                    'panelId': metric['panelId'],
-                    'width': metric['width'],
-                    'height': metric['height'],
-                    'timezone': timezone,
-                    'from': from_time,
-                    'to': to_time,
-                    'vars': vars_dict
-                }
-
-                # Формируем полный URL для скачивания панели
-                render_url = build_grafana_url(params)
-                if not render_url.startswith('http'):
-                    render_url = pg_base_url.rstrip('/') + render_url
-                logging.debug(f"    🌐 URL: {render_url}")
-
-                # Определяем имя файла
-                file_name = f"{metric_name}.png"
-                output_file = os.path.join(postgresql_folder, file_name)
-
-                # Скачиваем метрику
-                if download_metric(session, render_url, headers, output_file):
-                    successful_downloads += 1
-                    logging.info(f"    ✅ Успешно загружено: {file_name}")
-                else:
-                    failed_downloads += 1
-                    logging.error(f"    ❌ Ошибка при загрузке: {file_name}")
-
-            except Exception as e:
-                failed_downloads += 1
-                logging.error(f"    💥 Критическая ошибка при скачивании метрики {metric_name}: {str(e)}")
-                continue
-
-
-        # Создаём/переиспользуем HTTP сессию
-        session = session or create_session()
-
-        # Статистика по PostgreSQL метрикам
-        logging.info(f"\n📊 Статистика для PostgreSQL метрик:")
-        logging.info(f"  ✅ Успешно скачано: {successful_downloads}")
-        logging.info(f"  ❌ Ошибок: {failed_downloads}")
-        total = successful_downloads + failed_downloads
-        if total > 0:
-            logging.info(f"  📈 Общий процент успеха: {(successful_downloads/total*100):.1f}%")
+        scheduler = create_scheduler(cfg, sessions)
+        try:
+            results = scheduler.run(jobs)
+        finally:
+            scheduler.close()
+        log_job_statistics(results, "PostgreSQL метрик")
 
     except Exception as e:
         logging.error(f"💥 Критическая ошибка при скачивании PostgreSQL метрик: {str(e)}")
         raise
 
-def download_grafana_metrics(cfg, metrics, main_folder_path, services):
+def download_grafana_metrics(cfg, metrics, main_folder_path, services, scheduler: Optional[RenderScheduler] = None):
     """
     Скачивает метрики из Grafana для всех включенных сервисов приложений.
     
@@ -424,154 +962,39 @@ def download_grafana_metrics(cfg, metrics, main_folder_path, services):
     2. Для каждого включенного сервиса (где значение = true) создает отдельную папку
     3. Скачивает все метрики для каждого сервиса в его папку
     4. Заменяет PLACEHOLDER на реальные названия сервисов
-    5. Скачивает Gatling метрики (если включено)
+    5. Скачивает Gatling и PostgreSQL метрики (если включено)
     
+    Все рендеры выполняются через общий планировщик параллельно.
+
     Args:
         cfg (dict): Конфигурационный словарь из config.yml
         metrics (list): Список метрик из metrics_urls.yml  
         main_folder_path (str): Путь к основной папке для сохранения метрик
         services (list): Список названий включенных сервисов приложений (где значение = true)
+        scheduler (RenderScheduler, optional): Общий планировщик (создаётся, если не передан)
         
     Raises:
         Exception: Если возникла критическая ошибка при скачивании метрик
     """
+    # Планировщик, созданный здесь, закрывается здесь же (история длительностей рендера, пул пересжатия)
+    own = scheduler is None
     try:
-        # ========== ПОДГОТОВКА ПАПОК И КОНФИГУРАЦИИ ==========
-        
-        # Создаем базовую папку для всех метрик
-        base_metrics_folder = os.path.join(main_folder_path, "metrics")
-        os.makedirs(base_metrics_folder, exist_ok=True)
-        logging.info(f"📁 Создана базовая папка для метрик: {base_metrics_folder}")
-        
-        # Настраиваем заголовки для аутентификации в основной Grafana
-        gr_base_url = str(cfg['grafana'].get('base_url', '') or '')
-        if (not gr_base_url) or gr_base_url.startswith('/'):
-            logging.error("GRAFANA_BASE_URL не задан или некорректен. Укажите корректный URL в .env")
+        scheduler = scheduler or create_scheduler(cfg)
+        jobs = plan_grafana_jobs(cfg, metrics, main_folder_path, services, scheduler.sessions)
+        if not jobs:
+            logging.info("⚠️  Нет метрик для скачивания")
             return
 
-        gr_api_key = str(cfg['grafana']['api_key'])
-        if not gr_api_key.lower().startswith('bearer '):
-            gr_api_key = f"Bearer {gr_api_key}"
-        headers = {
-            'Authorization': gr_api_key  # Bearer token для доступа к API
-        }
-        
-        # ========== ПАРАМЕТРЫ ВРЕМЕНИ ==========
-        
-        # Извлекаем параметры времени из конфигурации
-        timezone = cfg['mainConfig']['timezone']        # Часовой пояс (например, Europe/Moscow)
-        from_time = to_utc_epoch_ms(cfg['mainConfig']['from'], timezone)  # Начальное время (epoch ms)
-        to_time = to_utc_epoch_ms(cfg['mainConfig']['to'], timezone)      # Конечное время (epoch ms)
-        
-        logging.info(f"⏰ Временной диапазон: {cfg['mainConfig']['from']} - {cfg['mainConfig']['to']} ({timezone})")
-        logging.info(f"🔄 Конвертировано в UTC: {from_time} - {to_time}")
-
-        # Создаем HTTP сессию с настройками повторных попыток
-        session = create_session()
-        
-        # ========== СКАЧИВАНИЕ GATLING МЕТРИК ==========
-        download_gatling_metrics(cfg, main_folder_path, session)
-        
-        # ========== СКАЧИВАНИЕ POSTGRESQL МЕТРИК ==========
-        download_postgresql_metrics(cfg, main_folder_path, session)
-        
-        # ========== ОБРАБОТКА СЕРВИСОВ ==========
-        
-        total_services = len(services)
-        logging.info(f"🚀 Начинаем скачивание метрик для {total_services} сервисов: {', '.join(services)}")
-        
-        # Проходим по всем активным сервисам приложений
-        for service_index, service in enumerate(services, 1):
-            logging.info(f"\n📊 [{service_index}/{total_services}] Обрабатываем сервис: {service}")
-            
-            # Создаем отдельную папку для каждого сервиса
-            service_folder = os.path.join(base_metrics_folder, service)
-            os.makedirs(service_folder, exist_ok=True)
-            logging.info(f"📁 Папка сервиса: {service_folder}")
-
-            # ========== ОБРАБОТКА МЕТРИК ==========
-            
-            total_metrics = len(metrics)
-            successful_downloads = 0
-            failed_downloads = 0
-            
-            # Фильтруем PostgreSQL метрики, так как они скачиваются отдельно
-            service_metrics = [metric for metric in metrics if not getattr(metric, 'name', '').startswith('postgresql_')]
-            
-            for metric_index, metric in enumerate(service_metrics, 1):
-                metric_name = getattr(metric, 'name', f'metric_{metric_index}')  # Инициализируем metric_name сразу
-                try:
-                    logging.info(f"  📈 [{metric_index}/{len(service_metrics)}] Скачиваем метрику: {metric_name}")
-
-                    # Копируем переменные метрики для модификации
-                    vars_dict = getattr(metric, 'vars', {}).copy()
-
-                    # ========== ЗАМЕНА PLACEHOLDER НА РЕАЛЬНЫЕ ЗНАЧЕНИЯ ==========
-                    
-                    # Заменяем PLACEHOLDER в переменных Grafana на название текущего сервиса
-                    # Переменные уже имеют префикс var- в конфиге, поэтому работаем с полными именами
-                    for full_var_name, value in vars_dict.items():
-                        if isinstance(value, str) and "PLACEHOLDER" in value:
-                            vars_dict[full_var_name] = value.replace("PLACEHOLDER", service)
-                            logging.debug(f"    🔄 Заменили {full_var_name}: {vars_dict[full_var_name]}")
-
-                    # ========== ФОРМИРОВАНИЕ ПАРАМЕТРОВ ЗАПРОСА ==========
-                    
-                    params = {
-                        'base_url': gr_base_url,           # URL Grafana сервера
-                        'dashboard_uid': metric.dashboard_uid,         # Уникальный ID dashboard'а
-                        'dashboard_name': metric.dashboard_name,       # Название dashboard'а
-                        'orgId': metric.orgId,                         # ID организации
-                        'panelId': metric.panelId,                     # ID панели
-                        'width': metric.width,                         # Ширина изображения
-                        'height': metric.height,                       # Высота изображения
-                        'timeout': getattr(metric, 'timeout', vars_dict.get('timeout', 60)),  # Таймаут
-                        'timezone': timezone,                             # Часовой пояс
-                        'from': from_time,                                # Начальное время (UTC)
-                        'to': to_time,                                    # Конечное время (UTC)
-                        'vars': vars_dict                                 # Переменные dashboard'а
-                    }
-
-                    # Формируем полный URL для скачивания панели
-                    render_url = build_grafana_url(params)
-                    if not render_url.startswith('http'):
-                        render_url = gr_base_url.rstrip('/') + render_url
-                    logging.info(f"    🌐 Полный URL: {render_url}")
-
-                    # ========== ОПРЕДЕЛЕНИЕ ИМЕНИ ФАЙЛА ==========
-                    
-                    # Формируем имя файла для сохранения
-                    file_name = f"{metric_name}.png"
-                    output_file = os.path.join(service_folder, file_name)
-
-                    # ========== СКАЧИВАНИЕ МЕТРИКИ ==========
-                    
-                    # Скачиваем изображение панели
-                    if download_metric(session, render_url, headers, output_file):
-                        successful_downloads += 1
-                        logging.info(f"    ✅ Успешно: {file_name}")
-                    else:
-                        failed_downloads += 1
-                        logging.warning(f"    ❌ Ошибка: {file_name}")
-
-                except Exception as e:
-                    failed_downloads += 1
-                    logging.error(f"    💥 Критическая ошибка при скачивании метрики {metric_name}: {str(e)}")
-                    continue
-            
-            # ========== СТАТИСТИКА ПО СЕРВИСУ ==========
-            
-            logging.info(f"\n📊 Статистика для сервиса {service}:")
-            logging.info(f"  ✅ Успешно скачано: {successful_downloads}")
-            logging.info(f"  ❌ Ошибок: {failed_downloads}")
-            if successful_downloads + failed_downloads > 0:
-                logging.info(f"  📈 Общий процент успеха: {(successful_downloads/(successful_downloads+failed_downloads)*100):.1f}%")
-        
-        # ========== ОБЩАЯ СТАТИСТИКА ==========
-        
-        logging.info(f"\n🎉 Скачивание метрик завершено для всех {total_services} сервисов!")
-        logging.info(f"📁 Результаты сохранены в: {base_metrics_folder}")
+        scheduler.retry_budget.reset()
+        results = finish_dashboard_renders(scheduler.run(jobs), scheduler, cfg)
+        results = check_images(results, scheduler, cfg)
+        results = finish_optimization(results, scheduler)
+        log_job_statistics(results, "метрик Grafana")
+        logging.info(f"📁 Результаты сохранены в: {os.path.join(main_folder_path, 'metrics')}")
 
     except Exception as e:
         logging.error(f"💥 Критическая ошибка при скачивании метрик Grafana: {str(e)}")
         raise
+    finally:
+        if own and scheduler is not None:
+            scheduler.close()
@@ -0,0 +1,75 @@
+import logging
+import threading
+import urllib.parse
+from typing import Callable, Dict
+
+
+class SessionRegistry:
+    """
+    Реестр HTTP-сессий: одна keep-alive сессия с пулом соединений на каждый хост Grafana.
+
+    Размер пула соединений сессии равен лимиту параллельных запросов к хосту,
+    поэтому соединения не открываются сверх лимита и не закрываются из-за
+    переполнения пула — TLS-рукопожатие выполняется один раз на соединение
+    за весь запуск (и пакет запусков).
+    """
+
+    def __init__(self, session_factory: Callable, pool_maxsize: int = 2):
+        """
+        Args:
+            session_factory (Callable): Функция ``session_factory(pool_maxsize) -> requests.Session``
+            pool_maxsize (int): Размер пула соединений сессии (лимит параллельных запросов к хосту)
+        """
+        self.session_factory = session_factory
+        self.pool_maxsize = max(1, int(pool_maxsize))
+        self._sessions: Dict[str, object] = {}
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def host_of(host_or_url: str) -> str:
+        """Возвращает хост (netloc) для URL или уже выделенного хоста."""
+        return urllib.parse.urlsplit(host_or_url).netloc or host_or_url
+
+    def get(self, host_or_url: str):
+        """Возвращает сессию хоста, создавая её при первом обращении."""
+        host = self.host_of(host_or_url)
+        with self._lock:
+            if host not in self._sessions:
+                self._sessions[host] = self.session_factory(self.pool_maxsize)
+                self._stats[host] = {'requests': 0, 'new_connections': 0}
+            return self._sessions[host]
+
+    def record(self, host_or_url: str, new_connections: int) -> None:
+        """Учитывает выполненный запрос и число открытых им соединений."""
+        host = self.host_of(host_or_url)
+        with self._lock:
+            item = self._stats.setdefault(host, {'requests': 0, 'new_connections': 0})
+            item['requests'] += 1
+            item['new_connections'] += new_connections
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Счётчики по хостам: requests, new_connections, reused (запросы на уже открытых соединениях)."""
+        with self._lock:
+            return {
+                host: {**item, 'reused': max(0, item['requests'] - item['new_connections'])}
+                for host, item in self._stats.items()
+            }
+
+    def log_stats(self) -> None:
+        """Логирует переиспользование соединений по хостам."""
+        for host, item in sorted(self.stats().items()):
+            if not item['requests']:
+                continue
+            reuse = item['reused'] / item['requests'] * 100
+            logging.info(
+                f"🔌 {host}: запросов {item['requests']}, новых соединений {item['new_connections']}, "
+                f"переиспользовано {reuse:.0f}% (пул {self.pool_maxsize})"
+            )
+
+    def close(self) -> None:
+        """Закрывает все сессии и их пулы соединений."""
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
@@ -0,0 +1,151 @@
+import math
+import struct
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import replace
+from typing import Dict, List, Optional
+
+from probe import is_placeholder
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow — необязательная зависимость: без неё проверка по степени сжатия PNG
+    Image = None
+
+try:
+    import numpy as np
+except ImportError:  # numpy — необязательная зависимость: без неё красные пиксели ошибок не считаются
+    np = None
+
+_DEFAULT_IMAGE_CHECK = {
+    'enabled': False,
+    'workers': 4,                  # Процессов для декодирования PNG
+    'requeue': True,               # Повторить рендер панелей, признанных пустыми или ошибочными
+    'min_ink': 0.01,               # Минимальная доля пикселей, отличных от фона
+    'error_red': 0.0005,           # Доля «красных» пикселей (значок ошибки панели)
+    'max_compression_ratio': 100,  # Без Pillow: несжатый размер / размер PNG выше порога — пустая картинка
+}
+
+# Каналов на пиксель по типу цвета PNG
+_PNG_CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
+
+# Отличие от фона по яркости, с которого пиксель считается «чернилами»
+_INK_DELTA = 24
+
+# Размер, до которого уменьшается картинка перед подсчётом статистик
+_THUMBNAIL = (480, 480)
+
+
+def image_check_settings(cfg) -> dict:
+    """Настройки ``grafana.image_check`` со значениями по умолчанию."""
+    settings = dict(_DEFAULT_IMAGE_CHECK)
+    settings.update((cfg.get('grafana') or {}).get('image_check') or {})
+    return settings
+
+
+def png_compression_ratio(path: str) -> Optional[float]:
+    """Отношение несжатого размера изображения к размеру данных IDAT (по заголовкам PNG, без декодирования)."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    if not data.startswith(b'\x89PNG\r\n\x1a\n'):
+        return None
+    offset, idat, raw = 8, 0, 0
+    while offset + 8 <= len(data):
+        length, kind = struct.unpack('>I4s', data[offset:offset + 8])
+        if kind == b'IHDR':
+            width, height, depth, color = struct.unpack('>IIBB', data[offset + 8:offset + 18])
+            raw = height * (1 + math.ceil(width * _PNG_CHANNELS.get(color, 4) * depth / 8))
+        elif kind == b'IDAT':
+            idat += length
+        offset += length + 12
+    return raw / idat if idat else None
+
+
+def pixel_stats(path: str) -> Dict[str, float]:
+    """
+    Статистики пикселей уменьшенной копии картинки (нужен Pillow).
+
+    ink — доля пикселей, отличных по яркости от фона (самого частого значения);
+    red — доля насыщенно-красных пикселей (только с numpy).
+    """
+    with Image.open(path) as image:
+        image = image.convert('RGB')
+        image.thumbnail(_THUMBNAIL)
+    if np is not None:
+        rgb = np.asarray(image, dtype=np.int16)
+        gray = rgb.mean(axis=2)
+        values, counts = np.unique(gray.astype(np.uint8), return_counts=True)
+        background = float(values[counts.argmax()])
+        ink = float(np.mean(np.abs(gray - background) > _INK_DELTA))
+        red = float(np.mean((rgb[..., 0] > 180) & (rgb[..., 1] < 90) & (rgb[..., 2] < 90)))
+        return {'ink': ink, 'red': red}
+    histogram = image.convert('L').histogram()
+    background = max(range(256), key=histogram.__getitem__)
+    near = sum(histogram[max(0, background - _INK_DELTA):background + _INK_DELTA + 1])
+    return {'ink': 1 - near / max(1, sum(histogram)), 'red': 0.0}
+
+
+def classify_image(path: str, settings: dict) -> str:
+    """
+    Классифицирует скачанную панель (выполняется в процессе пула).
+
+    Returns:
+        str: ok | blank (пустая панель, «No data») | error (значок ошибки панели) | placeholder (заглушка пробы)
+    """
+    try:
+        if is_placeholder(path):
+            return 'placeholder'
+        if Image is None:
+            ratio = png_compression_ratio(path)
+            return 'blank' if ratio is not None and ratio > settings['max_compression_ratio'] else 'ok'
+        stats = pixel_stats(path)
+    except Exception:
+        return 'error'
+    if stats['ink'] >= settings['min_ink']:
+        return 'ok'
+    return 'error' if stats['red'] >= settings['error_red'] else 'blank'
+
+
+def classify_images(paths: List[str], settings: dict) -> List[str]:
+    """Классифицирует картинки в пуле процессов."""
+    if not paths:
+        return []
+    workers = max(1, min(int(settings.get('workers') or 1), len(paths)))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(classify_image, paths, [settings] * len(paths), chunksize=8))
+
+
+def check_results(results: list, scheduler, settings: dict) -> list:
+    """
+    Проверяет скачанные панели и повторяет рендер только пустых и ошибочных.
+
+    Повтор выполняется один раз; панели, оставшиеся пустыми или ошибочными,
+    перечисляются в логе (результат остаётся успешным — панель может быть пустой на самом деле).
+
+    Returns:
+        list: Результаты той же длины; повторённые задачи заменены новыми результатами
+    """
+    if not settings['enabled']:
+        return results
+    checked = [index for index, result in enumerate(results) if result.ok]
+    verdicts = classify_images([results[index].job.output_file for index in checked], settings)
+    flagged = [index for index, verdict in zip(checked, verdicts) if verdict in ('blank', 'error')]
+    if not flagged:
+        return results
+
+    logging.warning(f"🖼️  Пустых или ошибочных картинок: {len(flagged)} из {len(checked)}"
+                    + (", повторяем рендер" if settings['requeue'] else ""))
+    results = list(results)
+    if settings['requeue']:
+        rerun = scheduler.run([results[index].job for index in flagged])
+        for index, result in zip(flagged, rerun):
+            results[index] = result
+        retry = [index for index in flagged if results[index].ok]
+        verdicts = classify_images([results[index].job.output_file for index in retry], settings)
+        flagged = [index for index, verdict in zip(retry, verdicts) if verdict in ('blank', 'error')]
+    for index in flagged:
+        job = results[index].job
+        logging.warning(f"  🖼️  [{job.run}] {job.group}/{job.name}.png: пустая или с ошибкой "
+                        f"({job.dashboard_uid}#{job.panel_id})")
+        results[index] = replace(results[index], error='blank image')
+    return results
@@ -0,0 +1,252 @@
+import io
+import os
+import zlib
+import struct
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import replace
+from typing import Dict, List, Optional, Tuple
+
+from dashboard_render import DashboardJob
+from probe import is_placeholder
+from image_check import image_check_settings
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow — необязательная зависимость: без неё только пересжатие PNG средствами zlib
+    Image = None
+
+_DEFAULT_OPTIMIZE = {
+    'enabled': False,
+    'format': 'png',         # png — пересжатие без потерь | webp | avif (нужен Pillow)
+    'workers': 2,            # Процессов для пересжатия
+    'level': 9,              # Уровень zlib для PNG
+    'lossless': True,        # webp/avif без потерь
+    'quality': 90,           # Качество webp/avif с потерями
+}
+
+FORMATS = ('png', 'webp', 'avif')
+
+_PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+
+def optimize_settings(cfg) -> dict:
+    """Настройки ``grafana.optimize`` со значениями по умолчанию (webp/avif без Pillow заменяются на png)."""
+    settings = dict(_DEFAULT_OPTIMIZE)
+    settings.update((cfg.get('grafana') or {}).get('optimize') or {})
+    if settings['format'] not in FORMATS:
+        raise ValueError(f"Неизвестный формат '{settings['format']}' в grafana.optimize: ожидается png, webp или avif")
+    if settings['format'] != 'png':
+        if Image is None:
+            logging.warning(f"⚠️  grafana.optimize: формат {settings['format']} требует Pillow — пересжимаем PNG")
+            settings['format'] = 'png'
+        elif settings['format'].upper() not in Image.registered_extensions().values():
+            logging.warning(f"⚠️  grafana.optimize: Pillow собран без поддержки {settings['format']} — пересжимаем PNG")
+            settings['format'] = 'png'
+    return settings
+
+
+def _png_chunk(kind: bytes, data: bytes) -> bytes:
+    return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff)
+
+
+def recompress_png(data: bytes, level: int = 9) -> Optional[bytes]:
+    """
+    Пересжимает данные IDAT без изменения пикселей и остальных чанков.
+
+    Пробует стратегии zlib по умолчанию и Z_FILTERED с максимальным memLevel.
+
+    Returns:
+        bytes | None: Новый PNG или None, если данные — не PNG
+    """
+    if not data.startswith(_PNG_SIGNATURE):
+        return None
+    chunks: List[Tuple[bytes, bytes]] = []
+    offset = len(_PNG_SIGNATURE)
+    while offset + 8 <= len(data):
+        length, kind = struct.unpack('>I4s', data[offset:offset + 8])
+        chunks.append((kind, data[offset + 8:offset + 8 + length]))
+        offset += length + 12
+    raw = zlib.decompress(b''.join(body for kind, body in chunks if kind == b'IDAT'))
+
+    def deflate(strategy):
+        compressor = zlib.compressobj(level, zlib.DEFLATED, 15, 9, strategy)
+        return compressor.compress(raw) + compressor.flush()
+
+    idat = min((deflate(strategy) for strategy in (zlib.Z_DEFAULT_STRATEGY, zlib.Z_FILTERED)), key=len)
+    out = [_PNG_SIGNATURE]
+    idat_written = False
+    for kind, body in chunks:
+        if kind == b'IDAT':
+            # Все IDAT заменяются одним чанком
+            if not idat_written:
+                out.append(_png_chunk(b'IDAT', idat))
+                idat_written = True
+            continue
+        out.append(_png_chunk(kind, body))
+    return b''.join(out)
+
+
+def _pillow_encode(data: bytes, settings: dict) -> bytes:
+    buffer = io.BytesIO()
+    with Image.open(io.BytesIO(data)) as image:
+        if settings['format'] == 'png':
+            image.save(buffer, format='PNG', optimize=True)
+        else:
+            image.save(buffer, format=settings['format'].upper(), lossless=bool(settings['lossless']),
+                       quality=int(settings['quality']))
+    return buffer.getvalue()
+
+
+def optimize_image(path: str, settings: dict) -> Tuple[str, int, int]:
+    """
+    Пересжимает одну картинку (выполняется в процессе пула).
+
+    PNG перезаписывается, только если стал меньше; при format webp/avif файл
+    конвертируется и получает новое расширение. Замена файла атомарная (временный файл + rename),
+    поэтому параллельное чтение (копирование дублей, проверка картинок) видит целый файл.
+
+    Returns:
+        tuple: (путь результата, байт до, байт после)
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    if is_placeholder(path):
+        return path, len(data), len(data)
+    if settings['format'] == 'png':
+        candidates = [recompress_png(data, int(settings['level']))]
+        if Image is not None:
+            candidates.append(_pillow_encode(data, settings))
+        best = min((candidate for candidate in candidates if candidate), key=len, default=None)
+        target = path
+    else:
+        best = _pillow_encode(data, settings)
+        target = f"{os.path.splitext(path)[0]}.{settings['format']}"
+    if best is None or (target == path and len(best) >= len(data)):
+        return path, len(data), len(data)
+    tmp = f"{target}.tmp-optimize"
+    with open(tmp, 'wb') as f:
+        f.write(best)
+    os.replace(tmp, target)
+    if target != path:
+        os.remove(path)
+    return target, len(data), len(best)
+
+
+class ImageOptimizer:
+    """
+    Пересжатие скачанных PNG в пуле процессов, параллельно с рендером.
+
+    Планировщик передаёт в ``submit`` каждую готовую панель сразу после рендера (только для
+    format: png — пересжатие на месте не мешает последующим шагам). ``finish`` после вырезания
+    панелей и проверки картинок дожимает всё, что появилось или изменилось позже (копии дублей,
+    повторные рендеры), конвертирует в webp/avif и выводит сэкономленный объём.
+    """
+
+    def __init__(self, settings: dict, overlap: bool = True):
+        """
+        Args:
+            settings (dict): Настройки ``grafana.optimize``
+            overlap (bool): Пересжимать панели сразу после рендера (False — только в ``finish``)
+        """
+        self.settings = settings
+        self.overlap = overlap
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._futures: Dict[str, object] = {}
+        self._done: Dict[str, Tuple[int, int]] = {}   # путь -> (размер, mtime_ns) после пересжатия
+        self._before = 0
+        self._after = 0
+        self._lock = threading.Lock()
+
+    def _submit(self, path: str) -> None:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=max(1, int(self.settings['workers'])))
+            self._futures[path] = self._executor.submit(optimize_image, path, self.settings)
+
+    def _collect(self) -> Dict[str, str]:
+        with self._lock:
+            futures, self._futures = self._futures, {}
+        renamed = {}
+        for path, future in futures.items():
+            try:
+                target, before, after = future.result()
+            except Exception as e:
+                logging.error(f"Не удалось пересжать {path}: {e}")
+                continue
+            self._before += before
+            self._after += after
+            if target != path:
+                renamed[path] = target
+            try:
+                stat = os.stat(target)
+            except OSError:
+                continue
+            self._done[target] = (stat.st_size, stat.st_mtime_ns)
+        return renamed
+
+    def submit(self, job) -> None:
+        """Ставит в очередь панель, только что скачанную планировщиком."""
+        if not self.overlap or self.settings['format'] != 'png' or isinstance(job, DashboardJob):
+            # Снимки дашбордов удаляются после вырезания панелей
+            return
+        self._submit(job.output_file)
+
+    def wait(self) -> None:
+        """
+        Дожидается пересжатия поставленных файлов.
+
+        Вызывается планировщиком в конце run, чтобы повторные рендеры и вырезание
+        панелей не пересекались с заменой файлов.
+        """
+        self._collect()
+
+    def close(self) -> None:
+        """Останавливает пул процессов (дождавшись начатых задач); следующий submit создаст новый."""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+
+    def _changed(self, path: str) -> bool:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return False
+        return self._done.get(path) != (stat.st_size, stat.st_mtime_ns)
+
+    def finish(self, results: list) -> list:
+        """
+        Дожимает оставшиеся картинки, ждёт пул и выводит сэкономленный объём.
+
+        Returns:
+            list: Результаты; при конвертации в webp/avif у задач новые пути файлов
+        """
+        self._collect()
+        for result in results:
+            if result.ok and self._changed(result.job.output_file):
+                self._submit(result.job.output_file)
+        renamed = self._collect()
+        self.close()
+        if self._before:
+            saved = self._before - self._after
+            logging.info(f"🗜️  Пересжатие картинок ({self.settings['format']}): {len(self._done)} файлов, "
+                         f"{self._before / 1024 / 1024:.1f} -> {self._after / 1024 / 1024:.1f} МБ, "
+                         f"сэкономлено {saved / 1024 / 1024:.1f} МБ ({saved / self._before:.0%})")
+        self._done.clear()
+        self._before = self._after = 0
+        if not renamed:
+            return results
+        return [replace(result, job=replace(result.job, output_file=renamed[result.job.output_file]))
+                if result.job.output_file in renamed else result for result in results]
+
+
+def open_image_optimizer(cfg) -> Optional[ImageOptimizer]:
+    """Оптимизатор картинок, если включена секция ``grafana.optimize`` (иначе None)."""
+    settings = optimize_settings(cfg)
+    if not settings['enabled']:
+        return None
+    # Без Pillow проверка картинок судит о пустоте по степени сжатия PNG: пересжатие до проверки её исказит
+    overlap = Image is not None or not image_check_settings(cfg)['enabled']
+    return ImageOptimizer(settings, overlap=overlap)
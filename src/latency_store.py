@@ -0,0 +1,214 @@
+import os
+import math
+import time
+import sqlite3
+import logging
+import threading
+import urllib.parse
+from typing import Dict, List, Optional, Tuple
+
+# Сколько последних рендеров панели учитывать в оценке длительности
+_RECENT_SAMPLES = 10
+# Хранение истории: последних рендеров на ключ и максимальный возраст записи, дней
+_KEEP_PER_KEY = 50
+_MAX_AGE_DAYS = 90
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS renders (
+    ts REAL NOT NULL,
+    host TEXT NOT NULL,
+    dashboard_uid TEXT NOT NULL,
+    panel_id TEXT NOT NULL,
+    window INTEGER NOT NULL,
+    seconds REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS renders_key ON renders (host, dashboard_uid, panel_id, window, ts);
+"""
+
+
+def window_bucket(seconds: float) -> int:
+    """Округляет длину окна до степени двойки (в секундах), чтобы близкие окна попадали в одну группу."""
+    if not seconds or seconds <= 0:
+        return 0
+    return 2 ** int(round(math.log2(seconds)))
+
+
+class LatencyStore:
+    """
+    Локальная история длительностей рендера (SQLite) по ключу
+    (host, dashboard_uid, panel_id, длина окна).
+
+    Используется планировщиком для запуска самых долгих задач первыми
+    и для отчета о панелях, которые рендерятся всё медленнее. История ограничена:
+    на ключ хранится не больше ``keep_per_key`` последних рендеров, записи старше
+    ``max_age_days`` удаляются при каждом ``record``.
+    """
+
+    def __init__(self, path: str, keep_per_key: int = _KEEP_PER_KEY, max_age_days: float = _MAX_AGE_DAYS,
+                 read_only: bool = False):
+        """
+        Args:
+            path (str): Файл SQLite
+            keep_per_key (int): Последних рендеров на ключ в истории
+            max_age_days (float): Максимальный возраст записи, дней
+            read_only (bool): Только чтение существующего файла (--plan): ни папка, ни база
+                не создаются, ``record`` ничего не пишет
+        """
+        self.path = path
+        self.keep_per_key = max(2 * _RECENT_SAMPLES, int(keep_per_key))
+        self.max_age_days = float(max_age_days)
+        self.read_only = read_only
+        if read_only:
+            uri = f"file:{urllib.parse.quote(os.path.abspath(path))}?mode=ro"
+            self._conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        else:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+        self._cache: Dict[tuple, Optional[float]] = {}
+
+    @staticmethod
+    def job_key(job) -> Tuple[str, str, str, int]:
+        return job.host, str(job.dashboard_uid), str(job.panel_id), window_bucket(job.window)
+
+    def record(self, results) -> int:
+        """
+        Сохраняет длительности успешных (не дедуплицированных) рендеров; панели,
+        для которых проба показала отсутствие данных, не учитываются. Заодно удаляет
+        устаревшие записи и лишнюю историю затронутых ключей.
+
+        Returns:
+            int: Число сохраненных записей
+        """
+        if self.read_only:
+            return 0
+        now = time.time()
+        rows = [
+            (now, *self.job_key(result.job), result.timing.total)
+            for result in results
+            if result.ok and not result.deduplicated and result.timing is not None and result.timing.total > 0
+            and not result.timing.empty
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO renders (ts, host, dashboard_uid, panel_id, window, seconds) VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._conn.execute("DELETE FROM renders WHERE ts < ?", (now - self.max_age_days * 86400,))
+            for key in {row[1:5] for row in rows}:
+                self._conn.execute(
+                    "DELETE FROM renders WHERE rowid IN (SELECT rowid FROM renders WHERE host = ? AND dashboard_uid = ? "
+                    "AND panel_id = ? AND window = ? ORDER BY ts DESC LIMIT -1 OFFSET ?)",
+                    (*key, self.keep_per_key),
+                )
+            self._conn.commit()
+            self._cache.clear()
+        return len(rows)
+
+    def _query_estimate(self, key: Tuple[str, str, str, int]) -> Optional[float]:
+        rows = self._conn.execute(
+            "SELECT seconds FROM renders WHERE host = ? AND dashboard_uid = ? AND panel_id = ? AND window = ? "
+            "ORDER BY ts DESC LIMIT ?",
+            (*key, _RECENT_SAMPLES),
+        ).fetchall()
+        if not rows:
+            # Другое окно той же панели: грубая оценка лучше, чем никакой
+            rows = self._conn.execute(
+                "SELECT seconds FROM renders WHERE host = ? AND dashboard_uid = ? AND panel_id = ? "
+                "ORDER BY ts DESC LIMIT ?",
+                (*key[:3], _RECENT_SAMPLES),
+            ).fetchall()
+        if not rows:
+            return None
+        values = sorted(row[0] for row in rows)
+        return values[len(values) // 2]
+
+    def estimate(self, job) -> Optional[float]:
+        """Медиана последних длительностей рендера панели (None, если истории нет)."""
+        key = self.job_key(job)
+        with self._lock:
+            if key not in self._cache:
+                self._cache[key] = self._query_estimate(key)
+            return self._cache[key]
+
+    def trends(self, min_samples: int = 6, threshold: float = 1.2) -> List[dict]:
+        """
+        Панели, которые рендерятся медленнее, чем раньше: медиана последних рендеров
+        сравнивается с медианой более ранних.
+
+        Args:
+            min_samples (int): Минимум рендеров панели для сравнения
+            threshold (float): Во сколько раз должна вырасти медиана
+
+        Returns:
+            list: Записи host, dashboard_uid, panel_id, window, samples, before, recent, ratio (по убыванию ratio)
+        """
+        with self._lock:
+            # Только последние keep_per_key рендеров каждого ключа (истории, записанные до ограничения, могут быть длиннее)
+            rows = self._conn.execute(
+                "SELECT host, dashboard_uid, panel_id, window, seconds FROM ("
+                "SELECT *, ROW_NUMBER() OVER (PARTITION BY host, dashboard_uid, panel_id, window ORDER BY ts DESC) AS n "
+                "FROM renders) WHERE n <= ? ORDER BY ts",
+                (self.keep_per_key,),
+            ).fetchall()
+        series: Dict[tuple, List[float]] = {}
+        for host, dashboard_uid, panel_id, window, seconds in rows:
+            series.setdefault((host, dashboard_uid, panel_id, window), []).append(seconds)
+
+        slower = []
+        for (host, dashboard_uid, panel_id, window), values in series.items():
+            if len(values) < min_samples:
+                continue
+            recent_count = min(_RECENT_SAMPLES, len(values) // 2)
+            before = sorted(values[:-recent_count])[len(values[:-recent_count]) // 2]
+            recent = sorted(values[-recent_count:])[recent_count // 2]
+            if before > 0 and recent / before >= threshold:
+                slower.append({
+                    'host': host, 'dashboard_uid': dashboard_uid, 'panel_id': panel_id, 'window': window,
+                    'samples': len(values), 'before': round(before, 3), 'recent': round(recent, 3),
+                    'ratio': round(recent / before, 2),
+                })
+        return sorted(slower, key=lambda item: item['ratio'], reverse=True)
+
+    def log_trends(self, top: int = 5) -> None:
+        """Логирует панели, время рендера которых заметно выросло."""
+        for item in self.trends()[:top]:
+            logging.warning(
+                f"🐢 Панель {item['dashboard_uid']}#{item['panel_id']} на {item['host']} (окно {item['window']} с) "
+                f"рендерится медленнее: {item['before']:.2f} → {item['recent']:.2f} с (x{item['ratio']})"
+            )
+
+    def close(self) -> None:
+        """Закрывает соединение с базой."""
+        with self._lock:
+            self._conn.close()
+
+
+def open_latency_store(cfg, read_only: bool = False) -> Optional[LatencyStore]:
+    """
+    Открывает хранилище длительностей рендера по ``scheduler.latency_store``.
+
+    По умолчанию файл ``.render_latency.sqlite`` лежит в корне папки отчетов (REPORTS_BASE_DIR);
+    ``latency_store: false`` отключает хранилище.
+    Глубина истории задаётся ``scheduler.latency_keep`` (рендеров на панель) и
+    ``scheduler.latency_max_age_days``. С ``read_only`` (--plan) открывается только уже
+    существующий файл; если его нет — истории нет, на диске ничего не создаётся.
+    """
+    scheduler_cfg = cfg.get('scheduler') or {}
+    path = scheduler_cfg.get('latency_store', True)
+    if path is False or path is None:
+        return None
+    if path is True:
+        if not cfg.get('main_folder'):
+            return None
+        path = os.path.join(cfg['main_folder'], '.render_latency.sqlite')
+    if read_only and not os.path.isfile(path):
+        return None
+    try:
+        return LatencyStore(path, keep_per_key=scheduler_cfg.get('latency_keep', _KEEP_PER_KEY),
+                            max_age_days=scheduler_cfg.get('latency_max_age_days', _MAX_AGE_DAYS),
+                            read_only=read_only)
+    except sqlite3.Error as e:
+        logging.warning(f"Не удалось открыть хранилище длительностей рендера {path}: {e}")
+        return None
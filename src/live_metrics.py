@@ -0,0 +1,275 @@
+import os
+import json
+import stat
+import time
+import logging
+from collections import deque
+from datetime import datetime
+from typing import Dict, Optional
+
+# Сколько байт читать из simulation.log за один запрос SFTP
+_READ_CHUNK = 1024 * 1024
+
+# Типы записей текстового simulation.log
+_RECORD_TYPES = {'RUN', 'USER', 'REQUEST', 'GROUP', 'ERROR', 'ASSERTION'}
+
+
+def parse_request_record(line):
+    """
+    Разбирает строку REQUEST текстового simulation.log Gatling.
+
+    Поддерживаются форматы 2.x/3.x: имя запроса, время начала и конца (epoch ms)
+    и статус OK/KO ищутся относительно поля статуса, поэтому набор полей
+    перед именем (сценарий, userId, группы) может отличаться.
+
+    Returns:
+        tuple | None: (name, start_ms, end_ms, ok) или None для прочих записей
+    """
+    if not line.startswith('REQUEST\t'):
+        return None
+    fields = line.rstrip('\r\n').split('\t')
+    for index in range(len(fields) - 1, 3, -1):
+        if fields[index] in ('OK', 'KO'):
+            try:
+                start_ms = int(fields[index - 2])
+                end_ms = int(fields[index - 1])
+            except ValueError:
+                return None
+            return fields[index - 3], start_ms, end_ms, fields[index] == 'OK'
+    return None
+
+
+def percentile(sorted_values, pct):
+    """Перцентиль по методу ближайшего ранга для отсортированного списка."""
+    if not sorted_values:
+        return None
+    rank = max(1, int(round(pct / 100.0 * len(sorted_values) + 0.5)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class RollingRequestStats:
+    """
+    Скользящая статистика по запросам с ограниченной памятью.
+
+    Для каждого запроса хранится не более ``sample_size`` последних времён отклика
+    и посекундные счётчики только за последние ``window_seconds`` — объём памяти
+    не зависит от длительности теста.
+    """
+
+    def __init__(self, window_seconds=60, sample_size=1000):
+        self.window_seconds = int(window_seconds)
+        self.sample_size = int(sample_size)
+        self.samples: Dict[str, deque] = {}
+        self.buckets: Dict[str, deque] = {}
+        self.totals: Dict[str, list] = {}
+        self.last_end_ms = 0
+
+    def add(self, name, start_ms, end_ms, ok):
+        """Учитывает один завершённый запрос."""
+        if name not in self.samples:
+            self.samples[name] = deque(maxlen=self.sample_size)
+            self.buckets[name] = deque()
+            self.totals[name] = [0, 0]
+        self.samples[name].append(end_ms - start_ms)
+        self.totals[name][0 if ok else 1] += 1
+
+        second = end_ms // 1000
+        buckets = self.buckets[name]
+        if buckets and buckets[-1][0] == second:
+            buckets[-1][1] += 1
+        else:
+            buckets.append([second, 1])
+        self.last_end_ms = max(self.last_end_ms, end_ms)
+        # Устаревшие секунды отбрасываются сразу: чтение накопленного лога не растит счётчики
+        self._trim_buckets(buckets)
+
+    def _trim_buckets(self, buckets):
+        horizon = self.last_end_ms // 1000 - self.window_seconds
+        while buckets and buckets[0][0] <= horizon:
+            buckets.popleft()
+
+    def _trim(self):
+        for buckets in self.buckets.values():
+            self._trim_buckets(buckets)
+
+    def snapshot(self):
+        """
+        Возвращает срез статистики: RPS за окно, перцентили по выборке и итоговые счётчики.
+
+        Returns:
+            dict: {'timestamp', 'window_seconds', 'requests': {name: {...}}}
+        """
+        self._trim()
+        requests = {}
+        for name, samples in self.samples.items():
+            ordered = sorted(samples)
+            ok_count, ko_count = self.totals[name]
+            requests[name] = {
+                'rps': round(sum(count for _, count in self.buckets[name]) / self.window_seconds, 2),
+                'p50': percentile(ordered, 50),
+                'p90': percentile(ordered, 90),
+                'p95': percentile(ordered, 95),
+                'p99': percentile(ordered, 99),
+                'max': ordered[-1] if ordered else None,
+                'ok': ok_count,
+                'ko': ko_count,
+            }
+        return {
+            'timestamp': datetime.fromtimestamp(self.last_end_ms / 1000).isoformat() if self.last_end_ms else None,
+            'window_seconds': self.window_seconds,
+            'requests': requests,
+        }
+
+
+class SimulationLogTail:
+    """
+    Инкрементальное чтение растущего simulation.log по SFTP.
+
+    Хранит смещение и незавершённый хвост строки, поэтому каждый вызов
+    передаёт по сети только новые байты. Строки отдаются по мере чтения блоков
+    по ``_READ_CHUNK``: в памяти не больше одного блока, даже если при подключении
+    к идущему тесту накопились гигабайты лога.
+    """
+
+    def __init__(self, sftp, remote_file, from_end=False):
+        """
+        Args:
+            sftp: Открытый SFTP-клиент
+            remote_file (str): Путь simulation.log
+            from_end (bool): Начать с текущего конца файла (накопленная история не читается)
+        """
+        self.sftp = sftp
+        self.remote_file = remote_file
+        self.offset = 0
+        self._partial = b''
+        self._from_end = from_end
+        self._skip_first = False
+
+    def read_lines(self):
+        """
+        Генерирует новые полные строки, появившиеся с прошлого вызова.
+
+        Генератор нужно дочитать до конца: смещение сдвигается поблочно.
+        """
+        size = self.sftp.stat(self.remote_file).st_size or 0
+        if self._from_end:
+            # Первая строка после смещения может быть неполной — её пропускаем
+            self._from_end = False
+            self.offset = size
+            self._skip_first = size > 0
+            return
+        if size < self.offset:
+            # Файл пересоздан — начинаем сначала
+            self.offset = 0
+            self._partial = b''
+        if size == self.offset:
+            return
+
+        with self.sftp.open(self.remote_file, 'rb') as f:
+            f.seek(self.offset)
+            while self.offset < size:
+                data = f.read(min(_READ_CHUNK, size - self.offset))
+                if not data:
+                    break
+                self.offset += len(data)
+                lines = (self._partial + data).split(b'\n')
+                self._partial = lines.pop()
+                if lines and self._skip_first:
+                    self._skip_first = False
+                    lines.pop(0)
+                for line in lines:
+                    yield line.decode('utf-8', errors='replace')
+
+
+def find_running_simulation(sftp, remote_root):
+    """
+    Находит каталог текущего прогона: самый свежий каталог с simulation.log и без index.html.
+
+    Returns:
+        str | None: Имя каталога или None
+    """
+    candidates = []
+    for entry in sftp.listdir_attr(remote_root):
+        if not stat.S_ISDIR(entry.st_mode or 0):
+            continue
+        names = set(sftp.listdir(f"{remote_root}/{entry.filename}"))
+        if 'simulation.log' in names and 'index.html' not in names:
+            candidates.append((entry.st_mtime or 0, entry.filename))
+    return max(candidates)[1] if candidates else None
+
+
+def write_snapshot(snapshot, output_dir):
+    """Сохраняет срез в ``snapshot_<время>.json`` и обновляет ``latest.json``."""
+    os.makedirs(output_dir, exist_ok=True)
+    name = f"snapshot_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    for file_name in (name, 'latest.json'):
+        with open(os.path.join(output_dir, file_name), 'w', encoding='utf-8') as f:
+            json.dump(snapshot, f, ensure_ascii=False, indent=2)
+    return os.path.join(output_dir, name)
+
+
+def tail_simulation(ssh, cfg, output_dir, report_name: Optional[str] = None, interval=None, max_snapshots=None):
+    """
+    Live-режим: читает растущий simulation.log по SFTP и периодически пишет срезы статистики.
+
+    Останавливается, когда в каталоге прогона появляется index.html (Gatling сгенерировал отчет),
+    по Ctrl+C или после ``max_snapshots`` срезов. Финальный срез пишется всегда.
+
+    Args:
+        ssh (paramiko.SSHClient): Открытое SSH-соединение
+        cfg (dict): Конфигурационный словарь (ssh_config.remote_path и секция live)
+        output_dir (str): Папка для срезов
+        report_name (str, optional): Каталог прогона; по умолчанию ищется текущий
+        interval (float, optional): Период срезов, с (по умолчанию ``live.snapshot_interval`` или 30)
+        max_snapshots (int, optional): Ограничение числа срезов
+
+    Returns:
+        dict | None: Последний срез или None, если прогон не найден
+    """
+    live_cfg = cfg.get('live') or {}
+    interval = float(interval or live_cfg.get('snapshot_interval', 30))
+    remote_root = cfg['ssh_config']['remote_path']
+    stats = RollingRequestStats(
+        window_seconds=live_cfg.get('window_seconds', 60),
+        sample_size=live_cfg.get('sample_size', 1000),
+    )
+
+    sftp = ssh.open_sftp()
+    try:
+        report_name = report_name or find_running_simulation(sftp, remote_root)
+        if not report_name:
+            logging.warning(f"Текущий прогон не найден в {remote_root}")
+            return None
+        run_dir = f"{remote_root}/{report_name}"
+        log_tail = SimulationLogTail(sftp, f"{run_dir}/simulation.log", from_end=live_cfg.get('from_end', False))
+        logging.info(f"Live-режим: читаем {run_dir}/simulation.log, срезы каждые {interval:.0f} с -> {output_dir}")
+
+        snapshots = 0
+        snapshot = None
+        finished = False
+        format_checked = False
+        try:
+            while not finished and (max_snapshots is None or snapshots < max_snapshots):
+                finished = 'index.html' in sftp.listdir(run_dir)
+                for line in log_tail.read_lines():
+                    if not format_checked:
+                        format_checked = True
+                        if line.split('\t', 1)[0] not in _RECORD_TYPES:
+                            logging.error("simulation.log не в текстовом формате (бинарный лог новых версий Gatling не поддерживается)")
+                            return None
+                    record = parse_request_record(line)
+                    if record:
+                        stats.add(*record)
+                snapshot = stats.snapshot()
+                path = write_snapshot(snapshot, output_dir)
+                snapshots += 1
+                logging.info(f"Live-срез: {path} ({len(snapshot['requests'])} запросов)")
+                if not finished:
+                    time.sleep(interval)
+        except KeyboardInterrupt:
+            logging.info("Live-режим остановлен пользователем")
+            snapshot = stats.snapshot()
+            write_snapshot(snapshot, output_dir)
+        return snapshot
+    finally:
+        sftp.close()
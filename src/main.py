@@ -1,92 +1,477 @@
 import argparse
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 from config import load_config
 from config_loader import load_metrics_config
-from ssh_service import ssh_download_last_report
-from grafana_service import download_grafana_metrics, download_postgresql_metrics, download_gatling_metrics
-from utils import create_main_folder, logger
+from ssh_service import ssh_download_last_report, connect_ssh
+from live_metrics import tail_simulation, find_running_simulation
+from grafana_service import (create_scheduler, plan_grafana_jobs, log_job_statistics, finish_dashboard_renders,
+                             check_images, finish_optimization)
+from batch import load_runs_file, parse_run_spec, plan_runs, expand_environments
+from planner import summarize_plan, log_plan
+from watch import LastRunWatcher, live_run_config
+from timings import write_timing_report
+from tracing import span, tracer
+from dashboards import clear_dashboards
+from profiling import profile_stage, profiler
+from archive import open_run_archives
+from blob_store import blob_store_settings, open_blob_store, BlobStore
+from report import report_settings, build_report
+from utils import create_main_folder, logger, setup_logging, stop_logging, LOG_LEVELS
+
+
+def get_metric_services(cfg):
+    """Возвращает включенные сервисы приложений (без системных флагов и словарей вроде gatling_scripts)."""
+    service_flags = cfg.get('services', {})
+    system_services = {'grafana_service', 'ssh_service', 'gatling_metrics_service', 'postgresql_metrics_service'}
+    return [
+        name for name, enabled in service_flags.items()
+        if enabled and name not in system_services and not isinstance(enabled, dict)
+    ]
+
+
+def run_gatling_stage(runs, ssh=None, archives=None):
+    """
+    Стадия -gatling: скачивание отчетов Gatling по SSH для всех запусков.
+
+    Для одиночного запуска скачивается последний отчет (lastRun.txt). В пакете
+    у каждого запуска должно быть указано имя отчета (report), иначе он пропускается.
+    Переданное SSH-соединение (режим наблюдения) переиспользуется для всех отчетов.
+    В режиме архива каждый скачанный отчет сразу ставится в очередь записи в архив запуска.
+
+    Returns:
+        str: Описание результата для итоговой сводки
+
+    Raises:
+        RuntimeError: Если не удалось скачать ни одного отчета
+    """
+    with profile_stage("ssh"):
+        downloaded, failed = _download_reports(runs, ssh, archives)
+    if failed and not downloaded:
+        raise RuntimeError("Не удалось скачать отчет Gatling")
+    details = f"скачано отчетов: {len(downloaded)}"
+    if failed:
+        details += f", ошибок: {len(failed)} ({', '.join(failed)})"
+    return details
+
+
+def _download_reports(runs, ssh=None, archives=None):
+    """Скачивает отчеты Gatling запусков; возвращает (пути скачанных отчетов, метки неудачных запусков)."""
+    downloaded = []
+    failed = []
+    for run in runs:
+        if not run.cfg.get('services', {}).get('ssh_service', True):
+            continue
+        if len(runs) > 1 and not run.report:
+            logger.warning(f"[{run.label}] Не указан report — отчет Gatling для запуска пакета пропущен")
+            continue
+        logger.info(f"[{run.label}] Начинаем скачивание отчета Gatling...")
+        with span("gatling.report", cat="ssh", run=run.label):
+            report_path = ssh_download_last_report(run.cfg, run.folder, run.report, ssh=ssh)
+        if report_path:
+            logger.info(f"[{run.label}] Отчет Gatling успешно скачан: {report_path}")
+            downloaded.append(report_path)
+            if archives is not None:
+                archives.add_tree(report_path)
+        else:
+            logger.error(f"[{run.label}] Не удалось скачать отчет Gatling")
+            failed.append(run.label)
+    return downloaded, failed
+
+
+def plan_stage_jobs(runs, sessions=None):
+    """
+    Формирует задачи рендера стадии -grafana для всех запусков.
+
+    Без ``sessions`` серверы не опрашиваются; с ними выполняется проверка
+    сервисов и скриптов без данных (секция ``discovery``).
+
+    Returns:
+        list: Задачи RenderJob всех запусков
+
+    Raises:
+        FileNotFoundError: Если не найден файл конфигурации метрик
+    """
+    metrics_cache = {}
+    jobs = []
+    for run in runs:
+        grafana_enabled = run.cfg.get('services', {}).get('grafana_service', True)
+        metrics = []
+        if grafana_enabled:
+            metrics_config_path = run.cfg['grafana']['metrics_config']
+            # Используем путь относительно текущей директории
+            if not os.path.exists(metrics_config_path):
+                raise FileNotFoundError(f"Файл конфигурации метрик не найден: {metrics_config_path}")
+            if metrics_config_path not in metrics_cache:
+                metrics_cache[metrics_config_path] = load_metrics_config(metrics_config_path)
+            metrics = metrics_cache[metrics_config_path]
+        else:
+            logger.info(f"[{run.label}] grafana_service: false — планируем только Gatling метрики")
+        jobs += plan_grafana_jobs(run.cfg, metrics, run.folder, get_metric_services(run.cfg), sessions)
+    return jobs
+
+
+def run_grafana_stage(runs, scheduler, archives=None):
+    """
+    Стадия -grafana: скачивание метрик Grafana (сервисы, Gatling, PostgreSQL) для всех запусков.
+
+    Задачи всех запусков планируются вместе и выполняются одним планировщиком
+    с общей HTTP-сессией, поэтому соединения и кэши переиспользуются.
+    В режиме архива готовые PNG (после вырезания панелей и проверки картинок)
+    ставятся в очередь записи в архив запуска.
+
+    Returns:
+        str: Описание результата для итоговой сводки
+
+    Raises:
+        Exception: Любая ошибка планирования пробрасывается в run_stage
+    """
+    # Окружения (секция environments) — отдельные запуски в подпапках, в одном общем плане
+    runs = expand_environments(runs)
+    with span("grafana.plan", runs=len(runs)) as span_args, profile_stage("grafana.plan"):
+        jobs = plan_stage_jobs(runs, scheduler.sessions)
+        span_args['jobs'] = len(jobs)
+
+    if not jobs:
+        return "нет метрик для скачивания"
+
+    logger.info(f"Запланировано рендеров: {len(jobs)} (запусков: {len(runs)})")
+    # Бюджет повторов общий на стадию: профильные прогоны по источникам, fallback-и и повторы пустых картинок
+    # расходуют его вместе
+    scheduler.retry_budget.reset()
+    with span("grafana.execute", jobs=len(jobs)):
+        if profiler.enabled:
+            # Отдельный профиль для каждого источника: gatling, postgresql, grafana
+            results = []
+            for source in dict.fromkeys(job.source for job in jobs):
+                with profile_stage(f"grafana.{source}"):
+                    results += scheduler.run([job for job in jobs if job.source == source])
+        else:
+            results = scheduler.run(jobs)
+    with profile_stage("grafana.crop"):
+        # Режим grafana.dashboard_render: панели вырезаются из снимков дашбордов
+        results = finish_dashboard_renders(results, scheduler, runs[0].cfg, runs)
+    with profile_stage("grafana.check"):
+        # Режим grafana.image_check: повтор рендера пустых и ошибочных картинок
+        results = check_images(results, scheduler, runs[0].cfg, runs)
+    with profile_stage("grafana.optimize"):
+        # Режим grafana.optimize: пересжатие оставшихся картинок и конвертация в webp/avif
+        results = finish_optimization(results, scheduler)
+    if archives is not None:
+        for result in results:
+            if result.ok:
+                archives.add(result.job.output_file)
+    log_job_statistics(results, "метрик Grafana")
+    # Переиспользование keep-alive соединений по хостам (накопительно за весь процесс)
+    scheduler.sessions.log_stats()
+    if scheduler.latency_store is not None:
+        # Панели, которые от запуска к запуску рендерятся всё медленнее
+        scheduler.latency_store.log_trends()
+    with span("timings.write"), profile_stage("report"):
+        for run in runs:
+            # Машиночитаемый отчет о таймингах рендеров: JSON, CSV и Prometheus textfile
+            write_timing_report([result for result in results if result.job.run == run.label], run.folder)
+    successful = sum(1 for result in results if result.ok)
+    if not successful:
+        raise RuntimeError(f"Не удалось скачать ни одной метрики из {len(results)}")
+    return f"скачано метрик: {successful}/{len(results)}"
+
+
+def run_stage(name, func, *args):
+    """
+    Выполняет стадию с изоляцией ошибок: исключение одной стадии не прерывает другие.
+
+    Returns:
+        dict: Результат стадии (name, ok, duration, details)
+    """
+    started = time.monotonic()
+    try:
+        with span(f"stage.{name}"):
+            details = func(*args)
+        ok = True
+    except Exception as e:
+        logger.error(f"Ошибка стадии {name}: {str(e)}")
+        details = str(e)
+        ok = False
+    return {
+        'name': name,
+        'ok': ok,
+        'duration': time.monotonic() - started,
+        'details': details,
+    }
+
+
+def log_stage_summary(results, total_duration):
+    """Выводит общую сводку по всем стадиям запуска."""
+    logger.info("=" * 60)
+    logger.info("Итоговая сводка:")
+    for result in results:
+        status = "OK" if result['ok'] else "ОШИБКА"
+        logger.info(f"  {result['name']}: {status} за {result['duration']:.1f} с — {result['details']}")
+    logger.info(f"Общее время: {total_duration:.1f} с")
+    logger.info("=" * 60)
+
+
+def collect_runs(cfg, runs, args, scheduler, ssh=None):
+    """
+    Выполняет стадии -gatling и -grafana для набора запусков и выводит общую сводку.
+
+    Args:
+        cfg (dict): Базовый конфиг (системные флаги сервисов)
+        runs (list): Запуски Run
+        args (argparse.Namespace): Аргументы командной строки (флаги стадий)
+        scheduler (RenderScheduler): Общий планировщик рендеров
+        ssh (paramiko.SSHClient, optional): Постоянное SSH-соединение
+
+    Returns:
+        list: Результаты стадий
+    """
+    for run in runs:
+        logger.info(f"Создана основная папка: {run.folder}")
+        logger.info(f"[{run.label}] Включенные сервисы приложений: {get_metric_services(run.cfg)}")
+        environments = [str(env.get('name') or env.get('namespace')) for env in run.cfg.get('environments') or []]
+        if environments:
+            logger.info(f"[{run.label}] Окружения: {', '.join(environments)}")
+
+    # Извлекаем системные флаги из базовой конфигурации
+    service_flags = cfg.get('services', {})
+    grafana_enabled = service_flags.get('grafana_service', True)
+    ssh_enabled = service_flags.get('ssh_service', True)
+    gatling_metrics_enabled = service_flags.get('gatling_metrics_service', False)
+
+    # Стадии независимы: SSH ограничен диском/сетью, Grafana — рендерером,
+    # поэтому запускаем их одновременно
+    stages = []
+    if args.gatling and ssh_enabled:
+        stages.append(('gatling', run_gatling_stage, runs, ssh))
+    if args.grafana and (grafana_enabled or gatling_metrics_enabled):
+        stages.append(('grafana', run_grafana_stage, runs, scheduler))
+
+    if not stages:
+        logger.info("Нет стадий для выполнения (укажите -gatling и/или -grafana)")
+        return []
+
+    # Режим архива: файлы обеих стадий пишет в архивы запусков один поток; при сборке отчета
+    # файлы остаются в staging до закрытия архивов — отчет строится по папке запуска
+    archives = open_run_archives(cfg, runs, keep_until_close=report_settings(cfg)['enabled'])
+    stages = [stage + (archives,) for stage in stages]
+    blobs = open_blob_store(cfg)
+    if blobs is not None:
+        for run in runs:
+            # Повторная запись в папку запуска не должна менять блобы других запусков
+            detached = blobs.detach_tree(run.folder)
+            if detached:
+                logger.info(f"[{run.label}] Отвязано от хранилища файлов: {detached}")
+
+    started = time.monotonic()
+    if profiler.enabled:
+        # При профилировании стадии выполняются по очереди, чтобы профили не смешивались
+        results = [run_stage(*stage) for stage in stages]
+    else:
+        with ThreadPoolExecutor(max_workers=len(stages), thread_name_prefix='stage') as executor:
+            futures = [executor.submit(run_stage, *stage) for stage in stages]
+            results = [future.result() for future in futures]
+    log_stage_summary(results, time.monotonic() - started)
+
+    # Трасса запуска в формате Chrome trace: открывается в chrome://tracing или ui.perfetto.dev
+    for run in runs:
+        trace_path = tracer.write(os.path.join(run.folder, "trace.json"))
+        logger.info(f"[{run.label}] Трасса запуска: {trace_path}")
+    tracer.clear()
+
+    # Профили CPU и памяти по стадиям (--profile)
+    for run in runs:
+        profile_dir = profiler.write(run.folder)
+        if profile_dir:
+            logger.info(f"[{run.label}] Профили стадий: {profile_dir}")
+    profiler.clear()
+    if report_settings(cfg)['enabled']:
+        # Отчет по папке запуска: сводка Gatling и панели Grafana (до архива и хранилища артефактов)
+        with span("report.build"):
+            for run in runs:
+                write_run_report(run.folder, report_settings(cfg))
+    if archives is not None:
+        # Оставшиеся файлы (тайминги, трассы, профили) и индексы архивов
+        with span("archive.close"):
+            archives.close()
+    if blobs is not None:
+        # Файлы запусков — ссылки на общие блобы: место на диске растёт с уникальным содержимым
+        with span("blobs.ingest"):
+            for run in runs:
+                files, saved = blobs.ingest_tree(run.folder, blob_store_settings(cfg)['workers'])
+                logger.info(f"[{run.label}] Хранилище артефактов: файлов {files}, "
+                            f"сэкономлено {saved / 1024 / 1024:.1f} МБ")
+    # Дашборды могли измениться до следующего прогона (режим наблюдения)
+    clear_dashboards()
+    return results
+
+
+def show_plan(cfg, runs, scheduler):
+    """
+    Режим --plan: разворачивает все задачи рендера запусков и выводит сводку
+    (задачи по хостам, экономия от схлопывания, оценка времени). Сервера не опрашиваются,
+    папки не создаются.
+    """
+    ssh_reports = sum(1 for run in runs if run.cfg.get('services', {}).get('ssh_service', True)
+                      and (len(runs) == 1 or run.report))
+    logger.info(f"Запусков: {len(runs)}, отчетов Gatling для скачивания (-gatling): {ssh_reports}")
+    grafana_enabled = cfg.get('services', {}).get('grafana_service', True)
+    if not (grafana_enabled or cfg.get('services', {}).get('gatling_metrics_service', False)):
+        logger.info("Стадия -grafana выключена в config.yml")
+        return None
+    summary = summarize_plan(plan_stage_jobs(expand_environments(runs)), scheduler)
+    log_plan(summary)
+    return summary
+
+
+def run_live(cfg, args):
+    """
+    Live-режим: срезы RPS и перцентилей по растущему simulation.log в папку <запуск>/live.
+    """
+    ssh = connect_ssh(cfg)
+    if ssh is None:
+        raise RuntimeError("Не удалось установить SSH-соединение для live-режима")
+    try:
+        remote_root = cfg['ssh_config']['remote_path']
+        report_name = args.live_report
+        if not report_name:
+            sftp = ssh.open_sftp()
+            try:
+                report_name = find_running_simulation(sftp, remote_root)
+            finally:
+                sftp.close()
+        if not report_name:
+            logger.warning(f"Текущий прогон не найден в {remote_root}")
+            return
+        # Папка запуска — по старту самого прогона, а не по окну mainConfig из config.yml
+        run_cfg = live_run_config(cfg, report_name)
+        main_folder_path = create_main_folder(run_cfg)
+        tail_simulation(ssh, run_cfg, os.path.join(main_folder_path, "live"),
+                        report_name=report_name, interval=args.live_interval)
+    finally:
+        ssh.close()
+
+
+def write_run_report(folder, settings):
+    """Собирает отчет по папке запуска; ошибка сборки не прерывает запуск."""
+    try:
+        return build_report(folder, settings)
+    except Exception as e:
+        logger.error(f"Не удалось собрать отчет по {folder}: {e}")
+        return None
+
+
+def run_blob_gc(cfg):
+    """Режим --blob-gc: сборка мусора в хранилище артефактов запусков."""
+    settings = blob_store_settings(cfg)
+    store = BlobStore(settings['path'], settings['link'])
+    removed, freed = store.gc(cfg['main_folder'], settings['gc_min_age'])
+    logger.info(f"🧹 Хранилище {store.root}: удалено блобов {removed}, освобождено {freed / 1024 / 1024:.1f} МБ")
+
+
+def parse_args(argv=None):
+    """Разбирает аргументы командной строки."""
+    parser = argparse.ArgumentParser(description='Скачивание отчетов и метрик')
+    parser.add_argument('-gatling', action='store_true', help='Скачать отчет Gatling')
+    parser.add_argument('-grafana', action='store_true', help='Скачать метрики Grafana')
+    parser.add_argument('--runs', metavar='FILE',
+                        help='YAML/JSON файл со списком запусков (from, to, scenario, type_of_script, report)')
+    parser.add_argument('--run', action='append', default=[], metavar='SPEC',
+                        help='Запуск в формате "from|to[|scenario[|type_of_script[|report]]]" (можно повторять)')
+    parser.add_argument('--watch', action='store_true',
+                        help='Режим наблюдения: собирать артефакты при появлении нового прогона в lastRun.txt')
+    parser.add_argument('--poll-interval', type=float, metavar='SECONDS',
+                        help='Период опроса lastRun.txt в режиме наблюдения (по умолчанию watch.poll_interval или 30)')
+    parser.add_argument('--include-current', action='store_true',
+                        help='В режиме наблюдения сразу обработать отчет, уже указанный в lastRun.txt')
+    parser.add_argument('--live', action='store_true',
+                        help='Live-метрики: читать simulation.log текущего прогона и писать срезы в <запуск>/live')
+    parser.add_argument('--live-report', metavar='NAME',
+                        help='Каталог прогона для --live (по умолчанию — самый свежий без index.html)')
+    parser.add_argument('--live-interval', type=float, metavar='SECONDS',
+                        help='Период срезов --live (по умолчанию live.snapshot_interval или 30)')
+    parser.add_argument('--plan', action='store_true',
+                        help='Только показать план: число рендеров по хостам и оценку времени, без обращения к серверам')
+    parser.add_argument('--log-level', metavar='LEVEL', type=str.upper, choices=LOG_LEVELS,
+                        help='Уровень вывода в консоль (DEBUG, INFO, WARNING...), по умолчанию logging.level или INFO')
+    parser.add_argument('--profile', action='store_true',
+                        help='Профилировать стадии (cProfile + tracemalloc) и сохранить профили в <запуск>/profile')
+    parser.add_argument('--report', action='append', default=[], metavar='FOLDER',
+                        help='Собрать отчет (report.html/report.md) по готовой папке запуска и выйти (можно повторять)')
+    parser.add_argument('--blob-gc', action='store_true',
+                        help='Удалить из хранилища артефактов (blob_store) блобы, на которые не ссылается ни один запуск')
+    return parser.parse_args(argv)
+
 
 def main():
     """
     Основная функция скрипта.
-    
+
     Скрипт выполняет следующие действия:
     1. Парсит аргументы командной строки
     2. Загружает конфигурацию
-    3. Создает основную папку для отчетов
-    4. Скачивает отчет Gatling (если указан флаг -gatling)
-    5. Скачивает метрики Grafana (если указан флаг -grafana)
+    3. Создает основные папки для отчетов (по одной на каждый запуск пакета)
+    4. Параллельно скачивает отчеты Gatling (-gatling) и метрики Grafana (-grafana)
+    5. Выводит общую сводку по стадиям
+
+    В режиме --watch шаги 3-5 выполняются для каждого нового прогона Gatling.
     """
+    scheduler = None
     try:
-        # Настройка парсера аргументов командной строки
-        parser = argparse.ArgumentParser(description='Скачивание отчетов и метрик')
-        parser.add_argument('-gatling', action='store_true', help='Скачать отчет Gatling')
-        parser.add_argument('-grafana', action='store_true', help='Скачать метрики Grafana')
-        args = parser.parse_args()
+        args = parse_args()
+        profiler.enabled = args.profile
+        setup_logging(level=args.log_level)
 
         # Загрузка конфигурации из файла config.yml
-        cfg = load_config('config.yml')
-        
-        # Создание основной папки для отчетов
-        main_folder_path = create_main_folder(cfg)
-        logger.info(f"Создана основная папка: {main_folder_path}")
-
-        # Извлекаем сервисы из конфигурации
-        service_flags = cfg.get('services', {})
-        
-        # Отделяем системные сервисы от сервисов приложений
-        grafana_enabled = service_flags.get('grafana_service', True)
-        ssh_enabled = service_flags.get('ssh_service', True)
-        
-        # Собираем только включенные сервисы приложений (исключая системные)
-        system_services = {'grafana_service', 'ssh_service', 'gatling_metrics_service', 'postgresql_metrics_service'}
-        # Учитываем только булевые флаги сервисов приложений (исключая словари вроде gatling_scripts)
-        metric_services = [
-            name for name, enabled in service_flags.items() 
-            if enabled and name not in system_services and not isinstance(enabled, dict)
-        ]
-        
-        logger.info(f"Включенные сервисы приложений: {metric_services}")
-
-        # Скачивание отчета Gatling, если указан соответствующий флаг
-        if args.gatling and ssh_enabled:
-            logger.info("Начинаем скачивание отчета Gatling...")
-            report_path = ssh_download_last_report(cfg, main_folder_path)
-            if report_path:
-                logger.info(f"Отчет Gatling успешно скачан: {report_path}")
-            else:
-                logger.error("Не удалось скачать отчет Gatling")
-
-        # Скачивание GATLING метрик независимо от grafana_service
-        # Если передан флаг -grafana и включён gatling_metrics_service, но grafana_service отключён,
-        # запускаем скачивание Gatling метрик отдельно, чтобы не зависеть от основного сервиса метрик.
-        if args.grafana and cfg.get('services', {}).get('gatling_metrics_service', False) and not grafana_enabled:
-            logger.info("Начинаем независимое скачивание Gatling метрик (grafana_service: false)...")
-            try:
-                download_gatling_metrics(cfg, main_folder_path)
-                logger.info("Gatling метрики успешно скачаны")
-            except Exception as e:
-                logger.error(f"Ошибка при скачивании Gatling метрик: {str(e)}")
-
-        # Скачивание метрик Grafana, если указан соответствующий флаг
-        if args.grafana and grafana_enabled:
-            logger.info("Начинаем скачивание метрик Grafana...")
-            try:
-                metrics_config_path = cfg['grafana']['metrics_config']
-                # Используем путь относительно текущей директории
-                if not os.path.exists(metrics_config_path):
-                    logger.error(f"Файл конфигурации метрик не найден: {metrics_config_path}")
-                    return
-
-                metrics = load_metrics_config(metrics_config_path)
-                download_grafana_metrics(cfg, metrics, main_folder_path, metric_services)
-                logger.info("Метрики Grafana успешно скачаны")
-            except Exception as e:
-                logger.error(f"Ошибка при скачивании метрик Grafana: {str(e)}")
-                
+        with span("config.load"), profile_stage("config.load"):
+            cfg = load_config('config.yml')
+        setup_logging(cfg.get('logging'), level=args.log_level)
+
+        if args.blob_gc:
+            run_blob_gc(cfg)
+            return
+
+        if args.report:
+            for folder in args.report:
+                write_run_report(folder, report_settings(cfg))
+            return
+
+        if args.live:
+            run_live(cfg, args)
+            return
+
+        # --plan не трогает папку отчетов: история длительностей только читается, если уже есть
+        scheduler = create_scheduler(cfg, read_only=args.plan)
+
+        if args.watch:
+            # Постоянное SSH-соединение и общий планировщик живут между прогонами
+            watcher = LastRunWatcher(
+                cfg,
+                on_new_run=lambda run, ssh: collect_runs(cfg, [run], args, scheduler, ssh),
+                poll_interval=args.poll_interval,
+                include_current=args.include_current,
+            )
+            watcher.watch()
+            return
+
+        # Запуски пакета: из файла и/или командной строки; без них — один запуск по config.yml
+        run_specs = load_runs_file(args.runs) if args.runs else []
+        run_specs += [parse_run_spec(spec) for spec in args.run]
+        with span("plan.runs", runs=len(run_specs) or 1), profile_stage("plan.runs"):
+            runs = plan_runs(cfg, run_specs, create=not args.plan)
+        if args.plan:
+            show_plan(cfg, runs, scheduler)
+            return
+        collect_runs(cfg, runs, args, scheduler)
+
     except Exception as e:
         logger.error(f"Критическая ошибка: {str(e)}")
         raise
+    finally:
+        if scheduler is not None:
+            scheduler.close()
+        stop_logging()
 
 if __name__ == "__main__":
-    main() 
+    main()
@@ -0,0 +1,95 @@
+import heapq
+import logging
+from typing import Dict, List
+
+from scheduler import RenderJob, RenderScheduler
+
+# Оценка рендера панели, если нет ни одной записи в истории длительностей, с
+DEFAULT_RENDER_SECONDS = 5.0
+
+
+def simulate_wall_time(durations: List[tuple], max_workers: int, per_host_limit: int) -> float:
+    """
+    Оценивает общее время выполнения задач планировщиком.
+
+    Моделирует пул из ``max_workers`` потоков, которые берут задачи по порядку
+    и ждут свободный слот хоста (``per_host_limit`` на хост) — как RenderScheduler.
+
+    Args:
+        durations (list): Пары (host, секунды) в порядке запуска
+
+    Returns:
+        float: Оценка времени до завершения последней задачи, с
+    """
+    workers = [0.0] * max(1, max_workers)
+    host_slots: Dict[str, list] = {}
+    finished = 0.0
+    for host, seconds in durations:
+        slots = host_slots.setdefault(host, [0.0] * max(1, per_host_limit))
+        start = max(heapq.heappop(workers), heapq.heappop(slots))
+        end = start + seconds
+        heapq.heappush(workers, end)
+        heapq.heappush(slots, end)
+        finished = max(finished, end)
+    return finished
+
+
+def summarize_plan(jobs: List[RenderJob], scheduler: RenderScheduler) -> dict:
+    """
+    Сводка плана без обращения к серверам: задачи по хостам, экономия от схлопывания
+    одинаковых запросов и оценка времени по истории длительностей рендера.
+
+    Returns:
+        dict: jobs, renders, deduplicated, hosts {host: {jobs, renders, render_seconds, unknown}},
+            runs {run: jobs}, estimated_seconds, default_render_seconds
+    """
+    groups = scheduler.dispatch_order(jobs, scheduler.group_duplicates(jobs))
+    primaries = [scheduler.primary_job(jobs, indexes) for indexes in groups]
+    estimates = [scheduler.job_estimate(job) for job in primaries]
+    known = [value for value in estimates if value is not None]
+    default = sum(known) / len(known) if known else DEFAULT_RENDER_SECONDS
+
+    hosts: Dict[str, dict] = {}
+    for job in jobs:
+        hosts.setdefault(job.host, {'jobs': 0, 'renders': 0, 'render_seconds': 0.0, 'unknown': 0})['jobs'] += 1
+    durations = []
+    for job, value in zip(primaries, estimates):
+        item = hosts[job.host]
+        item['renders'] += 1
+        item['render_seconds'] += default if value is None else value
+        item['unknown'] += value is None
+        durations.append((job.host, default if value is None else value))
+
+    runs: Dict[str, int] = {}
+    for job in jobs:
+        runs[job.run] = runs.get(job.run, 0) + 1
+
+    return {
+        'jobs': len(jobs),
+        'renders': len(groups),
+        'deduplicated': len(jobs) - len(groups),
+        'hosts': hosts,
+        'runs': runs,
+        'estimated_seconds': simulate_wall_time(durations, scheduler.max_workers, scheduler.per_host_limit),
+        'default_render_seconds': default,
+    }
+
+
+def log_plan(summary: dict) -> None:
+    """Выводит сводку плана (--plan)."""
+    logging.info("=" * 60)
+    logging.info("План рендеров (сервера не опрашивались):")
+    for run, count in summary['runs'].items():
+        logging.info(f"  [{run}] задач: {count}")
+    for host, item in sorted(summary['hosts'].items()):
+        logging.info(
+            f"  {host}: задач {item['jobs']}, рендеров {item['renders']}, "
+            f"суммарно ~{item['render_seconds']:.0f} с рендера"
+            + (f" (без истории: {item['unknown']})" if item['unknown'] else "")
+        )
+    logging.info(f"Всего задач: {summary['jobs']}, рендеров: {summary['renders']}, "
+                 f"сэкономлено схлопыванием одинаковых запросов: {summary['deduplicated']}")
+    minutes, seconds = divmod(int(round(summary['estimated_seconds'])), 60)
+    logging.info(f"Оценка времени стадии -grafana: ~{minutes} мин {seconds} с "
+                 f"(панели без истории считаются по {summary['default_render_seconds']:.1f} с)")
+    logging.info("=" * 60)
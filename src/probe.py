@@ -0,0 +1,190 @@
+import re
+import copy
+import zlib
+import struct
+import logging
+import urllib.parse
+from typing import Dict, List, Optional
+
+from dashboards import grafana_base_url, fetch_dashboard, find_panel
+
+_DEFAULT_PROBE = {
+    'enabled': False,
+    'max_data_points': 10,   # Точек на запрос пробы: достаточно, чтобы узнать, есть ли данные
+    'timeout': 15,           # Таймаут запроса пробы, с
+}
+
+# Ключ tEXt-чанка, которым помечается заглушка панели без данных
+PLACEHOLDER_KEYWORD = b'Grafana-Render'
+PLACEHOLDER_TEXT = b'no data'
+
+# $var, ${var}, ${var:format}, [[var]]
+_VARIABLE = re.compile(r'\$\{(\w+)(?::[^}]*)?\}|\[\[(\w+)(?::[^\]]*)?\]\]|\$(\w+)')
+
+
+def probe_settings(cfg) -> dict:
+    """Настройки ``grafana.probe`` со значениями по умолчанию."""
+    settings = dict(_DEFAULT_PROBE)
+    settings.update((cfg.get('grafana') or {}).get('probe') or {})
+    return settings
+
+
+def url_variables(render_url: str) -> Dict[str, List[str]]:
+    """Переменные дашборда из URL рендера: ``var-x=a&var-x=b`` -> {'x': ['a', 'b']}."""
+    variables: Dict[str, List[str]] = {}
+    for key, value in urllib.parse.parse_qsl(urllib.parse.urlsplit(render_url).query, keep_blank_values=True):
+        if key.startswith('var-'):
+            variables.setdefault(key[len('var-'):], []).append(value)
+    return variables
+
+
+def interpolate(text: str, variables: Dict[str, List[str]], all_values: Dict[str, str]) -> str:
+    """
+    Подставляет переменные дашборда в запрос панели (как это делает фронтенд Grafana).
+
+    Несколько значений превращаются в regex ``(a|b)``, ``$__all`` — в allValue переменной или ``.*``.
+    Встроенные переменные (``$__interval``, ``$__rate_interval``...) подставляет бэкенд Grafana.
+    """
+    def replace(match):
+        name = match.group(1) or match.group(2) or match.group(3)
+        if name.startswith('__') or name not in variables:
+            return match.group(0)
+        values = variables[name]
+        if '$__all' in values:
+            return all_values.get(name) or '.*'
+        return values[0] if len(values) == 1 else '(' + '|'.join(values) + ')'
+
+    return _VARIABLE.sub(replace, text)
+
+
+def _dashboard_variables(dashboard: dict, render_url: str):
+    # Значения по умолчанию из дашборда, поверх — значения из URL рендера
+    variables: Dict[str, List[str]] = {}
+    all_values: Dict[str, str] = {}
+    for variable in (dashboard.get('templating') or {}).get('list') or []:
+        name = variable.get('name')
+        if not name:
+            continue
+        current = (variable.get('current') or {}).get('value')
+        if current is not None:
+            variables[name] = [str(value) for value in current] if isinstance(current, list) else [str(current)]
+        if variable.get('allValue'):
+            all_values[name] = variable['allValue']
+    variables.update(url_variables(render_url))
+    return variables, all_values
+
+
+def build_probe_queries(dashboard: dict, panel: dict, render_url: str, window_ms: int,
+                        max_data_points: int) -> List[dict]:
+    """
+    Запросы панели для ``/api/ds/query`` с подставленными переменными и минимальным разрешением.
+
+    Returns:
+        list: Запросы (пустой, если у панели нет запросов с понятным источником данных)
+    """
+    variables, all_values = _dashboard_variables(dashboard, render_url)
+    queries = []
+    for target in panel.get('targets') or []:
+        if target.get('hide'):
+            continue
+        query = copy.deepcopy(target)
+        for key, value in query.items():
+            if isinstance(value, str):
+                query[key] = interpolate(value, variables, all_values)
+        datasource = target.get('datasource') or panel.get('datasource')
+        if isinstance(datasource, str):
+            datasource = {'uid': datasource}
+        if not isinstance(datasource, dict) or not datasource.get('uid'):
+            return []
+        datasource = {key: interpolate(str(value), variables, all_values) for key, value in datasource.items()}
+        if datasource['uid'].startswith(('-- ', '$')):
+            # Mixed/встроенный источник или неразрешённая переменная — пробу не выполняем
+            return []
+        query['datasource'] = datasource
+        query['maxDataPoints'] = max_data_points
+        query['intervalMs'] = max(1000, window_ms // max(1, max_data_points))
+        queries.append(query)
+    return queries
+
+
+def has_datapoints(response: dict) -> Optional[bool]:
+    """
+    Есть ли в ответе ``/api/ds/query`` хотя бы одна точка.
+
+    Returns:
+        bool | None: None, если один из запросов вернул ошибку
+    """
+    found = False
+    for result in (response.get('results') or {}).values():
+        if result.get('error'):
+            return None
+        for frame in result.get('frames') or []:
+            values = (frame.get('data') or {}).get('values') or []
+            if any(len(column) for column in values):
+                found = True
+    return found
+
+
+def probe_empty(session, job, settings: dict) -> bool:
+    """
+    Пробный запрос данных панели через ``/api/ds/query`` вместо рендера в браузере.
+
+    Returns:
+        bool: True, если панель точно без данных; при любой неопределённости — False (рендерить)
+    """
+    base_url = grafana_base_url(job.url)
+    dashboard = fetch_dashboard(session, base_url, job.dashboard_uid, job.headers, settings['timeout'])
+    panel = find_panel(dashboard, job.panel_id) if dashboard else None
+    if panel is None:
+        return False
+    query = dict(urllib.parse.parse_qsl(urllib.parse.urlsplit(job.url).query))
+    try:
+        window_ms = max(0, int(query['to']) - int(query['from']))
+    except (KeyError, ValueError):
+        # Окно не в epoch ms — пробу не выполняем
+        return False
+    queries = build_probe_queries(dashboard, panel, job.url, window_ms, int(settings['max_data_points']))
+    if not queries:
+        return False
+    try:
+        response = session.post(f"{base_url}/api/ds/query", json={
+            'queries': queries, 'from': query['from'], 'to': query['to'],
+        }, headers=job.headers, verify=False, timeout=settings['timeout'])
+        if response.status_code not in (200, 207):
+            return False
+        return has_datapoints(response.json()) is False
+    except Exception as e:
+        logging.debug(f"Проба панели {job.dashboard_uid}#{job.panel_id} не удалась: {e}")
+        return False
+
+
+def placeholder_png(width: int, height: int) -> bytes:
+    """Серая PNG-заглушка размера панели с пометкой ``Grafana-Render: no data`` в tEXt-чанке."""
+    width, height = max(1, int(width)), max(1, int(height))
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff)
+
+    row = b'\x00' + b'\xee' * width
+    return (b'\x89PNG\r\n\x1a\n'
+            + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 0, 0, 0, 0))
+            + chunk(b'tEXt', PLACEHOLDER_KEYWORD + b'\x00' + PLACEHOLDER_TEXT)
+            + chunk(b'IDAT', zlib.compress(row * height, 9))
+            + chunk(b'IEND', b''))
+
+
+def is_placeholder(path: str) -> bool:
+    """Является ли файл заглушкой панели без данных."""
+    try:
+        with open(path, 'rb') as f:
+            head = f.read(256)
+    except OSError:
+        return False
+    return head.startswith(b'\x89PNG') and PLACEHOLDER_KEYWORD + b'\x00' + PLACEHOLDER_TEXT in head
+
+
+def write_placeholder(job) -> None:
+    """Записывает заглушку вместо PNG панели (размер берётся из URL рендера)."""
+    query = dict(urllib.parse.parse_qsl(urllib.parse.urlsplit(job.url).query))
+    with open(job.output_file, 'wb') as f:
+        f.write(placeholder_png(query.get('width') or 1000, query.get('height') or 500))
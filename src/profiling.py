@@ -0,0 +1,140 @@
+import os
+import sys
+import time
+import pstats
+import logging
+import cProfile
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+# Глубина стека, сохраняемая tracemalloc для каждой аллокации
+_TRACE_FRAMES = 10
+
+# Служебные аллокации, которые не интересны в отчете
+_ALLOC_FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    tracemalloc.Filter(False, '<unknown>'),
+]
+
+
+@dataclass
+class StageProfile:
+    """Результат профилирования одной стадии."""
+    name: str
+    wall: float
+    profiles: List[cProfile.Profile] = field(default_factory=list)
+    snapshot: Optional[tracemalloc.Snapshot] = None
+    peak_bytes: int = 0
+
+
+class StageProfiler:
+    """
+    Профилирование стадий запуска: cProfile (CPU) и tracemalloc (память).
+
+    Потоки, запущенные во время стадии (например, рендеры планировщика), получают
+    собственный cProfile, и их статистика объединяется со статистикой стадии.
+    Стадии не вкладываются: внутренняя стадия при активной внешней не профилируется,
+    поэтому в режиме профилирования стадии запуска выполняются последовательно.
+    """
+
+    def __init__(self, top: int = 25):
+        self.enabled = False
+        self.top = top
+        self.stages: List[StageProfile] = []
+        self._active = None
+        self._lock = threading.Lock()
+
+    def _thread_bootstrap(self, frame, event, arg):
+        # Вызывается в первом событии нового потока: заменяем хук на cProfile этого потока
+        sys.setprofile(None)
+        active = self._active
+        if active is None:
+            return
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Python 3.12+: профилировщик стадии уже охватывает все потоки
+            return
+        with self._lock:
+            active.append(profile)
+
+    @contextmanager
+    def stage(self, name: str):
+        """Профилирует блок кода как стадию ``name`` (без эффекта, если профилирование выключено)."""
+        if not self.enabled or self._active is not None:
+            yield
+            return
+
+        profiles = []
+        self._active = profiles
+        main_profile = cProfile.Profile()
+        tracemalloc.start(_TRACE_FRAMES)
+        threading.setprofile(self._thread_bootstrap)
+        started = time.perf_counter()
+        main_profile.enable()
+        try:
+            yield
+        finally:
+            main_profile.disable()
+            wall = time.perf_counter() - started
+            threading.setprofile(None)
+            self._active = None
+            snapshot = tracemalloc.take_snapshot().filter_traces(_ALLOC_FILTERS)
+            peak_bytes = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            self.stages.append(StageProfile(name=name, wall=wall, profiles=[main_profile] + profiles,
+                                            snapshot=snapshot, peak_bytes=peak_bytes))
+
+    def _write_stage(self, stage: StageProfile, folder: str) -> str:
+        stats = pstats.Stats(stage.profiles[0])
+        for profile in stage.profiles[1:]:
+            stats.add(profile)
+        prof_path = os.path.join(folder, f"{stage.name}.prof")
+        stats.dump_stats(prof_path)
+
+        with open(os.path.join(folder, f"{stage.name}.alloc.txt"), 'w', encoding='utf-8') as f:
+            f.write(f"Стадия: {stage.name}\n")
+            f.write(f"Время: {stage.wall:.3f} с, CPU-профилей потоков: {len(stage.profiles)}\n")
+            f.write(f"Пик памяти: {stage.peak_bytes / 1024:.1f} KiB\n\n")
+            f.write(f"Топ-{self.top} мест аллокаций (живые на конец стадии):\n")
+            for stat in stage.snapshot.statistics('lineno')[:self.top]:
+                f.write(f"{stat}\n")
+            f.write(f"\nТоп-{self.top} функций по накопленному времени:\n")
+            stats.stream = f
+            stats.sort_stats('cumulative').print_stats(self.top)
+        return prof_path
+
+    def write(self, folder: str) -> Optional[str]:
+        """
+        Сохраняет ``<стадия>.prof`` и ``<стадия>.alloc.txt`` для всех стадий в ``<folder>/profile``.
+
+        Returns:
+            str | None: Папка с профилями или None, если профилей нет
+        """
+        if not self.stages:
+            return None
+        profile_dir = os.path.join(folder, 'profile')
+        os.makedirs(profile_dir, exist_ok=True)
+        for stage in self.stages:
+            self._write_stage(stage, profile_dir)
+            logging.info(f"🔬 Профиль {stage.name}: {stage.wall:.2f} с, пик памяти {stage.peak_bytes / 1024:.0f} KiB")
+        return profile_dir
+
+    def clear(self) -> None:
+        """Удаляет накопленные профили (например, между прогонами режима наблюдения)."""
+        self.stages.clear()
+
+
+# Общий профилировщик процесса (включается флагом --profile)
+profiler = StageProfiler()
+
+
+def profile_stage(name: str):
+    """Стадия в общем профилировщике: ``with profile_stage('config.load'): ...``"""
+    return profiler.stage(name)
@@ -0,0 +1,339 @@
+import os
+import json
+import html
+import logging
+import urllib.parse
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from probe import is_placeholder
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow — необязательная зависимость: без неё в отчёт вставляются исходные картинки
+    Image = None
+
+_DEFAULT_REPORT = {
+    'enabled': False,
+    'format': 'html',          # html | md
+    'thumbnail_width': 480,    # Ширина миниатюр, px
+    'workers': 4,              # Процессов для миниатюр
+    'title': '',               # Заголовок (пусто — имя папки запуска)
+}
+
+FORMATS = ('html', 'md')
+
+IMAGE_EXTENSIONS = ('.png', '.webp', '.avif')
+
+# Папки с метриками, которые идут после сервисов, в этом порядке
+_TRAILING_GROUPS = ('grouped', 'gatling_metrics', 'postgresql_metrics')
+
+REPORT_DIR = 'report'
+
+
+def report_settings(cfg) -> dict:
+    """Настройки секции ``report`` со значениями по умолчанию."""
+    settings = dict(_DEFAULT_REPORT)
+    settings.update(cfg.get('report') or {})
+    if settings['format'] not in FORMATS:
+        raise ValueError(f"Неизвестный формат отчёта '{settings['format']}': ожидается html или md")
+    return settings
+
+
+def gatling_summary(report_dir: str) -> Optional[dict]:
+    """
+    Сводка отчёта Gatling из ``js/stats.json``.
+
+    Returns:
+        dict | None: {'name', 'rows': [{'name', 'total', 'ko', 'mean', 'p50', 'p95', 'p99', 'rps'}]}
+        (первая строка — все запросы) или None, если файла нет
+    """
+    path = os.path.join(report_dir, 'js', 'stats.json')
+    if not os.path.isfile(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        stats = json.load(f)
+
+    def row(node):
+        values = node.get('stats') or {}
+
+        def total(key):
+            return (values.get(key) or {}).get('total')
+
+        requests = values.get('numberOfRequests') or {}
+        # percentiles1..4 — 50/75/95/99 перцентили при настройках Gatling по умолчанию
+        return {'name': node.get('name') or values.get('name', ''), 'total': requests.get('total'),
+                'ko': requests.get('ko'), 'mean': total('meanResponseTime'), 'p50': total('percentiles1'),
+                'p95': total('percentiles3'), 'p99': total('percentiles4'),
+                'rps': total('meanNumberOfRequestsPerSecond')}
+
+    rows = [row(stats)]
+    pending = list((stats.get('contents') or {}).values())
+    while pending:
+        node = pending.pop(0)
+        if node.get('type') == 'REQUEST':
+            rows.append(row(node))
+        pending.extend((node.get('contents') or {}).values())
+    return {'name': os.path.basename(os.path.normpath(report_dir)), 'rows': rows}
+
+
+def _images(folder: str) -> List[str]:
+    try:
+        names = sorted(os.listdir(folder))
+    except OSError:
+        return []
+    return [os.path.join(folder, name) for name in names
+            if name.lower().endswith(IMAGE_EXTENSIONS) and not name.startswith('_')]
+
+
+def _subfolders(folder: str) -> List[str]:
+    try:
+        return sorted(entry.name for entry in os.scandir(folder) if entry.is_dir())
+    except OSError:
+        return []
+
+
+def scan_run_folder(folder: str) -> Iterator[Tuple[str, object]]:
+    """
+    Обходит папку запуска по разделам, не загружая картинки.
+
+    Returns:
+        Iterator: Пары (заголовок, сводка Gatling) и (заголовок, [пути картинок]) в порядке отчёта:
+        отчёты Gatling, затем метрики запуска и окружений (сервисы, grouped, Gatling, PostgreSQL)
+    """
+    gatling_dir = os.path.join(folder, 'gatling')
+    for name in _subfolders(gatling_dir):
+        summary = gatling_summary(os.path.join(gatling_dir, name))
+        if summary is not None:
+            yield f"Gatling: {name}", summary
+
+    # Метрики запуска и окружений (секция environments — подпапки с metrics/)
+    roots = [('', os.path.join(folder, 'metrics'))]
+    roots += [(f"{name} / ", os.path.join(folder, name, 'metrics')) for name in _subfolders(folder)
+              if name not in ('gatling', 'metrics', REPORT_DIR)]
+    for prefix, metrics_dir in roots:
+        groups = _subfolders(metrics_dir)
+        ordered = [group for group in groups if group not in _TRAILING_GROUPS]
+        ordered += [group for group in _TRAILING_GROUPS if group in groups]
+        for group in ordered:
+            group_dir = os.path.join(metrics_dir, group)
+            if group == 'gatling_metrics':
+                for script in _subfolders(group_dir):
+                    images = _images(os.path.join(group_dir, script))
+                    if images:
+                        yield f"{prefix}Gatling метрики: {script}", images
+                continue
+            images = _images(group_dir)
+            if images:
+                yield f"{prefix}{group}", images
+
+
+def make_thumbnail(source: str, target: str, width: int) -> Optional[str]:
+    """
+    Миниатюра картинки шириной ``width`` (выполняется в процессе пула).
+
+    Файл заменяется атомарно: после ``blob_store`` старая миниатюра может быть жёсткой
+    ссылкой на общий блоб, запись поверх неё испортила бы миниатюры других запусков.
+
+    Returns:
+        str | None: Путь миниатюры или None, если картинку не удалось открыть
+    """
+    try:
+        with Image.open(source) as image:
+            image.thumbnail((width, width * 10))
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            tmp = f"{target}.tmp"
+            image.save(tmp, format='PNG', optimize=True)
+        os.replace(tmp, target)
+        return target
+    except Exception as e:
+        logging.debug(f"Не удалось сделать миниатюру {source}: {e}")
+        return None
+
+
+def _signature(path: str) -> List[int]:
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def _link(path: str, base: str) -> str:
+    return urllib.parse.quote(os.path.relpath(path, base).replace(os.sep, '/'))
+
+
+class _HtmlWriter:
+    def __init__(self, f, base: str, width: int):
+        self.f, self.base, self.width = f, base, width
+
+    def header(self, title: str) -> None:
+        self.f.write('<!DOCTYPE html>\n<html lang="ru"><head><meta charset="utf-8">'
+                     f'<title>{html.escape(title)}</title><style>'
+                     'body{font-family:sans-serif;margin:24px}'
+                     'table{border-collapse:collapse}td,th{border:1px solid #ccc;padding:2px 8px;text-align:right}'
+                     'td:first-child,th:first-child{text-align:left}'
+                     'figure{display:inline-block;margin:4px;vertical-align:top}'
+                     'figcaption{font-size:12px;color:#555}</style></head><body>\n'
+                     f'<h1>{html.escape(title)}</h1>\n')
+
+    def summary(self, title: str, summary: dict) -> None:
+        self.f.write(f'<h2>{html.escape(title)}</h2>\n<table><tr><th>Запрос</th><th>Всего</th><th>KO</th>'
+                     '<th>Среднее, мс</th><th>p50</th><th>p95</th><th>p99</th><th>RPS</th></tr>\n')
+        for row in summary['rows']:
+            cells = ''.join(f'<td>{html.escape(_format(row[key]))}</td>'
+                            for key in ('total', 'ko', 'mean', 'p50', 'p95', 'p99', 'rps'))
+            self.f.write(f'<tr><td>{html.escape(str(row["name"]))}</td>{cells}</tr>\n')
+        self.f.write('</table>\n')
+
+    def section(self, title: str) -> None:
+        self.f.write(f'<h2>{html.escape(title)}</h2>\n')
+
+    def image(self, name: str, source: str, thumbnail: Optional[str]) -> None:
+        src = _link(thumbnail or source, self.base)
+        width = '' if thumbnail else f' width="{self.width}"'
+        self.f.write(f'<figure><a href="{_link(source, self.base)}"><img src="{src}" loading="lazy"{width} '
+                     f'alt="{html.escape(name)}"></a><figcaption>{html.escape(name)}</figcaption></figure>\n')
+
+    def empty(self, names: List[str]) -> None:
+        self.f.write(f'<p>Нет данных: {html.escape(", ".join(names))}</p>\n')
+
+    def footer(self) -> None:
+        self.f.write('</body></html>\n')
+
+
+class _MarkdownWriter(_HtmlWriter):
+    def header(self, title: str) -> None:
+        self.f.write(f'# {title}\n\n')
+
+    def summary(self, title: str, summary: dict) -> None:
+        self.f.write(f'## {title}\n\n| Запрос | Всего | KO | Среднее, мс | p50 | p95 | p99 | RPS |\n'
+                     '|---|---:|---:|---:|---:|---:|---:|---:|\n')
+        for row in summary['rows']:
+            cells = ' | '.join(_format(row[key]) for key in ('total', 'ko', 'mean', 'p50', 'p95', 'p99', 'rps'))
+            self.f.write(f'| {row["name"]} | {cells} |\n')
+        self.f.write('\n')
+
+    def section(self, title: str) -> None:
+        self.f.write(f'\n## {title}\n\n')
+
+    def image(self, name: str, source: str, thumbnail: Optional[str]) -> None:
+        self.f.write(f'[![{name}]({_link(thumbnail or source, self.base)})]({_link(source, self.base)})\n')
+
+    def empty(self, names: List[str]) -> None:
+        self.f.write(f'\nНет данных: {", ".join(names)}\n')
+
+    def footer(self) -> None:
+        pass
+
+
+def _format(value) -> str:
+    if value is None:
+        return '—'
+    if isinstance(value, float):
+        return f"{value:.1f}"
+    return str(value)
+
+
+def build_report(folder: str, settings: dict) -> str:
+    """
+    Собирает один документ отчёта по папке запуска.
+
+    Миниатюры (нужен Pillow) строятся в пуле процессов только для новых и изменившихся
+    картинок: размер и время изменения каждой картинки хранятся в ``report/manifest.json``.
+    Документ пишется на диск по разделам, картинки в память не загружаются; если ни
+    одна картинка и сводка не изменились, документ не переписывается.
+
+    Returns:
+        str: Путь документа (``<папка запуска>/report.html`` или ``report.md``)
+    """
+    report_dir = os.path.join(folder, REPORT_DIR)
+    manifest_path = os.path.join(report_dir, 'manifest.json')
+    document = os.path.join(folder, f"report.{settings['format']}")
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            previous = json.load(f)
+    except (OSError, ValueError):
+        previous = {}
+    previous_files: Dict[str, dict] = previous.get('files') or {}
+
+    width = int(settings['thumbnail_width'])
+    if previous.get('thumbnail_width') != width:
+        # Другой размер миниатюр — строим все заново
+        previous_files = {}
+
+    def reusable(old: dict, entry: dict) -> bool:
+        if old.get('signature') != entry['signature']:
+            return False
+        if old.get('thumbnail'):
+            return os.path.exists(os.path.join(folder, old['thumbnail']))
+        return Image is None or entry['empty']
+
+    sections = list(scan_run_folder(folder))
+    files: Dict[str, dict] = {}
+    pending = []
+    for _, content in sections:
+        if isinstance(content, dict):
+            continue
+        for path in content:
+            name = os.path.relpath(path, folder)
+            entry = {'signature': _signature(path), 'empty': is_placeholder(path), 'thumbnail': None}
+            old = previous_files.get(name) or {}
+            if reusable(old, entry):
+                entry['thumbnail'] = old.get('thumbnail')
+            elif Image is not None and not entry['empty']:
+                pending.append(name)
+            files[name] = entry
+
+    if pending:
+        targets = [os.path.join(report_dir, 'thumbs', f"{os.path.splitext(name)[0]}.png") for name in pending]
+        with ProcessPoolExecutor(max_workers=max(1, min(int(settings['workers']), len(pending)))) as executor:
+            thumbnails = list(executor.map(make_thumbnail, [os.path.join(folder, name) for name in pending],
+                                           targets, [width] * len(pending), chunksize=8))
+        for name, thumbnail in zip(pending, thumbnails):
+            files[name]['thumbnail'] = os.path.relpath(thumbnail, folder) if thumbnail else None
+
+    # Миниатюры картинок, которых больше нет
+    for name, old in (previous.get('files') or {}).items():
+        if name not in files and old.get('thumbnail'):
+            try:
+                os.remove(os.path.join(folder, old['thumbnail']))
+            except OSError:
+                pass
+
+    summaries = {title: content for title, content in sections if isinstance(content, dict)}
+    manifest = {'format': settings['format'], 'thumbnail_width': width, 'files': files, 'summaries': summaries}
+    if manifest == previous and os.path.exists(document):
+        logging.info(f"📄 Отчет не изменился: {document}")
+        return document
+
+    title = settings['title'] or os.path.basename(os.path.normpath(folder))
+    tmp = f"{document}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        writer = (_HtmlWriter if settings['format'] == 'html' else _MarkdownWriter)(
+            f, folder, width)
+        writer.header(title)
+        for section_title, content in sections:
+            if isinstance(content, dict):
+                writer.summary(section_title, content)
+                continue
+            writer.section(section_title)
+            empty = []
+            for path in content:
+                name = os.path.relpath(path, folder)
+                label = os.path.splitext(os.path.basename(path))[0]
+                if files[name]['empty']:
+                    empty.append(label)
+                    continue
+                thumbnail = files[name]['thumbnail']
+                writer.image(label, path, os.path.join(folder, thumbnail) if thumbnail else None)
+            if empty:
+                writer.empty(empty)
+        writer.footer()
+    os.replace(tmp, document)
+
+    os.makedirs(report_dir, exist_ok=True)
+    # Как и документ — через временный файл: манифест может быть ссылкой на блоб blob_store
+    tmp = f"{manifest_path}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, manifest_path)
+    logging.info(f"📄 Отчет: {document} (картинок: {len(files)}, новых миниатюр: {len(pending)})")
+    return document
@@ -0,0 +1,117 @@
+import time
+import logging
+import threading
+from typing import Optional
+
+# Ответы, означающие проблему на стороне хоста (рендерер перегружен или недоступен)
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+# Текст ошибки задачи, отклонённой открытым circuit breaker
+CIRCUIT_OPEN_ERROR = 'circuit open'
+
+
+def is_host_failure(status: Optional[int]) -> bool:
+    """Сбой хоста: нет ответа (таймаут, обрыв соединения) или статус 429/5xx."""
+    return status is None or status in RETRYABLE_STATUSES
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker одного хоста Grafana.
+
+    closed    — запросы идут как обычно, считаются сбои подряд;
+    open      — после ``failure_threshold`` сбоев подряд запросы сразу отклоняются;
+    half-open — через ``reset_timeout`` секунд пропускается один пробный запрос,
+                остальные ждут его результата: успех закрывает breaker, сбой снова открывает.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.reset_timeout = float(reset_timeout)
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._cond = threading.Condition()
+
+    def allow(self) -> bool:
+        """Можно ли выполнить запрос сейчас (в half-open ждёт результат пробного запроса)."""
+        with self._cond:
+            while True:
+                if self.state == self.CLOSED:
+                    return True
+                if self.state == self.OPEN:
+                    if time.monotonic() - self.opened_at < self.reset_timeout:
+                        return False
+                    self.state = self.HALF_OPEN
+                    logging.info(f"🔁 {self.name}: пробный запрос после паузы {self.reset_timeout:.0f} с")
+                    return True
+                self._cond.wait()
+
+    def retry_after(self) -> float:
+        """Сколько секунд осталось до пробного запроса (0, если breaker не открыт)."""
+        with self._cond:
+            if self.state != self.OPEN:
+                return 0.0
+            return max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+
+    def record_success(self) -> None:
+        with self._cond:
+            if self.state != self.CLOSED:
+                logging.info(f"✅ {self.name}: хост восстановился, circuit breaker закрыт")
+            self.state = self.CLOSED
+            self.failures = 0
+            self._cond.notify_all()
+
+    def record_failure(self) -> None:
+        with self._cond:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or (self.state == self.CLOSED and self.failures >= self.failure_threshold):
+                logging.warning(f"⛔ {self.name}: {self.failures} сбоев подряд, circuit breaker открыт "
+                                f"на {self.reset_timeout:.0f} с")
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+            self._cond.notify_all()
+
+
+class RetryBudget:
+    """
+    Общий бюджет повторов на запуск: ограничивает число повторов и суммарное
+    время на них (паузы backoff плюс сами повторные запросы).
+    """
+
+    def __init__(self, max_retries: Optional[int] = None, max_seconds: Optional[float] = None):
+        self.max_retries = max_retries
+        self.max_seconds = max_seconds
+        self.retries = 0
+        self.seconds = 0.0
+        self._exhausted_logged = False
+        self._lock = threading.Lock()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.retries = 0
+            self.seconds = 0.0
+            self._exhausted_logged = False
+
+    def acquire(self) -> bool:
+        """Резервирует один повтор; False, если бюджет исчерпан."""
+        with self._lock:
+            exhausted = ((self.max_retries is not None and self.retries >= self.max_retries) or
+                         (self.max_seconds is not None and self.seconds >= self.max_seconds))
+            if exhausted:
+                if not self._exhausted_logged:
+                    self._exhausted_logged = True
+                    logging.warning(f"⚠️  Бюджет повторов исчерпан: {self.retries} повторов, {self.seconds:.0f} с")
+                return False
+            self.retries += 1
+            return True
+
+    def spend(self, seconds: float) -> None:
+        """Учитывает время, потраченное на повтор."""
+        with self._lock:
+            self.seconds += seconds
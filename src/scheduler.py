@@ -0,0 +1,362 @@
+import os
+import shutil
+import logging
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field, replace
+from typing import Any, Callable, Dict, List, Optional
+
+from timings import RenderTiming
+from resilience import CircuitBreaker, RetryBudget, CIRCUIT_OPEN_ERROR, is_host_failure
+
+# Текст ошибки задачи, не запущенной из-за дедлайна запуска
+DEADLINE_ERROR = 'deadline'
+
+# Вес нового наблюдения в скользящей оценке длительности рендера на хосте
+_ESTIMATE_ALPHA = 0.3
+
+
+@dataclass
+class RenderJob:
+    """Одна задача рендера панели Grafana в PNG."""
+    run: str                 # Метка запуска (имя основной папки)
+    source: str              # Источник: grafana | gatling | postgresql
+    group: str               # Сервис, Gatling-скрипт или postgresql_metrics
+    name: str                # Имя метрики (имя файла без .png)
+    url: str                 # Полный URL рендера
+    headers: Dict[str, str]  # Заголовки авторизации
+    output_file: str         # Куда сохранить PNG
+    timeout: float = 120     # Таймаут HTTP-запроса, с
+    dashboard_uid: str = ''  # UID дашборда (для статистики)
+    panel_id: Any = None     # ID панели (для статистики)
+    priority: int = 0        # Приоритет: задачи с большим значением запускаются раньше
+    window: int = 0          # Длина окна from-to, с (для истории длительностей рендера)
+
+    @property
+    def host(self) -> str:
+        """Хост Grafana, к которому относится задача."""
+        return urllib.parse.urlsplit(self.url).netloc
+
+
+@dataclass
+class JobResult:
+    """Результат выполнения задачи рендера."""
+    job: RenderJob
+    ok: bool
+    duration: float = 0.0
+    deduplicated: bool = False
+    error: str = ''
+    timing: Optional[RenderTiming] = None
+
+
+@dataclass
+class SchedulerStats:
+    """Сводные счётчики планировщика за время жизни (на весь пакет запусков)."""
+    submitted: int = 0
+    rendered: int = 0
+    deduplicated: int = 0
+    failed: int = 0
+    retries: int = 0
+    rejected: int = 0        # Отклонено открытым circuit breaker
+    skipped: int = 0         # Не запущено из-за дедлайна
+    hosts: Dict[str, int] = field(default_factory=dict)
+
+
+class RenderScheduler:
+    """
+    Общий планировщик задач рендера.
+
+    Выполняет задачи в пуле потоков с ограничением параллелизма на хост Grafana
+    и схлопывает одинаковые запросы (один URL и заголовки) в один рендер —
+    результат копируется во все нужные файлы. Один экземпляр используется
+    для всех запусков пакета, поэтому сессии хостов и их пулы соединений общие.
+
+    Повторы выполняются здесь, а не в HTTP-адаптере: сбой хоста (таймаут, обрыв,
+    429/5xx) повторяется с экспоненциальной паузой в пределах общего бюджета
+    повторов, а circuit breaker хоста после серии сбоев быстро отклоняет
+    оставшиеся задачи (или откладывает их до пробного запроса).
+
+    Задачи запускаются в порядке приоритета, а внутри приоритета — сначала самые
+    долгие по истории рендеров (LPT) с чередованием хостов по оставшемуся объёму
+    работы, чтобы все хосты заканчивали примерно одновременно. При заданном дедлайне таймаут
+    запроса ограничивается оставшимся временем, а задача не запускается,
+    если по оценке длительности рендеров на её хосте уже не успеет завершиться.
+    """
+
+    def __init__(self, fetch: Callable, sessions, max_workers: int = 4, per_host_limit: int = 2,
+                 retries: int = 0, backoff_factor: float = 0.5, retry_budget: Optional[RetryBudget] = None,
+                 breaker_threshold: Optional[int] = None, breaker_reset: float = 30.0, defer_open: bool = True,
+                 deadline: Optional[float] = None, latency_store=None, optimizer=None):
+        """
+        Args:
+            fetch (Callable): Функция ``fetch(session, job, timing) -> bool``, выполняющая рендер
+                и заполняющая тайминги RenderTiming
+            sessions (SessionRegistry): Реестр HTTP-сессий по хостам (None — fetch получает session=None)
+            max_workers (int): Общее число параллельных рендеров
+            per_host_limit (int): Максимум одновременных рендеров на один хост
+            retries (int): Максимум повторов одной задачи при сбое хоста
+            backoff_factor (float): Пауза перед повтором: backoff_factor * 2^номер_повтора, с
+            retry_budget (RetryBudget, optional): Общий бюджет повторов на весь запуск: сбрасывается вызывающим
+                кодом один раз перед стадией, а не в каждом run (повторы рендера и fallback-и тратят тот же бюджет)
+            breaker_threshold (int, optional): Сбоев подряд до открытия breaker хоста (None — без breaker)
+            breaker_reset (float): Пауза до пробного запроса к хосту, с
+            defer_open (bool): Отложенные breaker задачи повторить после пробного запроса (иначе — сразу ошибка)
+            deadline (float, optional): Дедлайн каждого вызова run, секунд от его начала (None — без дедлайна)
+            latency_store (LatencyStore, optional): История длительностей рендера: оценки для порядка
+                запуска и дедлайна, пополняется результатами каждого run
+            optimizer (ImageOptimizer, optional): Пересжатие картинок: получает каждую панель сразу
+                после рендера, run дожидается его перед возвратом
+        """
+        self.fetch = fetch
+        self.sessions = sessions
+        self.max_workers = max(1, int(max_workers))
+        self.per_host_limit = max(1, int(per_host_limit))
+        self.retries = max(0, int(retries))
+        self.backoff_factor = float(backoff_factor)
+        self.retry_budget = retry_budget or RetryBudget()
+        self.breaker_threshold = breaker_threshold
+        self.breaker_reset = float(breaker_reset)
+        self.defer_open = defer_open
+        self.deadline = deadline
+        self.latency_store = latency_store
+        self.optimizer = optimizer
+        self.stats = SchedulerStats()
+        self._estimates: Dict[str, float] = {}
+        self._host_slots: Dict[str, threading.Semaphore] = {}
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def _slot(self, host: str) -> threading.Semaphore:
+        with self._lock:
+            if host not in self._host_slots:
+                self._host_slots[host] = threading.Semaphore(self.per_host_limit)
+            return self._host_slots[host]
+
+    def breaker(self, host: str) -> Optional[CircuitBreaker]:
+        """Circuit breaker хоста (None, если breaker выключен)."""
+        if self.breaker_threshold is None:
+            return None
+        with self._lock:
+            if host not in self._breakers:
+                self._breakers[host] = CircuitBreaker(host, self.breaker_threshold, self.breaker_reset)
+            return self._breakers[host]
+
+    def _estimate(self, host: str) -> float:
+        with self._lock:
+            return self._estimates.get(host, 0.0)
+
+    def _observe(self, host: str, seconds: float) -> None:
+        with self._lock:
+            previous = self._estimates.get(host)
+            self._estimates[host] = seconds if previous is None else \
+                previous + _ESTIMATE_ALPHA * (seconds - previous)
+
+    def job_estimate(self, job: RenderJob) -> Optional[float]:
+        """Ожидаемая длительность рендера по истории (None, если истории нет)."""
+        return self.latency_store.estimate(job) if self.latency_store is not None else None
+
+    def _fits_deadline(self, job: RenderJob, deadline: Optional[float]) -> bool:
+        if deadline is None:
+            return True
+        expected = self.job_estimate(job)
+        return time.monotonic() + (expected if expected is not None else self._estimate(job.host)) < deadline
+
+    @staticmethod
+    def group_duplicates(jobs: List[RenderJob]) -> List[List[int]]:
+        """Группирует индексы одинаковых запросов (URL и заголовки): рендерим один раз, остальным копируем файл."""
+        unique: Dict[tuple, List[int]] = {}
+        for index, job in enumerate(jobs):
+            key = (job.url, tuple(sorted(job.headers.items())))
+            unique.setdefault(key, []).append(index)
+        return list(unique.values())
+
+    def dispatch_order(self, jobs: List[RenderJob], groups: List[List[int]]) -> List[List[int]]:
+        """
+        Порядок запуска групп задач: по убыванию приоритета, внутри приоритета —
+        жадно с хоста с наибольшим оставшимся объёмом работы его самая долгая задача.
+        Для задач без истории берётся средняя оценка остальных (или 1 с).
+        """
+        estimates = {indexes[0]: self.job_estimate(self.primary_job(jobs, indexes)) for indexes in groups}
+        known = [value for value in estimates.values() if value is not None]
+        fallback = sum(known) / len(known) if known else 1.0
+
+        tiers: Dict[int, List[List[int]]] = {}
+        for indexes in groups:
+            tiers.setdefault(max(jobs[index].priority for index in indexes), []).append(indexes)
+
+        order = []
+        for priority in sorted(tiers, reverse=True):
+            per_host: Dict[str, list] = {}
+            for indexes in tiers[priority]:
+                value = estimates[indexes[0]]
+                per_host.setdefault(jobs[indexes[0]].host, []).append((fallback if value is None else value, indexes))
+            remaining = {}
+            for host, items in per_host.items():
+                items.sort(key=lambda item: item[0], reverse=True)
+                remaining[host] = sum(value for value, _ in items)
+            while per_host:
+                host = max(remaining, key=remaining.get)
+                value, indexes = per_host[host].pop(0)
+                remaining[host] -= value
+                order.append(indexes)
+                if not per_host[host]:
+                    del per_host[host], remaining[host]
+        return order
+
+    def _attempt(self, job: RenderJob, timing: RenderTiming):
+        session = self.sessions.get(job.host) if self.sessions is not None else None
+        try:
+            ok = bool(self.fetch(session, job, timing))
+            error = '' if ok else 'download failed'
+        except Exception as e:
+            ok = False
+            error = str(e)
+            logging.error(f"    💥 Критическая ошибка при скачивании метрики {job.name}: {error}")
+        if self.sessions is not None:
+            self.sessions.record(job.host, timing.new_connections)
+        return ok, error
+
+    def _execute(self, job: RenderJob, submitted: float, deadline: Optional[float] = None) -> JobResult:
+        with self._slot(job.host):
+            started = time.monotonic()
+            timing = RenderTiming(queue_wait=started - submitted)
+            breaker = self.breaker(job.host)
+            attempt = 0
+            while True:
+                if not self._fits_deadline(job, deadline):
+                    ok, error = False, DEADLINE_ERROR
+                    break
+                if breaker is not None and not breaker.allow():
+                    ok, error = False, CIRCUIT_OPEN_ERROR
+                    break
+                attempt_job = job
+                if deadline is not None:
+                    # Запрос не должен пережить дедлайн запуска
+                    attempt_job = replace(job, timeout=max(0.1, min(job.timeout, deadline - time.monotonic())))
+                attempt_started = time.monotonic()
+                ok, error = self._attempt(attempt_job, timing)
+                if ok:
+                    self._observe(job.host, time.monotonic() - attempt_started)
+                host_failure = not ok and is_host_failure(timing.status)
+                if breaker is not None:
+                    if host_failure:
+                        breaker.record_failure()
+                    else:
+                        breaker.record_success()
+                if attempt:
+                    self.retry_budget.spend(time.monotonic() - attempt_started)
+                if ok or not host_failure or attempt >= self.retries:
+                    break
+                if breaker is not None and breaker.state == CircuitBreaker.OPEN:
+                    # Хост признан недоступным: не ждём паузу повтора, задача отложится вместе с остальными
+                    error = CIRCUIT_OPEN_ERROR
+                    break
+                if not self.retry_budget.acquire():
+                    break
+                delay = self.backoff_factor * (2 ** attempt)
+                attempt += 1
+                logging.info(f"    🔁 Повтор {attempt}/{self.retries} для {job.name} через {delay:.1f} с")
+                time.sleep(delay)
+                self.retry_budget.spend(delay)
+            # Повторы делает планировщик, HTTP-адаптер их не выполняет
+            timing.retries += attempt
+            return JobResult(job=job, ok=ok, duration=time.monotonic() - started, error=error, timing=timing)
+
+    def run(self, jobs: List[RenderJob]) -> List[JobResult]:
+        """
+        Выполняет задачи и возвращает результаты в исходном порядке.
+
+        Args:
+            jobs (list): Список задач RenderJob (могут относиться к разным запускам)
+
+        Returns:
+            list: Список JobResult той же длины, что и ``jobs``
+        """
+        deadline = time.monotonic() + float(self.deadline) if self.deadline else None
+        groups = self.dispatch_order(jobs, self.group_duplicates(jobs))
+        primaries = self._run_primary(jobs, groups, deadline)
+
+        # Задачи, отклонённые открытым breaker, повторяем один раз после паузы до пробного запроса
+        deferred = [indexes for indexes in groups if primaries[indexes[0]].error == CIRCUIT_OPEN_ERROR]
+        if deferred and self.defer_open:
+            wait = max(self.breaker(jobs[indexes[0]].host).retry_after() for indexes in deferred)
+            logging.warning(f"⏸️  Отложено задач из-за недоступных хостов: {len(deferred)}, "
+                            f"повтор через {wait:.0f} с")
+            if deadline is not None:
+                wait = min(wait, max(0.0, deadline - time.monotonic()))
+            time.sleep(wait)
+            primaries.update(self._run_primary(jobs, deferred, deadline))
+
+        results: List[Optional[JobResult]] = [None] * len(jobs)
+        for indexes in groups:
+            primary = replace(primaries[indexes[0]], job=jobs[indexes[0]])
+            results[indexes[0]] = primary
+            for index in indexes[1:]:
+                results[index] = self._copy_result(primary, jobs[index])
+
+        for result in results:
+            self.stats.submitted += 1
+            if result.timing is not None:
+                self.stats.retries += result.timing.retries
+            if result.error == CIRCUIT_OPEN_ERROR and not result.deduplicated:
+                self.stats.rejected += 1
+            if result.error == DEADLINE_ERROR and not result.deduplicated:
+                self.stats.skipped += 1
+            self.stats.hosts[result.job.host] = self.stats.hosts.get(result.job.host, 0) + 1
+            if not result.ok:
+                self.stats.failed += 1
+            elif result.deduplicated:
+                self.stats.deduplicated += 1
+            else:
+                self.stats.rendered += 1
+        if self.latency_store is not None:
+            self.latency_store.record(results)
+        if self.optimizer is not None:
+            self.optimizer.wait()
+        return results
+
+    def close(self) -> None:
+        """Закрывает историю длительностей рендера (соединение SQLite) и пул пересжатия картинок."""
+        if self.latency_store is not None:
+            self.latency_store.close()
+            self.latency_store = None
+        if self.optimizer is not None:
+            self.optimizer.close()
+
+    def _run_primary(self, jobs: List[RenderJob], groups: List[List[int]],
+                     deadline: Optional[float] = None) -> Dict[int, JobResult]:
+        """Выполняет по одной задаче из каждой группы одинаковых запросов (в порядке групп)."""
+        primaries = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='render') as executor:
+            submitted = time.monotonic()
+            futures = {executor.submit(self._execute, self.primary_job(jobs, indexes), submitted, deadline): indexes[0]
+                       for indexes in groups}
+            for future in as_completed(futures):
+                result = primaries[futures[future]] = future.result()
+                if self.optimizer is not None and result.ok:
+                    # Пересжатие готовой панели идёт параллельно с остальными рендерами
+                    self.optimizer.submit(result.job)
+        return primaries
+
+    @staticmethod
+    def primary_job(jobs: List[RenderJob], indexes: List[int]) -> RenderJob:
+        """Задача, выполняемая за всю группу: наибольшие приоритет и таймаут среди её задач."""
+        job = jobs[indexes[0]]
+        if len(indexes) == 1:
+            return job
+        return replace(job, priority=max(jobs[index].priority for index in indexes),
+                       timeout=max(jobs[index].timeout for index in indexes))
+
+    @staticmethod
+    def _copy_result(primary: JobResult, job: RenderJob) -> JobResult:
+        if not primary.ok:
+            return JobResult(job=job, ok=False, deduplicated=True, error=primary.error)
+        try:
+            os.makedirs(os.path.dirname(job.output_file), exist_ok=True)
+            shutil.copyfile(primary.job.output_file, job.output_file)
+            return JobResult(job=job, ok=True, deduplicated=True)
+        except OSError as e:
+            logging.error(f"Не удалось скопировать {primary.job.output_file} -> {job.output_file}: {e}")
+            return JobResult(job=job, ok=False, deduplicated=True, error=str(e))
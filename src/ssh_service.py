@@ -2,58 +2,208 @@ import paramiko
 import os
 import shutil
 import logging
+import re
+import stat
+import time
+import fnmatch
 import subprocess
+from datetime import datetime
 from pathlib import Path
+import pytz
+from utils import parse_size
+from tracing import span
 
-def ssh_download_last_report(cfg, main_folder_path):
+# Метка времени в конце имени каталога отчета Gatling: <simulation>-<yyyyMMddHHmmssSSS>
+_REPORT_TIMESTAMP = re.compile(r"-(\d{17})$")
+
+# Правила «скачать всё» для копирования по SFTP через уже открытое соединение
+_COPY_ALL = {'include': [], 'exclude': [], 'max_file_size': None}
+
+
+def _get_transfer_filter(ssh_cfg):
     """
-    Функция для скачивания последнего отчета Gatling с сервера.
-    
+    Извлекает правила выборочной загрузки отчёта из ``ssh_config``.
+
+    Поддерживаемые ключи:
+        - include (list): glob-шаблоны относительных путей, которые нужно скачать
+        - exclude (list): glob-шаблоны путей (файлов или каталогов), которые нужно пропустить
+        - max_file_size (int | str): предельный размер одного файла ("512KB", "5MB", ...)
+
+    Returns:
+        dict | None: Правила фильтрации или None, если фильтры не заданы
+            (в этом случае отчёт копируется целиком через ``scp -r``)
+    """
+    include = ssh_cfg.get('include') or []
+    exclude = ssh_cfg.get('exclude') or []
+    if isinstance(include, str):
+        include = [include]
+    if isinstance(exclude, str):
+        exclude = [exclude]
+    max_file_size = parse_size(ssh_cfg.get('max_file_size'))
+    if not include and not exclude and max_file_size is None:
+        return None
+    return {
+        'include': [str(p) for p in include],
+        'exclude': [str(p) for p in exclude],
+        'max_file_size': max_file_size,
+    }
+
+
+def _match_transfer_rule(rel_path, size, transfer_filter, is_dir=False):
+    """
+    Проверяет файл (или каталог) отчёта по правилам выборочной загрузки.
+
     Args:
-        cfg (dict): Конфигурационный словарь с параметрами SSH
-        main_folder_path (str): Путь к основной папке для сохранения отчета
-        
+        rel_path (str): Путь относительно корня отчёта (через '/')
+        size (int): Размер файла в байтах (для каталогов игнорируется)
+        transfer_filter (dict): Правила из ``_get_transfer_filter``
+        is_dir (bool): True для каталога — проверяются только exclude-шаблоны
+
     Returns:
-        str: Путь к скачанному отчету или None, если возникла ошибка
+        str | None: Причина пропуска ('exclude', 'include', 'size') или None, если путь нужно скачать
+    """
+    for pattern in transfer_filter['exclude']:
+        if fnmatch.fnmatch(rel_path, pattern) or fnmatch.fnmatch(rel_path, pattern.rstrip('/') + '/*'):
+            return 'exclude'
+    if is_dir:
+        return None
+    include = transfer_filter['include']
+    if include and not any(fnmatch.fnmatch(rel_path, pattern) for pattern in include):
+        return 'include'
+    max_file_size = transfer_filter['max_file_size']
+    if max_file_size is not None and size > max_file_size:
+        return 'size'
+    return None
+
+
+def _selective_download(ssh, remote_path, local_report_path, transfer_filter):
+    """
+    Скачивает отчёт по SFTP, применяя include/exclude шаблоны и ограничение размера файла.
+
+    Args:
+        ssh (paramiko.SSHClient): Открытое SSH-соединение
+        remote_path (str): Путь к отчёту на сервере
+        local_report_path (str): Локальный путь для сохранения отчёта
+        transfer_filter (dict): Правила из ``_get_transfer_filter``
+
+    Returns:
+        dict: Сводка загрузки: copied, copied_bytes, skipped (список (путь, причина, размер))
     """
-    ssh = None
+    summary = {'copied': 0, 'copied_bytes': 0, 'skipped': []}
+    sftp = ssh.open_sftp()
     try:
-        # Создаем базовую директорию для отчетов Gatling
-        local_path = os.path.join(main_folder_path, "gatling")
-        os.makedirs(local_path, exist_ok=True)
-        logging.info(f"Создана базовая директория: {local_path}")
-        
-        # Устанавливаем SSH-соединение (ключ или пароль, порт по умолчанию 22)
-        ssh = paramiko.SSHClient()
-        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        with span("ssh.sftp_download", cat="ssh", remote_path=remote_path) as span_args:
+            _sftp_copy_tree(sftp, remote_path, local_report_path, transfer_filter, summary)
+            span_args.update(files=summary['copied'], bytes=summary['copied_bytes'], skipped=len(summary['skipped']))
+    finally:
+        sftp.close()
+    return summary
 
-        host = cfg['ssh_config'].get('host')
-        username = cfg['ssh_config'].get('username')
-        password = cfg['ssh_config'].get('password')
 
-        # Валидация обязательных полей
-        if not host or str(host).strip() in {"", "${SSH_HOST}"}:
-            logging.error("SSH_HOST не задан. Укажите SSH_HOST в .env или config.yml")
-            return None
-        if not username or str(username).strip() in {"", "${SSH_USERNAME}"}:
-            logging.error("SSH_USERNAME не задан. Укажите SSH_USERNAME в .env или config.yml")
-            return None
-        port = int(cfg['ssh_config'].get('port', 22) or 22)
-        key_path_str = cfg['ssh_config'].get('key_path')
+def _sftp_copy_tree(sftp, remote_path, local_report_path, transfer_filter, summary):
+    """Обходит каталог отчета по SFTP и копирует подходящие файлы, дополняя ``summary``."""
+    pending = ['']
+    while pending:
+        rel_dir = pending.pop()
+        remote_dir = f"{remote_path}/{rel_dir}" if rel_dir else remote_path
+        for entry in sftp.listdir_attr(remote_dir):
+            rel_path = f"{rel_dir}/{entry.filename}" if rel_dir else entry.filename
+            size = entry.st_size or 0
+            if stat.S_ISDIR(entry.st_mode or 0):
+                if _match_transfer_rule(rel_path, size, transfer_filter, is_dir=True):
+                    summary['skipped'].append((rel_path + '/', 'exclude', 0))
+                else:
+                    pending.append(rel_path)
+                continue
 
-        pkey = None
-        if key_path_str:
-            expanded_key_path = os.path.expanduser(str(key_path_str))
-            if os.path.exists(expanded_key_path):
+            reason = _match_transfer_rule(rel_path, size, transfer_filter)
+            if reason:
+                summary['skipped'].append((rel_path, reason, size))
+                continue
+
+            local_file = os.path.join(local_report_path, *rel_path.split('/'))
+            os.makedirs(os.path.dirname(local_file), exist_ok=True)
+            sftp.get(f"{remote_path}/{rel_path}", local_file)
+            summary['copied'] += 1
+            summary['copied_bytes'] += size
+
+
+def _log_transfer_summary(summary):
+    """Логирует сводку выборочной загрузки: что скачано и что пропущено."""
+    logging.info(
+        f"Скачано файлов: {summary['copied']} ({summary['copied_bytes'] / 1024:.1f} KB)"
+    )
+    skipped = summary['skipped']
+    if not skipped:
+        return
+    by_reason = {}
+    for _, reason, size in skipped:
+        count, total = by_reason.get(reason, (0, 0))
+        by_reason[reason] = (count + 1, total + size)
+    skipped_bytes = sum(size for _, _, size in skipped)
+    logging.info(f"Пропущено: {len(skipped)} ({skipped_bytes / 1024 / 1024:.1f} MB)")
+    for reason, (count, total) in sorted(by_reason.items()):
+        logging.info(f"  {reason}: {count} ({total / 1024:.1f} KB)")
+    for rel_path, reason, size in sorted(skipped, key=lambda item: item[2], reverse=True)[:5]:
+        if size:
+            logging.info(f"  крупнейший пропущенный: {rel_path} ({size / 1024:.1f} KB, {reason})")
+
+
+def _delete_remote_report(ssh, remote_path):
+    """Удаляет отчёт с сервера после успешного скачивания."""
+    with span("ssh.delete_remote", cat="ssh"):
+        stdin, stdout, stderr = ssh.exec_command(f"rm -rf {remote_path}")
+        exit_status = stderr.channel.recv_exit_status()
+    if exit_status == 0:
+        logging.info(f"Отчет удален с сервера: {remote_path}")
+    else:
+        error = stderr.read().decode()
+        logging.warning(f"Не удалось удалить отчет с сервера: {error}")
+
+
+def connect_ssh(cfg):
+    """
+    Устанавливает SSH-соединение по параметрам ``ssh_config`` (ключ или пароль, порт по умолчанию 22).
+
+    Args:
+        cfg (dict): Конфигурационный словарь с параметрами SSH
+
+    Returns:
+        paramiko.SSHClient | None: Открытое соединение или None, если не заданы обязательные поля
+
+    Raises:
+        Exception: Ошибки подключения/аутентификации paramiko
+    """
+    host = cfg['ssh_config'].get('host')
+    username = cfg['ssh_config'].get('username')
+    password = cfg['ssh_config'].get('password')
+
+    # Валидация обязательных полей
+    if not host or str(host).strip() in {"", "${SSH_HOST}"}:
+        logging.error("SSH_HOST не задан. Укажите SSH_HOST в .env или config.yml")
+        return None
+    if not username or str(username).strip() in {"", "${SSH_USERNAME}"}:
+        logging.error("SSH_USERNAME не задан. Укажите SSH_USERNAME в .env или config.yml")
+        return None
+    port = int(cfg['ssh_config'].get('port', 22) or 22)
+    key_path_str = cfg['ssh_config'].get('key_path')
+
+    pkey = None
+    if key_path_str:
+        expanded_key_path = os.path.expanduser(str(key_path_str))
+        if os.path.exists(expanded_key_path):
+            try:
+                pkey = paramiko.RSAKey.from_private_key_file(expanded_key_path)
+            except Exception:
+                # Попробуем Ed25519/EC ключи
                 try:
-                    pkey = paramiko.RSAKey.from_private_key_file(expanded_key_path)
+                    pkey = paramiko.Ed25519Key.from_private_key_file(expanded_key_path)
                 except Exception:
-                    # Попробуем Ed25519/EC ключи
-                    try:
-                        pkey = paramiko.Ed25519Key.from_private_key_file(expanded_key_path)
-                    except Exception:
-                        pkey = None
+                    pkey = None
 
+    ssh = paramiko.SSHClient()
+    ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+    with span("ssh.connect", cat="ssh", host=host):
         ssh.connect(
             hostname=host,
             port=port,
@@ -63,19 +213,110 @@ def ssh_download_last_report(cfg, main_folder_path):
             look_for_keys=False,
             allow_agent=False,
         )
-        
-        # Получаем имя последнего отчета из файла lastRun.txt
+    return ssh
+
+
+def is_ssh_alive(ssh):
+    """Проверяет, что SSH-соединение открыто и пригодно для новых каналов."""
+    transport = ssh.get_transport() if ssh else None
+    return bool(transport and transport.is_active())
+
+
+def read_last_run(ssh, cfg):
+    """
+    Читает имя последнего отчета из файла lastRun.txt.
+
+    Returns:
+        str | None: Имя каталога отчета или None, если файл пуст или не читается
+    """
+    with span("ssh.read_last_run", cat="ssh"):
         stdin, stdout, stderr = ssh.exec_command(f"cat {cfg['ssh_config']['remote_path']}/lastRun.txt")
         report_name = stdout.read().decode().strip()
         error = stderr.read().decode()
+
+    if error:
+        logging.error(f"Ошибка при чтении lastRun.txt: {error}")
+        return None
+
+    if not report_name:
+        logging.warning("Имя отчета не найдено в lastRun.txt")
+        return None
+    return report_name
+
+
+def parse_report_start(report_name, tz_name='UTC'):
+    """
+    Извлекает время старта прогона из имени каталога отчета Gatling.
+
+    Gatling именует каталог как ``<simulation>-<yyyyMMddHHmmssSSS>``.
+
+    Args:
+        report_name (str): Имя каталога отчета
+        tz_name (str): Часовой пояс, в котором записана метка времени
+
+    Returns:
+        float | None: Время старта (Unix epoch, секунды) или None, если метки нет
+    """
+    match = _REPORT_TIMESTAMP.search(report_name)
+    if not match:
+        return None
+    started = datetime.strptime(match.group(1), "%Y%m%d%H%M%S%f")
+    return pytz.timezone(tz_name).localize(started).timestamp()
+
+
+def get_report_window(ssh, cfg, report_name):
+    """
+    Определяет временное окно завершённого прогона.
+
+    Начало берётся из метки времени в имени каталога отчета (часовой пояс — ``watch.report_timezone``),
+    конец — время изменения lastRun.txt, который Gatling записывает после генерации отчета.
+    Если метки в имени нет, начало = конец - ``watch.default_duration`` (секунды).
+
+    Returns:
+        tuple: (start, end) в секундах Unix epoch
+    """
+    watch_cfg = cfg.get('watch') or {}
+    stdin, stdout, stderr = ssh.exec_command(f"stat -c %Y {cfg['ssh_config']['remote_path']}/lastRun.txt")
+    output = stdout.read().decode().strip()
+    end = float(output) if output.isdigit() else time.time()
+
+    start = parse_report_start(report_name, watch_cfg.get('report_timezone', 'UTC'))
+    if start is None or start >= end:
+        start = end - float(watch_cfg.get('default_duration', 3600))
+    return start, end
+
+
+def ssh_download_last_report(cfg, main_folder_path, report_name=None, ssh=None):
+    """
+    Функция для скачивания последнего отчета Gatling с сервера.
+    
+    Args:
+        cfg (dict): Конфигурационный словарь с параметрами SSH
+        main_folder_path (str): Путь к основной папке для сохранения отчета
+        report_name (str, optional): Имя каталога отчета; по умолчанию берётся из lastRun.txt
+        ssh (paramiko.SSHClient, optional): Уже открытое соединение. Оно не закрывается,
+            а отчет целиком копируется по SFTP в этом же соединении (без нового рукопожатия scp)
         
-        if error:
-            logging.error(f"Ошибка при чтении lastRun.txt: {error}")
-            return None
-            
+    Returns:
+        str: Путь к скачанному отчету или None, если возникла ошибка
+    """
+    own_connection = ssh is None
+    try:
+        # Создаем базовую директорию для отчетов Gatling
+        local_path = os.path.join(main_folder_path, "gatling")
+        os.makedirs(local_path, exist_ok=True)
+        logging.info(f"Создана базовая директория: {local_path}")
+        
+        if own_connection:
+            ssh = connect_ssh(cfg)
+            if ssh is None:
+                return None
+        
+        # Получаем имя последнего отчета из файла lastRun.txt (если не задано явно)
         if not report_name:
-            logging.warning("Имя отчета не найдено в lastRun.txt")
-            return None
+            report_name = read_last_run(ssh, cfg)
+            if not report_name:
+                return None
             
         # Формируем пути для удаленного и локального отчета
         remote_path = os.path.join(cfg['ssh_config']['remote_path'], report_name)
@@ -97,6 +338,36 @@ def ssh_download_last_report(cfg, main_folder_path):
                 os.remove(local_report_path)
             logging.info(f"Удалена существующая директория/файл отчета: {local_report_path}")
             
+        transfer_filter = _get_transfer_filter(cfg['ssh_config'])
+        if transfer_filter:
+            # Выборочная загрузка по SFTP через уже открытое соединение
+            logging.info(
+                f"Выборочная загрузка отчёта: include={transfer_filter['include']}, "
+                f"exclude={transfer_filter['exclude']}, max_file_size={transfer_filter['max_file_size']}"
+            )
+            summary = _selective_download(ssh, remote_path, local_report_path, transfer_filter)
+            _log_transfer_summary(summary)
+            logging.info(f"Отчет успешно скачан: {local_report_path}")
+
+            # При частичной загрузке отчёт удаляется с сервера только по явному delete_remote: true
+            if cfg['ssh_config'].get('delete_remote', False):
+                _delete_remote_report(ssh, remote_path)
+            return local_report_path
+
+        if not own_connection:
+            # Соединение уже прогрето — копируем отчет целиком по SFTP без запуска scp
+            summary = _selective_download(ssh, remote_path, local_report_path, _COPY_ALL)
+            _log_transfer_summary(summary)
+            logging.info(f"Отчет успешно скачан: {local_report_path}")
+            if cfg['ssh_config'].get('delete_remote', True):
+                _delete_remote_report(ssh, remote_path)
+            return local_report_path
+
+        host = cfg['ssh_config'].get('host')
+        username = cfg['ssh_config'].get('username')
+        port = int(cfg['ssh_config'].get('port', 22) or 22)
+        key_path_str = cfg['ssh_config'].get('key_path')
+
         # Формируем команду SCP для копирования всей директории
         scp_parts = [
             'scp',
@@ -115,18 +386,15 @@ def ssh_download_last_report(cfg, main_folder_path):
         logging.info(f"Выполняем команду: {scp_command}")
         
         # Выполняем команду через shell
-        result = subprocess.run(scp_command, shell=True, capture_output=True, text=True)
+        with span("ssh.scp", cat="ssh", remote_path=remote_path):
+            result = subprocess.run(scp_command, shell=True, capture_output=True, text=True)
         
         if result.returncode == 0:
             logging.info(f"Отчет успешно скачан: {local_report_path}")
             
             # Удаляем отчет с сервера после успешного скачивания
-            stdin, stdout, stderr = ssh.exec_command(f"rm -rf {remote_path}")
-            if stderr.channel.recv_exit_status() == 0:
-                logging.info(f"Отчет удален с сервера: {remote_path}")
-            else:
-                error = stderr.read().decode()
-                logging.warning(f"Не удалось удалить отчет с сервера: {error}")
+            if cfg['ssh_config'].get('delete_remote', True):
+                _delete_remote_report(ssh, remote_path)
                 
             return local_report_path
         else:
@@ -138,5 +406,5 @@ def ssh_download_last_report(cfg, main_folder_path):
         logging.error(f"Тип ошибки: {type(e).__name__}")
         return None
     finally:
-        if ssh:
-            ssh.close() 
+        if own_connection and ssh:
+            ssh.close()
@@ -0,0 +1,210 @@
+import os
+import csv
+import json
+import time
+import logging
+import threading
+from dataclasses import dataclass, asdict, fields
+from typing import Any, List, Optional
+
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+# Время установки соединений (TCP + TLS) в текущем потоке
+_connect_state = threading.local()
+
+
+def reset_connect_timing():
+    """Обнуляет счётчики соединений текущего потока перед запросом."""
+    _connect_state.seconds = 0.0
+    _connect_state.count = 0
+
+
+def get_connect_timing():
+    """Возвращает (секунды на connect/TLS, число новых соединений) для текущего потока."""
+    return getattr(_connect_state, 'seconds', 0.0), getattr(_connect_state, 'count', 0)
+
+
+def _record_connect(started):
+    _connect_state.seconds = getattr(_connect_state, 'seconds', 0.0) + time.perf_counter() - started
+    _connect_state.count = getattr(_connect_state, 'count', 0) + 1
+
+
+class _TimedHTTPConnection(HTTPConnection):
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            super().connect()
+        finally:
+            _record_connect(started)
+
+
+class _TimedHTTPSConnection(HTTPSConnection):
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            super().connect()
+        finally:
+            _record_connect(started)
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter, соединения которого замеряют время TCP connect + TLS handshake."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _TimedHTTPConnectionPool,
+            'https': _TimedHTTPSConnectionPool,
+        }
+
+
+@dataclass
+class RenderTiming:
+    """Тайминги одного запроса рендера (секунды) и его итог."""
+    queue_wait: float = 0.0       # Ожидание в очереди планировщика (включая слот хоста)
+    connect: float = 0.0          # Установка новых соединений: TCP + TLS
+    new_connections: int = 0      # Сколько соединений открыто (0 — соединение из пула)
+    ttfb: float = 0.0             # До первого байта ответа (включая connect)
+    transfer: float = 0.0         # Получение тела ответа
+    total: float = 0.0            # Полное время запроса
+    bytes: int = 0                # Размер тела ответа
+    retries: int = 0              # Повторы на уровне HTTP
+    status: Optional[int] = None  # Итоговый HTTP-статус
+    empty: bool = False           # Проба показала, что данных нет: вместо рендера записана заглушка
+
+
+# Колонки машиночитаемого отчета
+REPORT_FIELDS = ['run', 'source', 'service', 'metric', 'host', 'dashboard_uid', 'panel_id', 'ok', 'deduplicated',
+                 'error'] + [f.name for f in fields(RenderTiming)]
+
+
+def timing_record(result) -> dict:
+    """Преобразует JobResult в плоскую запись отчета о таймингах."""
+    job = result.job
+    record = {
+        'run': job.run,
+        'source': job.source,
+        'service': job.group,
+        'metric': job.name,
+        'host': job.host,
+        'dashboard_uid': job.dashboard_uid,
+        'panel_id': job.panel_id,
+        'ok': result.ok,
+        'deduplicated': result.deduplicated,
+        'error': result.error,
+    }
+    for name, value in asdict(result.timing or RenderTiming()).items():
+        record[name] = round(value, 4) if isinstance(value, float) else value
+    return record
+
+
+def _prom_labels(**labels: Any) -> str:
+    parts = []
+    for key, value in labels.items():
+        text = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', ' ')
+        parts.append(f'{key}="{text}"')
+    return '{' + ','.join(parts) + '}'
+
+
+def format_prometheus(records: List[dict]) -> str:
+    """
+    Формирует textfile для node_exporter: суммы и счётчики по (host, dashboard_uid, panel_id, service).
+
+    Returns:
+        str: Содержимое .prom файла
+    """
+    series = {}
+    for record in records:
+        if record['deduplicated']:
+            continue
+        key = (record['host'], record['dashboard_uid'], record['panel_id'], record['service'])
+        item = series.setdefault(key, {'count': 0, 'failed': 0, 'total': 0.0, 'ttfb': 0.0, 'queue_wait': 0.0,
+                                       'connect': 0.0, 'bytes': 0, 'retries': 0})
+        item['count'] += 1
+        item['failed'] += 0 if record['ok'] else 1
+        for name in ('total', 'ttfb', 'queue_wait', 'connect', 'bytes', 'retries'):
+            item[name] += record[name]
+
+    metrics = [
+        ('grafana_render_requests_total', 'counter', 'Число запросов рендера', 'count'),
+        ('grafana_render_failures_total', 'counter', 'Число неуспешных рендеров', 'failed'),
+        ('grafana_render_duration_seconds_sum', 'counter', 'Суммарное время рендера', 'total'),
+        ('grafana_render_ttfb_seconds_sum', 'counter', 'Суммарное время до первого байта', 'ttfb'),
+        ('grafana_render_queue_wait_seconds_sum', 'counter', 'Суммарное ожидание в очереди', 'queue_wait'),
+        ('grafana_render_connect_seconds_sum', 'counter', 'Суммарное время connect/TLS', 'connect'),
+        ('grafana_render_bytes_total', 'counter', 'Получено байт', 'bytes'),
+        ('grafana_render_retries_total', 'counter', 'Число повторов HTTP', 'retries'),
+    ]
+    lines = []
+    for metric_name, metric_type, help_text, field_name in metrics:
+        lines.append(f"# HELP {metric_name} {help_text}")
+        lines.append(f"# TYPE {metric_name} {metric_type}")
+        for (host, dashboard_uid, panel_id, service), item in sorted(series.items(), key=lambda kv: str(kv[0])):
+            labels = _prom_labels(host=host, dashboard_uid=dashboard_uid, panel_id=panel_id, service=service)
+            value = item[field_name]
+            lines.append(f"{metric_name}{labels} {round(value, 4) if isinstance(value, float) else value}")
+    return '\n'.join(lines) + '\n'
+
+
+def write_timing_report(results, folder) -> Optional[str]:
+    """
+    Сохраняет отчет о таймингах рендеров запуска: render_timings.json, .csv и .prom.
+
+    Args:
+        results (list): JobResult одного запуска
+        folder (str): Основная папка запуска
+
+    Returns:
+        str | None: Путь к JSON-отчету или None, если результатов нет
+    """
+    if not results:
+        return None
+    records = [timing_record(result) for result in results]
+    os.makedirs(folder, exist_ok=True)
+
+    json_path = os.path.join(folder, 'render_timings.json')
+    with open(json_path, 'w', encoding='utf-8') as f:
+        json.dump(records, f, ensure_ascii=False, indent=2)
+
+    with open(os.path.join(folder, 'render_timings.csv'), 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=REPORT_FIELDS)
+        writer.writeheader()
+        writer.writerows(records)
+
+    with open(os.path.join(folder, 'render_timings.prom'), 'w', encoding='utf-8') as f:
+        f.write(format_prometheus(records))
+
+    log_timing_summary(records)
+    return json_path
+
+
+def log_timing_summary(records: List[dict], top: int = 5) -> None:
+    """Логирует дашборды и панели, на которые пришлась основная часть времени рендера."""
+    rendered = [record for record in records if not record['deduplicated']]
+    if not rendered:
+        return
+    by_dashboard = {}
+    for record in rendered:
+        key = (record['host'], record['dashboard_uid'])
+        by_dashboard[key] = by_dashboard.get(key, 0.0) + record['total']
+    total = sum(by_dashboard.values()) or 1.0
+    connections = sum(record['new_connections'] for record in rendered)
+
+    logging.info(f"⏱️  Время рендера: {total:.1f} с по {len(rendered)} запросам, новых соединений: {connections}")
+    for (host, dashboard_uid), seconds in sorted(by_dashboard.items(), key=lambda kv: kv[1], reverse=True)[:top]:
+        logging.info(f"  {host}/{dashboard_uid}: {seconds:.1f} с ({seconds / total * 100:.0f}%)")
+    for record in sorted(rendered, key=lambda r: r['total'], reverse=True)[:top]:
+        logging.info(
+            f"  панель {record['dashboard_uid']}#{record['panel_id']} ({record['service']}/{record['metric']}): "
+            f"{record['total']:.2f} с, TTFB {record['ttfb']:.2f} с, {record['bytes']} байт"
+        )
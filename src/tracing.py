@@ -0,0 +1,90 @@
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+from typing import Dict, List
+
+
+class Tracer:
+    """
+    Сборщик спанов в формате Chrome trace (chrome://tracing, ui.perfetto.dev).
+
+    Каждый спан — событие ``ph: "X"`` с временем начала и длительностью в микросекундах
+    на потоке, где он выполнялся, поэтому на таймлайне видны параллельные стадии
+    и рендеры, а также критический путь запуска.
+    """
+
+    def __init__(self):
+        self._events: List[dict] = []
+        self._threads: Dict[int, str] = {}
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+        self._pid = os.getpid()
+        self.enabled = True
+
+    def _now_us(self) -> float:
+        return (time.perf_counter() - self._origin) * 1_000_000
+
+    @contextmanager
+    def span(self, name: str, cat: str = 'stage', **args):
+        """
+        Записывает спан вокруг блока кода.
+
+        Args:
+            name (str): Имя спана
+            cat (str): Категория (например, stage, ssh, render)
+            **args: Атрибуты спана; блок может дополнить их через возвращаемый словарь
+        """
+        if not self.enabled:
+            yield args
+            return
+        thread = threading.current_thread()
+        start = self._now_us()
+        try:
+            yield args
+        finally:
+            event = {
+                'name': name,
+                'cat': cat,
+                'ph': 'X',
+                'ts': round(start, 1),
+                'dur': round(self._now_us() - start, 1),
+                'pid': self._pid,
+                'tid': thread.ident,
+                'args': {key: value if isinstance(value, (int, float, bool)) or value is None else str(value)
+                         for key, value in args.items()},
+            }
+            with self._lock:
+                self._events.append(event)
+                self._threads.setdefault(thread.ident, thread.name)
+
+    def events(self) -> List[dict]:
+        """Возвращает события с метаданными имён потоков."""
+        with self._lock:
+            metadata = [
+                {'name': 'thread_name', 'ph': 'M', 'pid': self._pid, 'tid': tid, 'args': {'name': name}}
+                for tid, name in self._threads.items()
+            ]
+            return metadata + sorted(self._events, key=lambda event: event['ts'])
+
+    def write(self, path: str) -> str:
+        """Сохраняет трассу в JSON-файл Chrome trace."""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'traceEvents': self.events(), 'displayTimeUnit': 'ms'}, f, ensure_ascii=False)
+        return path
+
+    def clear(self) -> None:
+        """Удаляет накопленные события (например, между прогонами режима наблюдения)."""
+        with self._lock:
+            self._events.clear()
+
+
+# Общий трассировщик процесса
+tracer = Tracer()
+
+
+def span(name: str, cat: str = 'stage', **args):
+    """Спан в общем трассировщике: ``with span('ssh.connect', cat='ssh'): ...``"""
+    return tracer.span(name, cat, **args)
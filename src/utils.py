@@ -1,19 +1,144 @@
 import os
+import queue
+import atexit
 import logging
+import threading
+import time
 from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
 import pytz
 
-# Настройка логирования с выводом в файл и консоль
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('app.log'),  # Логирование в файл
-        logging.StreamHandler()          # Логирование в консоль
-    ]
-)
 logger = logging.getLogger(__name__)
 
+# Логгер построчных сообщений о панелях (ограничивается по частоте)
+PANEL_LOGGER = 'panels'
+
+_LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+_DEFAULT_LOGGING = {
+    'level': 'INFO',          # Уровень вывода в консоль
+    'file': 'app.log',        # Файл лога (пусто — без файла)
+    'file_level': 'INFO',     # Уровень записи в файл
+    'panel_interval': 1.0,    # Не чаще одной INFO-записи о панелях за интервал, с (0 — без ограничения)
+    'loggers': {},            # Уровни отдельных логгеров, например {urllib3: WARNING}
+}
+_listener = None
+
+LOG_LEVELS = ('DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL')
+
+
+def parse_log_level(value, option='logging.level') -> int:
+    """
+    Числовой уровень логирования по имени (регистр не важен) или числу.
+
+    Raises:
+        ValueError: Если уровень неизвестен (с указанием опции конфига)
+    """
+    if isinstance(value, int):
+        return value
+    name = str(value).strip().upper()
+    if name not in LOG_LEVELS:
+        raise ValueError(f"Неизвестный уровень логирования '{value}' в {option}: ожидается один из {', '.join(LOG_LEVELS)}")
+    return getattr(logging, name)
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Пропускает не более одной записи ниже WARNING за ``interval`` секунд.
+
+    Подавленные записи отбрасываются до форматирования; их число дописывается
+    к следующей пропущенной записи. Предупреждения и ошибки проходят всегда.
+    """
+
+    def __init__(self, interval):
+        super().__init__()
+        self.interval = float(interval)
+        self._last = 0.0
+        self._suppressed = 0
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or self.interval <= 0:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last < self.interval:
+                self._suppressed += 1
+                return False
+            self._last = now
+            suppressed, self._suppressed = self._suppressed, 0
+        if suppressed:
+            record.msg = f"{record.msg} (+{suppressed} похожих сообщений пропущено)"
+        return True
+
+
+class _DeferredQueueHandler(QueueHandler):
+    """QueueHandler без форматирования в потоке-источнике: сообщение собирается в потоке слушателя."""
+
+    def prepare(self, record):
+        return record
+
+
+def setup_logging(log_cfg=None, level=None):
+    """
+    Настраивает неблокирующее логирование: записи кладутся в очередь, а консоль
+    и файл обслуживает отдельный поток QueueListener. Повторный вызов перенастраивает
+    логирование (например, после загрузки секции ``logging`` из config.yml).
+
+    Args:
+        log_cfg (dict, optional): Секция ``logging`` конфига (level, file, file_level, panel_interval, loggers)
+        level (str, optional): Уровень консоли, переопределяющий ``log_cfg['level']`` (флаг --log-level)
+
+    Returns:
+        QueueListener: Запущенный слушатель очереди
+    """
+    global _listener
+    settings = {**_DEFAULT_LOGGING, **(log_cfg or {})}
+    console_level = parse_log_level(level, '--log-level') if level else parse_log_level(settings['level'])
+    file_level = parse_log_level(settings['file_level'], 'logging.file_level')
+
+    formatter = logging.Formatter(_LOG_FORMAT)
+    handlers = []
+    console = logging.StreamHandler()
+    console.setLevel(console_level)
+    handlers.append(console)
+    if settings['file']:
+        file_handler = logging.FileHandler(settings['file'])
+        file_handler.setLevel(file_level)
+        handlers.append(file_handler)
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    stop_logging()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    # Очередь без ограничения размера: запись лога никогда не блокирует рабочие потоки
+    root.addHandler(_DeferredQueueHandler(queue.SimpleQueue()))
+    root.setLevel(min(console_level, file_level) if settings['file'] else console_level)
+    _listener = QueueListener(root.handlers[0].queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+    for name, logger_level in (settings['loggers'] or {}).items():
+        logging.getLogger(name).setLevel(parse_log_level(logger_level, f'logging.loggers.{name}'))
+    panel_logger = logging.getLogger(PANEL_LOGGER)
+    for old_filter in [f for f in panel_logger.filters if isinstance(f, RateLimitFilter)]:
+        panel_logger.removeFilter(old_filter)
+    panel_logger.addFilter(RateLimitFilter(settings['panel_interval']))
+    return _listener
+
+
+def stop_logging():
+    """Останавливает слушатель очереди, дописав накопленные записи."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+atexit.register(stop_logging)
+
 def create_folder_if_not_exists(path):
     """
     Создает директорию, если она не существует.
@@ -113,6 +238,43 @@ def to_utc_epoch_ms(dt_str, tz_str):
     utc_dt = local_dt.astimezone(pytz.UTC)
     return int(utc_dt.timestamp() * 1000)
 
+_SIZE_UNITS = {
+    'B': 1,
+    'KB': 1024,
+    'MB': 1024 ** 2,
+    'GB': 1024 ** 3,
+}
+
+def parse_size(value):
+    """
+    Преобразует размер из конфига в количество байт.
+
+    Args:
+        value (int | str | None): Число байт или строка вида "512KB", "5MB", "1.5GB"
+
+    Returns:
+        int | None: Размер в байтах или None, если значение не задано
+
+    Raises:
+        ValueError: Если строку не удалось разобрать
+    """
+    if value is None or value == '':
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    text = str(value).strip().upper().replace(' ', '')
+    for unit in ('GB', 'MB', 'KB', 'B'):
+        if text.endswith(unit):
+            number = text[:-len(unit)]
+            try:
+                return int(float(number) * _SIZE_UNITS[unit])
+            except ValueError:
+                break
+    try:
+        return int(text)
+    except ValueError:
+        raise ValueError(f"Некорректный размер: {value}")
+
 def ensure_file_exists(file_path):
     """
     Проверяет существование файла.
@@ -181,3 +343,15 @@ def create_main_folder(cfg):
         os.makedirs(full_path)
         
     return full_path 
+
+def get_run_label(folder, cfg=None):
+    """
+    Метка запуска для логов и отчетов о таймингах.
+
+    Обычно это имя основной папки запуска; для окружения (секция ``environments``)
+    папка вложена в папку запуска, и метка имеет вид ``<запуск>/<окружение>``.
+    """
+    folder = os.path.normpath(folder)
+    if (cfg or {}).get('environment'):
+        return f"{os.path.basename(os.path.dirname(folder))}/{os.path.basename(folder)}"
+    return os.path.basename(folder)
@@ -0,0 +1,143 @@
+import time
+import logging
+from datetime import datetime
+
+import pytz
+
+from batch import Run, build_run_config, run_folder
+from ssh_service import connect_ssh, is_ssh_alive, read_last_run, get_report_window, parse_report_start
+
+
+def window_to_main_config(start, end, tz_name, padding=0):
+    """
+    Переводит окно прогона (Unix epoch) в поля from/to mainConfig в заданном часовом поясе.
+
+    Args:
+        start (float): Начало прогона, секунды epoch
+        end (float): Конец прогона, секунды epoch
+        tz_name (str): Часовой пояс mainConfig
+        padding (float): Запас в секундах с обеих сторон окна
+
+    Returns:
+        dict: {'from': 'YYYY-MM-DD HH:MM:SS', 'to': 'YYYY-MM-DD HH:MM:SS'}
+    """
+    tz = pytz.timezone(tz_name)
+    return {
+        'from': datetime.fromtimestamp(start - padding, tz).strftime("%Y-%m-%d %H:%M:%S"),
+        'to': datetime.fromtimestamp(end + padding, tz).strftime("%Y-%m-%d %H:%M:%S"),
+    }
+
+
+def live_run_config(cfg, report_name, now=None):
+    """
+    Конфиг запуска для live-режима по каталогу идущего прогона.
+
+    Начало окна берётся из метки времени в имени каталога с тем же запасом ``watch.padding``,
+    что и у LastRunWatcher, поэтому срезы попадают в папку, которую создаст --watch для этого
+    прогона. Если метки в имени нет, окно начинается с текущего момента.
+
+    Args:
+        cfg (dict): Конфигурационный словарь
+        report_name (str): Имя каталога прогона
+        now (float, optional): Текущий момент, секунды epoch
+
+    Returns:
+        dict: Конфиг запуска (исходный не изменяется)
+    """
+    watch_cfg = cfg.get('watch') or {}
+    end = now if now is not None else time.time()
+    start = parse_report_start(report_name, watch_cfg.get('report_timezone', 'UTC'))
+    if start is None or start >= end:
+        start = end
+    window = window_to_main_config(start, end, cfg['mainConfig']['timezone'], float(watch_cfg.get('padding', 60)))
+    return build_run_config(cfg, window)
+
+
+class LastRunWatcher:
+    """
+    Следит за lastRun.txt на сервере Gatling через одно постоянное SSH-соединение.
+
+    При появлении нового отчета вычисляет окно прогона, создает папку запуска
+    и вызывает ``on_new_run(run, ssh)``. Соединение переоткрывается только при обрыве.
+    """
+
+    def __init__(self, cfg, on_new_run, poll_interval=None, include_current=False):
+        """
+        Args:
+            cfg (dict): Конфигурационный словарь (секции ssh_config и watch)
+            on_new_run (Callable): Обработчик нового прогона ``on_new_run(run, ssh)``
+            poll_interval (float, optional): Период опроса, с (по умолчанию ``watch.poll_interval`` или 30)
+            include_current (bool): Обработать отчет, уже указанный в lastRun.txt на момент старта
+        """
+        self.cfg = cfg
+        self.on_new_run = on_new_run
+        watch_cfg = cfg.get('watch') or {}
+        self.poll_interval = float(poll_interval or watch_cfg.get('poll_interval', 30))
+        self.padding = float(watch_cfg.get('padding', 60))
+        self.include_current = include_current
+        self.ssh = None
+        self.last_seen = None
+
+    def _ensure_connection(self):
+        if not is_ssh_alive(self.ssh):
+            if self.ssh:
+                logging.warning("SSH-соединение потеряно, переподключаемся...")
+                self.ssh.close()
+            self.ssh = connect_ssh(self.cfg)
+            if self.ssh is None:
+                raise RuntimeError("Не удалось установить SSH-соединение для режима наблюдения")
+        return self.ssh
+
+    def build_run(self, report_name):
+        """Формирует запуск по отчету: окно from/to берётся из самого прогона."""
+        start, end = get_report_window(self.ssh, self.cfg, report_name)
+        window = window_to_main_config(start, end, self.cfg['mainConfig']['timezone'], self.padding)
+        run_cfg = build_run_config(self.cfg, window)
+        return Run(cfg=run_cfg, folder=run_folder(run_cfg), report=report_name)
+
+    def poll_once(self):
+        """
+        Один цикл опроса: проверяет lastRun.txt и обрабатывает новый отчет.
+
+        Returns:
+            bool: True, если был обработан новый прогон
+        """
+        ssh = self._ensure_connection()
+        report_name = read_last_run(ssh, self.cfg)
+        if not report_name or report_name == self.last_seen:
+            return False
+
+        first_poll = self.last_seen is None
+        self.last_seen = report_name
+        if first_poll and not self.include_current:
+            logging.info(f"Текущий отчет {report_name} пропущен, ожидаем следующий прогон")
+            return False
+
+        logging.info(f"Обнаружен новый прогон Gatling: {report_name}")
+        run = self.build_run(report_name)
+        logging.info(f"[{run.label}] Окно прогона: {run.cfg['mainConfig']['from']} - {run.cfg['mainConfig']['to']}")
+        self.on_new_run(run, ssh)
+        return True
+
+    def watch(self, max_runs=None):
+        """
+        Основной цикл наблюдения (до Ctrl+C или обработки ``max_runs`` прогонов).
+
+        Ошибки отдельного цикла логируются и не прерывают наблюдение.
+        """
+        logging.info(f"Режим наблюдения: опрос lastRun.txt каждые {self.poll_interval:.0f} с")
+        processed = 0
+        try:
+            while max_runs is None or processed < max_runs:
+                try:
+                    if self.poll_once():
+                        processed += 1
+                        continue
+                except Exception as e:
+                    logging.error(f"Ошибка в цикле наблюдения: {str(e)}")
+                time.sleep(self.poll_interval)
+        except KeyboardInterrupt:
+            logging.info("Наблюдение остановлено пользователем")
+        finally:
+            if self.ssh:
+                self.ssh.close()
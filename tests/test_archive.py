@@ -0,0 +1,86 @@
+import os
+import sys
+import tarfile
+import zipfile
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.archive import RunArchives, archive_settings, read_member
+from src.batch import Run, run_folder
+
+
+def _cfg(tmp_path, fmt):
+    return {
+        'main_folder': str(tmp_path / 'reports'),
+        'mainConfig': {'from': '2025-07-21 10:00:00', 'scenario': 'getById', 'type_of_script': '35rps'},
+        'archive': {'enabled': True, 'format': fmt, 'staging_dir': str(tmp_path / 'staging')},
+    }
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+@pytest.mark.parametrize('fmt', ['zip', 'tar', 'tar.zst'])
+def test_run_archive_streams_files_and_indexes_them(tmp_path, fmt):
+    if fmt == 'tar.zst':
+        pytest.importorskip('zstandard')
+    cfg = _cfg(tmp_path, fmt)
+    folder = run_folder(cfg)
+    assert folder.startswith(str(tmp_path / 'staging'))
+
+    archives = RunArchives([Run(cfg=cfg, folder=folder)], archive_settings(cfg))
+    panel = os.path.join(folder, 'stress', 'metrics', 'svc', 'cpu.png')
+    _write(panel, b'\x89PNG' + b'1' * 1000)
+    archives.add(panel)
+    _write(os.path.join(folder, 'render_timings.json'), b'{}')
+    path, = archives.close()
+
+    assert path == os.path.join(str(tmp_path / 'reports'), f'2025-07-21 10:00:00 getById 35rps.{fmt}')
+    assert not os.path.exists(folder)
+    assert read_member(path, 'stress/metrics/svc/cpu.png') == b'\x89PNG' + b'1' * 1000
+    assert read_member(path, 'render_timings.json') == b'{}'
+    if fmt == 'zip':
+        assert zipfile.ZipFile(path).getinfo('stress/metrics/svc/cpu.png').compress_type == zipfile.ZIP_STORED
+    elif fmt == 'tar':
+        assert sorted(tarfile.open(path).getnames()) == ['render_timings.json', 'stress/metrics/svc/cpu.png']
+
+
+@pytest.mark.parametrize('fmt', ['zip', 'tar', 'tar.zst'])
+def test_second_run_appends_to_existing_archive(tmp_path, fmt):
+    if fmt == 'tar.zst':
+        pytest.importorskip('zstandard')
+    cfg = _cfg(tmp_path, fmt)
+
+    def collect(files):
+        folder = run_folder(cfg)
+        archives = RunArchives([Run(cfg=cfg, folder=folder)], archive_settings(cfg))
+        for name, data in files.items():
+            _write(os.path.join(folder, name), data)
+        path, = archives.close()
+        return path
+
+    # -gatling, затем -grafana за то же окно: отчет Gatling остаётся в архиве
+    collect({'gatling/index.html': b'<html>', 'render_timings.json': b'{}'})
+    path = collect({'metrics/svc/cpu.png': b'png', 'render_timings.json': b'{"panels": 1}'})
+
+    assert read_member(path, 'gatling/index.html') == b'<html>'
+    assert read_member(path, 'metrics/svc/cpu.png') == b'png'
+    assert read_member(path, 'render_timings.json') == b'{"panels": 1}'
+    if fmt == 'tar':
+        with tarfile.open(path) as archive:
+            assert archive.extractfile('render_timings.json').read() == b'{"panels": 1}'
+
+
+def test_archive_without_index_is_not_overwritten(tmp_path):
+    cfg = _cfg(tmp_path, 'zip')
+    os.makedirs(cfg['main_folder'])
+    path = os.path.join(cfg['main_folder'], '2025-07-21 10:00:00 getById 35rps.zip')
+    _write(path, b'old')
+    with pytest.raises(FileExistsError):
+        RunArchives([Run(cfg=cfg, folder=run_folder(cfg))], archive_settings(cfg))
+    assert open(path, 'rb').read() == b'old'
@@ -0,0 +1,59 @@
+import os
+import sys
+import urllib.parse
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.batch import Run, build_run_config, expand_environments, parse_run_spec
+
+
+def test_parse_run_spec():
+    run = parse_run_spec("2025-12-09 13:00:00|2025-12-09 14:00:00|getById|35rps")
+    assert run == {
+        'from': '2025-12-09 13:00:00',
+        'to': '2025-12-09 14:00:00',
+        'scenario': 'getById',
+        'type_of_script': '35rps',
+    }
+
+
+def test_build_run_config_keeps_base_config():
+    cfg = {'mainConfig': {'timezone': 'UTC', 'scenario': 's', 'from': 'a', 'to': 'b'}, 'services': {'x': True}}
+    run_cfg = build_run_config(cfg, {'from': 'c', 'to': 'd', 'report': 'r', 'services': {'y': True}})
+    assert run_cfg['mainConfig'] == {'timezone': 'UTC', 'scenario': 's', 'from': 'c', 'to': 'd'}
+    assert run_cfg['services'] == {'x': True, 'y': True}
+    assert 'report' not in run_cfg
+    assert cfg['mainConfig']['from'] == 'a'
+
+
+def test_expand_environments(tmp_path):
+    from src.config_loader import Metric
+    from src.grafana_service import plan_service_jobs
+
+    cfg = {
+        'mainConfig': {'timezone': 'UTC', 'from': '2025-07-21 10:00:00', 'to': '2025-07-21 11:00:00'},
+        'services': {'grafana_service': True, 'gatling_metrics_service': True},
+        'grafana': {'base_url': 'http://g', 'api_key': 'k'},
+        'environments': [
+            {'name': 'stress', 'namespace': 'astra-stress'},
+            {'name': 'preprod', 'namespace': 'astra-preprod', 'grafana_url': 'http://pre', 'api_key': 'p',
+             'vars': {'cluster': 'pre'}, 'services': {'svc-b': False}},
+        ],
+    }
+    folder = str(tmp_path / 'run')
+    runs = expand_environments([Run(cfg=cfg, folder=folder)])
+
+    # Gatling метрики — один раз в папке запуска, сервисы — по окружениям
+    assert [run.label for run in runs] == ['run', 'run/stress', 'run/preprod']
+    assert runs[0].cfg['services']['grafana_service'] is False and 'environments' not in runs[0].cfg
+    assert runs[2].folder == os.path.join(folder, 'preprod')
+    assert runs[2].cfg['services'] == {'grafana_service': True, 'gatling_metrics_service': False, 'svc-b': False}
+    assert runs[2].cfg['grafana'] == {'base_url': 'http://pre', 'api_key': 'p'}
+
+    metrics = [Metric(name='cpu', dashboard_uid='uid', dashboard_name='dash', panelId=1,
+                      vars={'var-application': 'PLACEHOLDER', 'var-namespace': 'astra-stress'})]
+    job, = plan_service_jobs(runs[2].cfg, metrics, runs[2].folder, ['svc-a'])
+    query = urllib.parse.parse_qs(urllib.parse.urlparse(job.url).query)
+    assert job.url.startswith('http://pre/') and job.run == 'run/preprod'
+    assert query['var-namespace'] == ['astra-preprod'] and 'var-cluster' not in query
+    assert job.output_file == os.path.join(folder, 'preprod', 'metrics', 'svc-a', 'cpu.png')
@@ -0,0 +1,42 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.blob_store import BlobStore
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+@pytest.mark.parametrize('link', ['hardlink', 'symlink'])
+def test_identical_artifacts_are_stored_once(tmp_path, link):
+    store = BlobStore(str(tmp_path / '.blobs'), link)
+    for run in ('run1', 'run2'):
+        _write(str(tmp_path / run / 'metrics' / 'svc' / 'cpu.png'), b'same panel')
+        _write(str(tmp_path / run / 'gatling' / 'style.css'), b'same css')
+    _write(str(tmp_path / 'run2' / 'metrics' / 'svc' / 'rps.png'), b'new panel')
+
+    assert store.ingest_tree(str(tmp_path / 'run1')) == (2, 0)
+    assert store.ingest_tree(str(tmp_path / 'run2')) == (3, len(b'same panel') + len(b'same css'))
+    first, second = (os.path.realpath(str(tmp_path / run / 'metrics' / 'svc' / 'cpu.png')) for run in ('run1', 'run2'))
+    assert os.stat(first).st_ino == os.stat(second).st_ino
+    assert sum(len(files) for _, _, files in os.walk(store.root)) == 3
+
+    # Отвязанный файл можно перезаписать, не меняя блоб другого запуска
+    assert store.detach_tree(str(tmp_path / 'run2')) == 3
+    _write(str(tmp_path / 'run2' / 'metrics' / 'svc' / 'cpu.png'), b'rewritten')
+    with open(str(tmp_path / 'run1' / 'metrics' / 'svc' / 'cpu.png'), 'rb') as f:
+        assert f.read() == b'same panel'
+
+    # После удаления run1 его блобы больше никому не нужны
+    for root, _, files in os.walk(str(tmp_path / 'run1')):
+        for name in files:
+            os.remove(os.path.join(root, name))
+    assert store.gc(str(tmp_path), min_age=0) == (3, len(b'same panel') + len(b'same css') + len(b'new panel'))
+    assert not os.listdir(store.root)
@@ -40,3 +40,14 @@ def test_missing_required_field(tmp_path):
         assert False, "Expected ValueError"
     except ValueError as e:
         assert "name" in str(e)
+
+
+def test_priority_names_and_numbers(tmp_path):
+    metrics_data = {'metrics': [
+        {'name': 'm1', 'dashboard_uid': 'uid', 'dashboard_name': 'dash', 'panelId': 1, 'priority': 'critical'},
+        {'name': 'm2', 'dashboard_uid': 'uid', 'dashboard_name': 'dash', 'panelId': 2, 'priority': 7},
+        {'name': 'm3', 'dashboard_uid': 'uid', 'dashboard_name': 'dash', 'panelId': 3},
+    ]}
+    path = tmp_path / 'metrics.yml'
+    path.write_text(yaml.safe_dump(metrics_data))
+    assert [metric.priority for metric in load_metrics_config(str(path))] == [100, 7, 0]
@@ -0,0 +1,89 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.dashboard_render import (DashboardJob, RenderJob, JobResult, dashboard_url, panel_boxes,
+                                  group_dashboard_jobs, fetch_dashboard_layout, crop_dashboard_results)
+
+DASHBOARD = {
+    'panels': [
+        {'id': 1, 'type': 'timeseries', 'gridPos': {'x': 0, 'y': 0, 'w': 12, 'h': 8}},
+        {'id': 2, 'type': 'timeseries', 'gridPos': {'x': 12, 'y': 0, 'w': 12, 'h': 8}},
+        {'id': 3, 'type': 'row', 'collapsed': True, 'gridPos': {'x': 0, 'y': 8, 'w': 24, 'h': 1},
+         'panels': [{'id': 4, 'gridPos': {'x': 0, 'y': 9, 'w': 24, 'h': 8}}]},
+    ]
+}
+
+
+def test_panel_boxes_follow_grid():
+    layout = panel_boxes(DASHBOARD, width=24 * 40 + 23 * 8)
+    # Колонка 40 px, строка 30 px, отступ 8 px
+    assert layout.boxes['1'] == (0, 0, 12 * 40 + 11 * 8, 8 * 30 + 7 * 8)
+    assert layout.boxes['2'][0] == 12 * 48
+    # Панели свернутой строки на снимке нет
+    assert set(layout.boxes) == {'1', '2'}
+    assert layout.height == 8 * 30 + 7 * 8 + 8
+
+
+def test_dashboard_url_drops_panel_params():
+    url = dashboard_url('http://g/render/d-solo/uid/name?orgId=1&panelId=2&width=1000&height=500&var-x=a', 1920)
+    assert url == 'http://g/render/d/uid/name?orgId=1&var-x=a&width=1920&kiosk='
+
+
+def _job(tmp_path, name, panel_id, service='svc'):
+    return RenderJob(run='r', source='grafana', group=service, name=name,
+                     url=f'http://g/render/d-solo/uid/name?orgId=1&panelId={panel_id}&width=1000&height=500&var-s={service}',
+                     headers={}, output_file=str(tmp_path / service / f'{name}.png'), dashboard_uid='uid',
+                     panel_id=panel_id)
+
+
+def test_group_dashboard_jobs_per_service(tmp_path):
+    pytest.importorskip('PIL')
+    jobs = [_job(tmp_path, 'a', 1), _job(tmp_path, 'b', 2), _job(tmp_path, 'c', 1, service='other')]
+    planned = group_dashboard_jobs(jobs, {'enabled': True, 'width': 1920, 'cell_height': 30, 'margin': 8,
+                                          'padding': 0})
+    # Две панели сервиса svc — один рендер дашборда; единственная панель other остаётся как есть
+    assert len(planned) == 2
+    assert isinstance(planned[0], DashboardJob) and [job.name for job in planned[0].crops] == ['a', 'b']
+    assert planned[1] is jobs[2]
+
+
+def test_crop_dashboard_results(tmp_path):
+    image = pytest.importorskip('PIL.Image')
+
+    class Response:
+        def raise_for_status(self):
+            pass
+
+        def json(self):
+            return {'dashboard': DASHBOARD}
+
+    class Session:
+        def get(self, url, **kwargs):
+            assert url == 'http://g/api/dashboards/uid/uid'
+            return Response()
+
+    class Scheduler:
+        def run(self, jobs):
+            return [JobResult(job=job, ok=True) for job in jobs]
+
+    missing = _job(tmp_path, 'missing', 4)
+    job = DashboardJob(run='r', source='grafana', group='svc', name='dashboard_uid',
+                       url='http://g/render/d/uid/name?orgId=1&width=1000&kiosk=', headers={},
+                       output_file=str(tmp_path / 'svc' / '_dashboard_uid.png'), dashboard_uid='uid',
+                       crops=[_job(tmp_path, 'a', 1), _job(tmp_path, 'b', 2), missing],
+                       grid={'width': 1000, 'cell_height': 30, 'margin': 8, 'padding': 0})
+    layout = fetch_dashboard_layout(Session(), job)
+    os.makedirs(tmp_path / 'svc')
+    image.new('RGB', (1000, layout.height), 'white').save(job.output_file)
+
+    results = crop_dashboard_results([JobResult(job=job, ok=True, duration=3.0)], Scheduler(),
+                                     {'crop_workers': 2})
+    assert [(result.job.name, result.ok, result.deduplicated) for result in results] == [
+        ('a', True, False), ('b', True, True), ('missing', True, False)]
+    with image.open(tmp_path / 'svc' / 'b.png') as panel:
+        assert panel.size == (layout.boxes['2'][2] - layout.boxes['2'][0], 8 * 30 + 7 * 8)
+    assert not os.path.exists(job.output_file)
@@ -0,0 +1,75 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.discovery import discover_targets
+
+
+class Response:
+    def __init__(self, payload):
+        self.payload = payload
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.payload
+
+
+class Session:
+    def __init__(self, values):
+        self.values = values
+        self.calls = []
+
+    def get(self, url, params=None, **kwargs):
+        self.calls.append((url, params))
+        label = url.split('/label/')[1].split('/')[0]
+        return Response({'status': 'success', 'data': self.values[label]})
+
+
+class Registry:
+    def __init__(self, session):
+        self.session = session
+
+    def get(self, host_or_url):
+        return self.session
+
+
+def _cfg(on_empty='skip'):
+    return {
+        'mainConfig': {'timezone': 'UTC', 'from': '2025-07-21 10:00:00', 'to': '2025-07-21 11:00:00'},
+        'grafana': {'base_url': 'http://g', 'api_key': 'k'},
+        'gatling_grafana': {'base_url': 'http://gg', 'api_key': 'k'},
+        'discovery': {
+            'enabled': True,
+            'on_empty': on_empty,
+            'services': {'datasource_uid': 'prom', 'match': '{namespace="ns"}'},
+            'gatling_scripts': {'datasource_uid': 'gatling'},
+        },
+    }
+
+
+def test_discovery_skips_targets_without_series():
+    session = Session({'application': ['svc-a', 'other'], 'script_name': ['Get_Document']})
+    services, scripts, empty = discover_targets(_cfg(), Registry(session), ['svc-a', 'svc-b'],
+                                                ['Get_Document', 'Upload_File'])
+    assert services == ['svc-a'] and scripts == ['Get_Document']
+    assert empty == {'services': ['svc-b'], 'gatling_scripts': ['Upload_File']}
+    url, params = session.calls[0]
+    assert url == 'http://g/api/datasources/proxy/uid/prom/api/v1/label/application/values'
+    assert params == {'start': 1753092000, 'end': 1753095600, 'match[]': '{namespace="ns"}'}
+
+
+def test_discovery_flag_mode_and_failures_keep_targets():
+    session = Session({'application': [], 'script_name': []})
+    services, scripts, empty = discover_targets(_cfg('flag'), Registry(session), ['svc-a'], ['Get_Document'])
+    assert services == ['svc-a'] and scripts == ['Get_Document']
+    assert empty['services'] == ['svc-a']
+
+    class Broken(Session):
+        def get(self, url, params=None, **kwargs):
+            return Response({'status': 'error', 'error': 'bad'})
+
+    services, scripts, empty = discover_targets(_cfg(), Registry(Broken({})), ['svc-a'], [])
+    assert services == ['svc-a'] and empty['services'] == []
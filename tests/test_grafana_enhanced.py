@@ -0,0 +1,19 @@
+import os
+import sys
+import logging
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import grafana_enhanced
+# Скрипт импортирует модули из src напрямую (sys.path 'src'): слушатель лога — в модуле utils
+from utils import stop_logging
+
+
+def test_standalone_script_logs_info(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(grafana_enhanced, 'run', lambda parser, args: logging.info("✅ Saved: cpu.png"))
+    grafana_enhanced.main([])
+    stop_logging()
+
+    with open(tmp_path / 'app.log', encoding='utf-8') as f:
+        assert '✅ Saved: cpu.png' in f.read()
@@ -33,3 +33,189 @@ def test_list_variable_expansion():
     assert query['to'] == ['2025-07-21T11:00:00Z']
     expected_path = '/render/d-solo/uid1/dash'
     assert parsed.path == expected_path
+
+
+def test_resolution_hints_follow_window_and_width():
+    from src.grafana_service import apply_resolution_hints, format_interval, resolution_interval
+
+    # 24 часа на 1000 пикселей: 86.4 с на точку -> шаг 2m
+    assert resolution_interval(86400, 1000) == 120 and format_interval(120) == '2m'
+    # Короткое окно упирается в минимальный шаг
+    assert resolution_interval(600, 1000, min_interval=15) == 15
+
+    cfg = {'grafana': {'resolution': {'enabled': True, 'interval_var': 'interval'}}}
+    vars_dict = {}
+    apply_resolution_hints(vars_dict, cfg, 'grafana', None, 86400, 1000)
+    assert vars_dict == {'var-interval': '2m'}
+
+    # Короткое окно не требует прореживания: шаг дашборда не переопределяется
+    short_window = {}
+    apply_resolution_hints(short_window, cfg, 'grafana', None, 4 * 3600, 1000)
+    assert short_window == {}
+
+    explicit = {'var-interval': '30s'}
+    apply_resolution_hints(explicit, cfg, 'grafana', None, 86400, 1000)
+    assert explicit == {'var-interval': '30s'}
+
+    disabled = {}
+    apply_resolution_hints(disabled, cfg, 'grafana', False, 86400, 1000)
+    assert disabled == {}
+
+    per_metric = {}
+    apply_resolution_hints(per_metric, {}, 'gatling_grafana', {'interval_var': 'step', 'interval': '1m'}, 86400, 1000)
+    assert per_metric == {'var-step': '1m'}
+
+
+def test_grouped_metric_renders_all_services_once(tmp_path):
+    from src.config_loader import Metric
+    from src.grafana_service import plan_service_jobs
+
+    cfg = {
+        'grafana': {'base_url': 'http://g', 'api_key': 'k'},
+        'mainConfig': {'timezone': 'UTC', 'from': '2025-07-21 10:00:00', 'to': '2025-07-21 11:00:00'},
+    }
+    metrics = [
+        Metric(name='cpu', dashboard_uid='uid', dashboard_name='dash', panelId=1,
+               vars={'var-application': 'PLACEHOLDER'}),
+        Metric(name='rps', dashboard_uid='uid', dashboard_name='dash', panelId=2, grouped=True,
+               vars={'var-application': 'PLACEHOLDER'}),
+    ]
+    jobs = plan_service_jobs(cfg, metrics, str(tmp_path), ['svc-a', 'svc-b'])
+
+    assert [(job.group, job.name) for job in jobs] == [('svc-a', 'cpu'), ('svc-b', 'cpu'), ('grouped', 'rps')]
+    query = urllib.parse.parse_qs(urllib.parse.urlparse(jobs[2].url).query)
+    assert query['var-application'] == ['svc-a', 'svc-b']
+    assert jobs[2].output_file == os.path.join(str(tmp_path), 'metrics', 'grouped', 'rps.png')
+
+
+
+def test_results_are_grouped_by_settings_of_their_run(tmp_path):
+    from src.batch import Run
+    from src.dashboard_render import dashboard_render_settings
+    from src.grafana_service import group_by_run_settings
+    from src.scheduler import JobResult, RenderJob
+
+    base = {'grafana': {'dashboard_render': {'crop_workers': 2}}}
+    runs = [Run(cfg=base, folder=str(tmp_path / 'a')),
+            Run(cfg={'grafana': {'dashboard_render': {'crop_workers': 8}}}, folder=str(tmp_path / 'b'))]
+    results = [JobResult(job=RenderJob(run=run.label, source='grafana', group='svc', name=str(index), url='http://g',
+                                       headers={}, output_file='p.png'), ok=True)
+               for index, run in enumerate([runs[0], runs[1], runs[0]])]
+
+    groups = group_by_run_settings(results, base, runs, dashboard_render_settings)
+    assert [(settings['crop_workers'], indexes) for settings, indexes in groups] == [(2, [0, 2]), (8, [1])]
+
+
+def test_image_check_uses_settings_of_each_run(tmp_path):
+    from src.batch import Run
+    from src.grafana_service import check_images
+    from src.scheduler import JobResult, RenderJob
+
+    base = {'grafana': {'image_check': {'enabled': False}}}
+    checked_cfg = {'grafana': {'image_check': {'enabled': True, 'requeue': True}}}
+    runs = [Run(cfg=base, folder=str(tmp_path / 'a')), Run(cfg=checked_cfg, folder=str(tmp_path / 'b'))]
+
+    def blank_png(width=400, height=200):
+        import struct
+        import zlib
+
+        def chunk(kind, data):
+            return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+        raw = b''.join(b'\0' + b'\xff' * width * 3 for _ in range(height))
+        return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+                + chunk(b'IDAT', zlib.compress(raw, 9)) + chunk(b'IEND', b''))
+
+    def result(run, name):
+        path = tmp_path / f"{run.label}-{name}.png"
+        path.write_bytes(blank_png())
+        job = RenderJob(run=run.label, source='grafana', group='svc', name=name, url='http://g/render',
+                        headers={}, output_file=str(path))
+        return JobResult(job=job, ok=True)
+
+    class Scheduler:
+        rerun = []
+
+        def run(self, jobs):
+            self.rerun += [job.name for job in jobs]
+            return [JobResult(job=job, ok=True) for job in jobs]
+
+    scheduler = Scheduler()
+    results = [result(runs[0], 'cpu'), result(runs[1], 'heap'), result(runs[0], 'gc')]
+    checked = check_images(results, scheduler, base, runs)
+
+    # Пустая картинка повторяется только в запуске с включённой проверкой
+    assert scheduler.rerun == ['heap']
+    assert [item.job.name for item in checked] == ['cpu', 'heap', 'gc']
+
+
+def test_session_registry_adapter_retries_only_on_request():
+    from src.grafana_service import create_session_registry
+
+    cfg = {'scheduler': {'retries': 2, 'backoff_factor': 1.0}}
+    scheduled = create_session_registry(cfg).get('http://grafana:3000').get_adapter('http://grafana:3000')
+    standalone = create_session_registry(cfg, adapter_retries=True).get('http://grafana:3000').get_adapter('http://grafana:3000')
+    assert scheduled.max_retries.total == 0
+    assert standalone.max_retries.total == 2 and standalone.max_retries.backoff_factor == 1.0
+    assert 502 in standalone.max_retries.status_forcelist
+
+
+def test_download_grafana_metrics_closes_own_scheduler(tmp_path, monkeypatch):
+    import src.grafana_service as grafana_service
+    from src.resilience import RetryBudget
+    from src.scheduler import JobResult, RenderJob
+
+    class Scheduler:
+        sessions = None
+        optimizer = None
+        closed = False
+
+        def __init__(self):
+            self.retry_budget = RetryBudget()
+
+        def run(self, jobs):
+            return [JobResult(job=job, ok=True) for job in jobs]
+
+        def close(self):
+            self.closed = True
+
+    job = RenderJob(run='r', source='grafana', group='svc', name='cpu', url='http://g/render', headers={},
+                    output_file=str(tmp_path / 'cpu.png'))
+    monkeypatch.setattr(grafana_service, 'plan_grafana_jobs', lambda *args: [job])
+    created = Scheduler()
+    monkeypatch.setattr(grafana_service, 'create_scheduler', lambda cfg: created)
+    grafana_service.download_grafana_metrics({}, [], str(tmp_path), ['svc'])
+    assert created.closed
+
+    # Переданный планировщик принадлежит вызывающему коду и не закрывается
+    shared = Scheduler()
+    grafana_service.download_grafana_metrics({}, [], str(tmp_path), ['svc'], scheduler=shared)
+    assert not shared.closed
+
+
+def test_download_grafana_metrics_finishes_optimization(tmp_path, monkeypatch):
+    import src.grafana_service as grafana_service
+    from src.image_optimize import ImageOptimizer, optimize_settings
+    from src.resilience import RetryBudget
+    from src.probe import placeholder_png
+    from src.scheduler import RenderJob, RenderScheduler
+
+    output = tmp_path / 'cpu.png'
+
+    def fetch(session, job, timing):
+        output.write_bytes(placeholder_png(40, 20))
+        return True
+
+    optimizer = ImageOptimizer(optimize_settings({'grafana': {'optimize': {'enabled': True, 'workers': 1}}}))
+    finished = []
+    monkeypatch.setattr(optimizer, 'finish', lambda results: finished.append(len(results)) or results)
+    scheduler = RenderScheduler(fetch, sessions=None, retry_budget=RetryBudget(), optimizer=optimizer)
+    job = RenderJob(run='r', source='grafana', group='svc', name='cpu', url='http://g/render', headers={},
+                    output_file=str(output))
+    monkeypatch.setattr(grafana_service, 'plan_grafana_jobs', lambda *args: [job])
+    monkeypatch.setattr(grafana_service, 'create_scheduler', lambda cfg: scheduler)
+
+    grafana_service.download_grafana_metrics({}, [], str(tmp_path), ['svc'])
+    assert finished == [1]
+    # Планировщик создан функцией: пул пересжатия остановлен вместе с ним
+    assert optimizer._executor is None
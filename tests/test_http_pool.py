@@ -0,0 +1,31 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.http_pool import SessionRegistry
+
+
+class _Session:
+    def __init__(self, pool_maxsize):
+        self.pool_maxsize = pool_maxsize
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def test_one_session_per_host_with_pool_sized_to_limit():
+    registry = SessionRegistry(_Session, pool_maxsize=3)
+    first = registry.get('https://grafana:3000/render/d-solo/x?panelId=1')
+    assert registry.get('grafana:3000') is first
+    assert registry.get('https://other/render') is not first
+    assert first.pool_maxsize == 3
+
+    registry.record('grafana:3000', 1)
+    registry.record('grafana:3000', 0)
+    registry.record('grafana:3000', 0)
+    assert registry.stats()['grafana:3000'] == {'requests': 3, 'new_connections': 1, 'reused': 2}
+
+    registry.close()
+    assert first.closed
@@ -0,0 +1,59 @@
+import os
+import sys
+import zlib
+import random
+import struct
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.image_check import classify_image, check_results, png_compression_ratio, _DEFAULT_IMAGE_CHECK
+from src.scheduler import RenderJob, JobResult
+
+
+def _png(path, noisy, width=200, height=100):
+    rng = random.Random(1)
+    rows = b''.join(b'\x00' + (bytes(rng.randrange(256) for _ in range(width * 3)) if noisy else b'\xff' * width * 3)
+                    for _ in range(height))
+
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff)
+
+    with open(path, 'wb') as f:
+        f.write(b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+                + chunk(b'IDAT', zlib.compress(rows, 9)) + chunk(b'IEND', b''))
+    return str(path)
+
+
+def test_blank_and_busy_images(tmp_path):
+    blank = _png(tmp_path / 'blank.png', noisy=False)
+    busy = _png(tmp_path / 'busy.png', noisy=True)
+    assert png_compression_ratio(blank) > 100 > png_compression_ratio(busy)
+    settings = dict(_DEFAULT_IMAGE_CHECK)
+    assert classify_image(blank, settings) == 'blank'
+    assert classify_image(busy, settings) == 'ok'
+
+
+def test_only_flagged_jobs_are_requeued(tmp_path):
+    def job(name):
+        return RenderJob(run='r', source='grafana', group='svc', name=name, url=f'http://g/{name}', headers={},
+                         output_file=str(tmp_path / f'{name}.png'))
+
+    good, bad = job('good'), job('bad')
+    _png(good.output_file, noisy=True)
+    _png(bad.output_file, noisy=False)
+
+    class Scheduler:
+        def __init__(self):
+            self.jobs = []
+
+        def run(self, jobs):
+            self.jobs += jobs
+            for item in jobs:
+                _png(item.output_file, noisy=True)
+            return [JobResult(job=item, ok=True) for item in jobs]
+
+    scheduler = Scheduler()
+    settings = dict(_DEFAULT_IMAGE_CHECK, enabled=True, workers=2)
+    results = check_results([JobResult(job=good, ok=True), JobResult(job=bad, ok=True)], scheduler, settings)
+    assert [item.name for item in scheduler.jobs] == ['bad']
+    assert [(result.job.name, result.ok, result.error) for result in results] == [('good', True, ''), ('bad', True, '')]
@@ -0,0 +1,61 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.latency_store import LatencyStore, window_bucket
+from src.scheduler import JobResult, RenderJob
+from src.timings import RenderTiming
+
+
+def _result(panel_id, seconds, window=3600, ok=True):
+    job = RenderJob(run='r', source='grafana', group='svc', name=f'p{panel_id}', url='http://grafana:3000/render',
+                    headers={}, output_file='p.png', dashboard_uid='jvm', panel_id=panel_id, window=window)
+    return JobResult(job=job, ok=ok, timing=RenderTiming(total=seconds))
+
+
+def test_estimate_uses_recent_median_and_window_bucket(tmp_path):
+    store = LatencyStore(str(tmp_path / 'latency.sqlite'))
+    assert store.record([_result(1, 2.0), _result(1, 4.0), _result(1, 3.0), _result(2, 0.5), _result(3, 9, ok=False)]) == 4
+    assert store.estimate(_result(1, 0, window=3500).job) == 3.0
+    assert store.estimate(_result(2, 0).job) == 0.5
+    # Для нового окна берётся история панели с другим окном
+    assert store.estimate(_result(2, 0, window=86400).job) == 0.5
+    assert store.estimate(_result(3, 0).job) is None
+    assert window_bucket(3500) == window_bucket(3600) != window_bucket(86400)
+
+
+def test_trends_report_slower_panels(tmp_path):
+    store = LatencyStore(str(tmp_path / 'latency.sqlite'))
+    for seconds in (1.0, 1.1, 0.9, 3.0, 3.2, 2.9):
+        store.record([_result(1, seconds), _result(2, 1.0)])
+    trends = store.trends()
+    assert [item['panel_id'] for item in trends] == ['1']
+    assert trends[0]['before'] == 1.0 and trends[0]['recent'] == 3.0
+
+
+def test_history_is_pruned_per_key_and_by_age(tmp_path):
+    import time
+    store = LatencyStore(str(tmp_path / 'latency.sqlite'), keep_per_key=20, max_age_days=1)
+    store._conn.execute("INSERT INTO renders VALUES (?, 'grafana:3000', 'jvm', '9', 4096, 1.0)", (time.time() - 3 * 86400,))
+    for _ in range(30):
+        store.record([_result(1, 1.0)])
+    counts = dict(store._conn.execute("SELECT panel_id, COUNT(*) FROM renders GROUP BY panel_id").fetchall())
+    assert counts == {'1': 20}
+    store.close()
+
+
+def test_read_only_store_never_creates_files(tmp_path):
+    from src.latency_store import open_latency_store
+
+    cfg = {'main_folder': str(tmp_path / 'reports')}
+    assert open_latency_store(cfg, read_only=True) is None
+    assert not os.path.exists(cfg['main_folder'])
+
+    writable = open_latency_store(cfg)
+    writable.record([_result(1, 2.0)])
+    writable.close()
+    store = open_latency_store(cfg, read_only=True)
+    assert store.estimate(_result(1, 0).job) == 2.0
+    assert store.record([_result(1, 5.0)]) == 0
+    store.close()
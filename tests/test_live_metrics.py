@@ -0,0 +1,73 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.live_metrics import RollingRequestStats, SimulationLogTail, parse_request_record
+
+
+def test_parse_request_record_gatling3():
+    line = "REQUEST\t\tGet_Document\t1765274619000\t1765274619250\tOK\t \n"
+    assert parse_request_record(line) == ('Get_Document', 1765274619000, 1765274619250, True)
+    assert parse_request_record("USER\tscn\tSTART\t1765274619000\n") is None
+
+
+def test_rolling_stats_are_bounded():
+    stats = RollingRequestStats(window_seconds=10, sample_size=100)
+    for i in range(1000):
+        stats.add('req', i * 100, i * 100 + i % 50, i % 10 != 0)
+    snapshot = stats.snapshot()['requests']['req']
+    assert len(stats.samples['req']) == 100
+    assert len(stats.buckets['req']) <= 10
+    assert snapshot['rps'] == 10.0
+    assert snapshot['ok'] == 900 and snapshot['ko'] == 100
+
+
+class _FakeStat:
+    def __init__(self, size):
+        self.st_size = size
+
+
+class _FakeSftp:
+    def __init__(self):
+        self.data = b''
+
+    def stat(self, path):
+        return _FakeStat(len(self.data))
+
+    def open(self, path, mode):
+        import io
+        return io.BytesIO(self.data)
+
+
+def test_log_tail_returns_only_complete_new_lines():
+    sftp = _FakeSftp()
+    tail = SimulationLogTail(sftp, 'simulation.log')
+    sftp.data = b"RUN\tsim\nREQUEST\t\tr"
+    assert list(tail.read_lines()) == ['RUN\tsim']
+    sftp.data += b"1\t1\t2\tOK\t \n"
+    assert list(tail.read_lines()) == ['REQUEST\t\tr1\t1\t2\tOK\t ']
+    assert list(tail.read_lines()) == []
+
+
+def test_log_tail_reads_in_chunks_and_can_start_at_end(monkeypatch):
+    import src.live_metrics as live_metrics
+    monkeypatch.setattr(live_metrics, '_READ_CHUNK', 8)
+    sftp = _FakeSftp()
+    sftp.data = b"RUN\tsim\nREQUEST\t\tr1\t1\t2\tOK\t \nUSER\tx"
+    lines = SimulationLogTail(sftp, 'simulation.log').read_lines()
+    # Первая строка доступна после первых блоков, не дожидаясь чтения всего файла
+    assert next(lines) == 'RUN\tsim'
+    assert list(lines) == ['REQUEST\t\tr1\t1\t2\tOK\t ']
+
+    tail = SimulationLogTail(sftp, 'simulation.log', from_end=True)
+    assert list(tail.read_lines()) == []
+    sftp.data += b"\tEND\nUSER\ty\n"
+    assert list(tail.read_lines()) == ['USER\ty']
+
+
+def test_rolling_stats_trim_while_adding():
+    stats = RollingRequestStats(window_seconds=10, sample_size=100)
+    for second in range(3600):
+        stats.add('req', second * 1000, second * 1000 + 5, True)
+    assert len(stats.buckets['req']) <= 10
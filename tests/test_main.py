@@ -0,0 +1,16 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.main import run_stage
+
+
+def test_run_stage_isolates_errors():
+    def failing():
+        raise RuntimeError("boom")
+
+    ok = run_stage('ok', lambda: 'done')
+    failed = run_stage('failed', failing)
+    assert ok['ok'] and ok['details'] == 'done'
+    assert not failed['ok'] and failed['details'] == 'boom'
@@ -0,0 +1,35 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.planner import simulate_wall_time, summarize_plan
+from src.scheduler import RenderJob, RenderScheduler
+
+
+def test_wall_time_respects_worker_and_host_limits():
+    # 4 задачи по 10 с на одном хосте, лимит хоста 2 — две волны
+    assert simulate_wall_time([('a', 10)] * 4, max_workers=4, per_host_limit=2) == 20
+    # Два хоста параллельно
+    assert simulate_wall_time([('a', 10), ('b', 10)] * 2, max_workers=4, per_host_limit=2) == 10
+    # Общий пул потоков ограничивает сильнее лимита хоста
+    assert simulate_wall_time([('a', 10), ('b', 10)] * 2, max_workers=1, per_host_limit=2) == 40
+
+
+def test_summary_counts_deduplicated_renders(tmp_path):
+    def job(name, url):
+        return RenderJob(run='r', source='grafana', group='svc', name=name, url=url, headers={},
+                         output_file=str(tmp_path / f'{name}.png'))
+
+    class Store:
+        def estimate(self, job):
+            return {'a': 4.0}.get(job.name)
+
+    jobs = [job('a', 'http://g1/render?1'), job('b', 'http://g1/render?1'), job('c', 'http://g2/render?2')]
+    summary = summarize_plan(jobs, RenderScheduler(lambda *args: True, sessions=None, latency_store=Store()))
+
+    assert summary['jobs'] == 3 and summary['renders'] == 2 and summary['deduplicated'] == 1
+    assert summary['hosts']['g1'] == {'jobs': 2, 'renders': 1, 'render_seconds': 4.0, 'unknown': 0}
+    assert summary['hosts']['g2']['unknown'] == 1
+    assert summary['estimated_seconds'] == 4.0
+    assert not os.listdir(tmp_path)
@@ -0,0 +1,54 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.probe import build_probe_queries, has_datapoints, interpolate, is_placeholder, placeholder_png
+
+DASHBOARD = {
+    'templating': {'list': [
+        {'name': 'namespace', 'current': {'value': 'default-ns'}},
+        {'name': 'pod', 'allValue': '.+', 'current': {'value': ['$__all']}},
+    ]},
+}
+
+
+def test_interpolate_follows_grafana_formats():
+    variables = {'app': ['a', 'b'], 'ns': ['x'], 'pod': ['$__all']}
+    text = 'up{app=~"$app", ns="${ns}", pod=~"[[pod]]"}[$__rate_interval]'
+    assert interpolate(text, variables, {}) == 'up{app=~"(a|b)", ns="x", pod=~".*"}[$__rate_interval]'
+
+
+def test_probe_queries_use_url_variables_and_minimal_resolution():
+    panel = {
+        'datasource': {'type': 'prometheus', 'uid': '${DS}'},
+        'targets': [
+            {'refId': 'A', 'expr': 'rate(x{namespace="$namespace", pod=~"$pod", app="$application"}[1m])'},
+            {'refId': 'B', 'expr': 'hidden', 'hide': True},
+        ],
+    }
+    url = 'http://g/render/d-solo/uid/name?panelId=1&from=0&to=3600000&var-application=svc&var-DS=prom'
+    queries = build_probe_queries(DASHBOARD, panel, url, 3600000, 10)
+    assert len(queries) == 1
+    assert queries[0]['expr'] == 'rate(x{namespace="default-ns", pod=~".+", app="svc"}[1m])'
+    assert queries[0]['datasource'] == {'type': 'prometheus', 'uid': 'prom'}
+    assert queries[0]['maxDataPoints'] == 10 and queries[0]['intervalMs'] == 360000
+
+    # Неразрешённый источник данных — проба не выполняется
+    assert build_probe_queries({}, panel, 'http://g/render?from=0&to=1', 1, 10) == []
+
+
+def test_has_datapoints():
+    empty = {'results': {'A': {'frames': [{'data': {'values': [[], []]}}]}, 'B': {'frames': []}}}
+    full = {'results': {'A': {'frames': [{'data': {'values': [[1], [2.0]]}}]}}}
+    assert has_datapoints(empty) is False
+    assert has_datapoints(full) is True
+    assert has_datapoints({'results': {'A': {'error': 'bad query'}}}) is None
+
+
+def test_placeholder_png_is_marked(tmp_path):
+    path = tmp_path / 'panel.png'
+    path.write_bytes(placeholder_png(100, 50))
+    assert is_placeholder(str(path))
+    path.write_bytes(b'\x89PNG\r\n\x1a\n' + b'\x00' * 100)
+    assert not is_placeholder(str(path))
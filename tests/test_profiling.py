@@ -0,0 +1,38 @@
+import os
+import sys
+import pstats
+import threading
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.profiling import StageProfiler
+
+
+def _allocate():
+    return [bytes(1024) for _ in range(200)]
+
+
+def test_stage_profiles_include_worker_threads(tmp_path):
+    profiler = StageProfiler(top=5)
+    profiler.enabled = True
+    with profiler.stage('grafana.grafana'):
+        worker = threading.Thread(target=_allocate)
+        worker.start()
+        worker.join()
+        with profiler.stage('nested'):
+            kept = _allocate()
+
+    profile_dir = profiler.write(str(tmp_path))
+    assert sorted(os.listdir(profile_dir)) == ['grafana.grafana.alloc.txt', 'grafana.grafana.prof']
+    stats = pstats.Stats(os.path.join(profile_dir, 'grafana.grafana.prof'))
+    calls = [func for func, (_, ncalls, *_) in stats.stats.items() if func[2] == '_allocate']
+    assert calls and stats.stats[calls[0]][1] == 2
+    assert 'test_profiling.py' in open(os.path.join(profile_dir, 'grafana.grafana.alloc.txt')).read()
+    assert kept
+
+
+def test_disabled_profiler_writes_nothing(tmp_path):
+    profiler = StageProfiler()
+    with profiler.stage('config.load'):
+        pass
+    assert profiler.write(str(tmp_path)) is None
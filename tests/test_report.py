@@ -0,0 +1,126 @@
+import os
+import sys
+import json
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.probe import placeholder_png
+from src.report import build_report, report_settings
+
+STATS = {
+    'type': 'GROUP', 'name': 'All Requests',
+    'stats': {'numberOfRequests': {'total': 120, 'ok': 118, 'ko': 2}, 'meanResponseTime': {'total': 35},
+              'percentiles1': {'total': 30}, 'percentiles3': {'total': 80}, 'percentiles4': {'total': 120},
+              'meanNumberOfRequestsPerSecond': {'total': 2.0}},
+    'contents': {'req_get': {'type': 'REQUEST', 'name': 'Get Document',
+                             'stats': {'numberOfRequests': {'total': 120, 'ko': 2}}}},
+}
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def _run_folder(tmp_path):
+    folder = str(tmp_path / 'run')
+    _write(os.path.join(folder, 'gatling', 'sim-1', 'js', 'stats.json'), json.dumps(STATS).encode())
+    _write(os.path.join(folder, 'metrics', 'svc', 'cpu.png'), b'\x89PNG' + b'x' * 20)
+    _write(os.path.join(folder, 'metrics', 'svc', 'rps.png'), placeholder_png(40, 20))
+    _write(os.path.join(folder, 'metrics', 'gatling_metrics', 'Get_Document', 'panel_3.png'), b'\x89PNG')
+    _write(os.path.join(folder, 'stress', 'metrics', 'svc', 'cpu.png'), b'\x89PNG')
+    return folder
+
+
+def test_markdown_report_sections(tmp_path):
+    folder = _run_folder(tmp_path)
+    path = build_report(folder, report_settings({'report': {'format': 'md'}}))
+
+    assert path == os.path.join(folder, 'report.md')
+    with open(path, encoding='utf-8') as f:
+        text = f.read()
+    titles = [line for line in text.splitlines() if line.startswith('## ')]
+    assert titles == ['## Gatling: sim-1', '## svc', '## Gatling метрики: Get_Document', '## stress / svc']
+    assert '| All Requests | 120 | 2 | 35 | 30 | 80 | 120 | 2.0 |' in text
+    assert '| Get Document | 120 | 2 | — |' in text
+    assert 'Нет данных: rps' in text
+    assert '(metrics/gatling_metrics/Get_Document/panel_3.png)' in text
+
+
+def test_report_is_rebuilt_only_when_artifacts_change(tmp_path):
+    pytest.importorskip('PIL')
+    from PIL import Image
+
+    folder = _run_folder(tmp_path)
+    for name in ('cpu', 'mem'):
+        Image.new('RGB', (800, 400), 'white').save(os.path.join(folder, 'metrics', 'svc', f'{name}.png'))
+    settings = report_settings({'report': {'thumbnail_width': 100, 'workers': 1}})
+    path = build_report(folder, settings)
+    thumb = os.path.join(folder, 'report', 'thumbs', 'metrics', 'svc', 'mem.png')
+    with Image.open(thumb) as image:
+        assert image.size == (100, 50)
+    mtime = os.stat(thumb).st_mtime_ns
+    document = os.stat(path).st_mtime_ns
+
+    build_report(folder, settings)
+    assert os.stat(path).st_mtime_ns == document
+
+    Image.new('RGB', (800, 400), 'black').save(os.path.join(folder, 'metrics', 'svc', 'cpu.png'))
+    build_report(folder, settings)
+    assert os.stat(thumb).st_mtime_ns == mtime
+    with open(path, encoding='utf-8') as f:
+        assert 'src="report/thumbs/metrics/svc/cpu.png" loading="lazy"' in f.read()
+
+
+def test_report_in_archive_mode_sees_archived_files(tmp_path):
+    from src.archive import archive_settings, open_run_archives, read_member
+    from src.batch import Run, run_folder
+
+    cfg = {
+        'main_folder': str(tmp_path / 'reports'),
+        'mainConfig': {'from': '2025-07-21 10:00:00', 'scenario': 'getById', 'type_of_script': '35rps'},
+        'archive': {'enabled': True, 'staging_dir': str(tmp_path / 'staging')},
+        'report': {'enabled': True, 'format': 'md'},
+    }
+    folder = run_folder(cfg)
+    archives = open_run_archives(cfg, [Run(cfg=cfg, folder=folder)], keep_until_close=True)
+    panel = os.path.join(folder, 'metrics', 'svc', 'cpu.png')
+    _write(panel, b'\x89PNG' + b'x' * 20)
+    archives.add(panel)
+    # Файл уже передан в архив: отчет строится до закрытия архива и должен его видеть
+    build_report(folder, report_settings(cfg))
+    path, = archives.close()
+
+    assert path.endswith(f".{archive_settings(cfg)['format']}") and not os.path.exists(folder)
+    text = read_member(path, 'report.md').decode('utf-8')
+    assert '## svc' in text and '(metrics/svc/cpu.png)' in text
+    assert read_member(path, 'metrics/svc/cpu.png') == b'\x89PNG' + b'x' * 20
+
+
+def test_rebuild_does_not_write_through_blob_links(tmp_path):
+    from src.blob_store import BlobStore
+
+    folder = _run_folder(tmp_path)
+    settings = report_settings({'report': {'thumbnail_width': 100, 'workers': 1}})
+    build_report(folder, settings)
+    # Файлы запуска после blob_store — жёсткие ссылки на общие блобы
+    BlobStore(str(tmp_path / 'blobs')).ingest_tree(folder, workers=1)
+    linked = {}
+    for root, _, names in os.walk(os.path.join(folder, 'report')):
+        for name in names:
+            path = os.path.join(root, name)
+            with open(path, 'rb') as f:
+                linked[path] = (os.stat(path).st_ino, f.read())
+
+    _write(os.path.join(folder, 'metrics', 'svc', 'heap.png'), b'\x89PNG' + b'y' * 20)
+    build_report(folder, report_settings({'report': {'thumbnail_width': 50, 'workers': 1}}))
+
+    store = BlobStore(str(tmp_path / 'blobs'))
+    for path, (inode, data) in linked.items():
+        blob = next(os.path.join(root, name) for root, _, names in os.walk(store.root) for name in names
+                    if os.stat(os.path.join(root, name)).st_ino == inode)
+        with open(blob, 'rb') as f:
+            assert f.read() == data
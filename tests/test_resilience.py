@@ -0,0 +1,43 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.resilience import CircuitBreaker, RetryBudget, is_host_failure
+
+
+def test_breaker_opens_and_half_opens():
+    breaker = CircuitBreaker('grafana', failure_threshold=2, reset_timeout=0)
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+    # reset_timeout прошёл: один пробный запрос, его сбой снова открывает breaker
+    assert breaker.allow() and breaker.state == CircuitBreaker.HALF_OPEN
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.failures == 0
+
+
+def test_open_breaker_rejects_until_reset():
+    breaker = CircuitBreaker('grafana', failure_threshold=1, reset_timeout=60)
+    breaker.record_failure()
+    assert not breaker.allow()
+    assert 0 < breaker.retry_after() <= 60
+
+
+def test_retry_budget_limits():
+    budget = RetryBudget(max_retries=2, max_seconds=10)
+    assert budget.acquire() and budget.acquire()
+    assert not budget.acquire()
+    budget.reset()
+    budget.spend(10)
+    assert not budget.acquire()
+
+
+def test_host_failure_statuses():
+    assert is_host_failure(None) and is_host_failure(503) and is_host_failure(429)
+    assert not is_host_failure(404) and not is_host_failure(200)
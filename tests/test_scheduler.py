@@ -0,0 +1,143 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.scheduler import RenderJob, RenderScheduler
+
+
+def _job(tmp_path, name, url):
+    return RenderJob(run='r', source='grafana', group='svc', name=name, url=url,
+                     headers={'Authorization': 'Bearer k'}, output_file=str(tmp_path / f"{name}.png"))
+
+
+def test_identical_renders_are_deduplicated(tmp_path):
+    calls = []
+
+    def fetch(session, job, timing):
+        calls.append(job.name)
+        with open(job.output_file, 'wb') as f:
+            f.write(b'png')
+        return True
+
+    jobs = [_job(tmp_path, 'a', 'http://g/render?x=1'), _job(tmp_path, 'b', 'http://g/render?x=1'),
+            _job(tmp_path, 'c', 'http://g/render?x=2')]
+    results = RenderScheduler(fetch, sessions=None).run(jobs)
+
+    assert len(calls) == 2
+    assert [result.ok for result in results] == [True, True, True]
+    assert results[1].deduplicated
+    assert (tmp_path / 'b.png').read_bytes() == b'png'
+    assert results[0].timing is not None and results[0].timing.queue_wait >= 0
+
+
+def test_breaker_rejects_remaining_jobs_of_failed_host(tmp_path):
+    calls = []
+
+    def fetch(session, job, timing):
+        calls.append(job.name)
+        timing.status = 503 if 'down' in job.url else 200
+        return timing.status == 200
+
+    jobs = [_job(tmp_path, f'd{i}', f'http://down/render?x={i}') for i in range(5)]
+    jobs.append(_job(tmp_path, 'up', 'http://up/render?x=1'))
+    scheduler = RenderScheduler(fetch, sessions=None, max_workers=1, retries=1, backoff_factor=0,
+                                breaker_threshold=2, breaker_reset=60, defer_open=False)
+    results = scheduler.run(jobs)
+
+    assert calls.count('up') == 1 and results[-1].ok
+    # Первая задача: попытка + повтор открывают breaker, остальные задачи хоста отклоняются без запросов
+    assert len(calls) == 3
+    assert [result.error for result in results[1:5]] == ['circuit open'] * 4
+    assert scheduler.stats.rejected == 4 and scheduler.stats.retries == 1
+
+
+def test_retry_budget_is_shared_across_run_calls(tmp_path):
+    from src.resilience import RetryBudget
+
+    def fetch(session, job, timing):
+        timing.status = 503
+        return False
+
+    scheduler = RenderScheduler(fetch, sessions=None, max_workers=1, retries=1, backoff_factor=0,
+                                retry_budget=RetryBudget(max_retries=1))
+    scheduler.run([_job(tmp_path, 'a', 'http://down/render?x=1')])
+    scheduler.run([_job(tmp_path, 'b', 'http://down/render?x=2')])
+
+    # Повторный run (fallback, повтор пустых картинок) не пополняет бюджет
+    assert scheduler.stats.retries == 1 and scheduler.retry_budget.retries == 1
+
+
+def test_priority_order_and_deadline(tmp_path):
+    import time
+
+    started = []
+
+    def fetch(session, job, timing):
+        started.append(job.name)
+        assert job.timeout <= 0.5
+        time.sleep(0.2)
+        return True
+
+    jobs = [_job(tmp_path, f'low{i}', f'http://g/render?low={i}') for i in range(4)]
+    jobs.append(_job(tmp_path, 'critical', 'http://g/render?critical=1'))
+    jobs[-1].priority = 100
+    scheduler = RenderScheduler(fetch, sessions=None, max_workers=1, deadline=0.5)
+    results = scheduler.run(jobs)
+
+    # Критичная панель идёт первой; после оценки длительности задачи, которые не успевают, не запускаются
+    assert started[0] == 'critical' and results[-1].ok
+    assert len(started) == 2
+    assert [result.error for result in results[1:4]] == ['deadline'] * 3
+    assert scheduler.stats.skipped == 3
+
+
+def test_dispatch_order_longest_first_and_balanced_hosts(tmp_path):
+    class Store:
+        durations = {'a1': 10.0, 'a2': 1.0, 'a3': 1.0, 'b1': 5.0, 'b2': 4.0}
+
+        def estimate(self, job):
+            return self.durations.get(job.name)
+
+    jobs = [_job(tmp_path, name, f'http://{name[0]}/render?{name}') for name in ('a2', 'a3', 'b2', 'a1', 'b1')]
+    scheduler = RenderScheduler(lambda *args: True, sessions=None, latency_store=Store())
+    order = scheduler.dispatch_order(jobs, [[index] for index in range(len(jobs))])
+    assert [jobs[indexes[0]].name for indexes in order] == ['a1', 'b1', 'b2', 'a2', 'a3']
+
+
+def test_missing_dashboard_layout_does_not_open_breaker(tmp_path):
+    import requests
+    from src.grafana_service import DashboardJob, _fetch_job
+
+    class Response:
+        status_code = 404
+
+        def raise_for_status(self):
+            raise requests.HTTPError('404 Not Found')
+
+    calls = []
+
+    class Session:
+        def get(self, url, **kwargs):
+            calls.append(url)
+            return Response()
+
+    class Sessions:
+        def get(self, host):
+            return Session()
+
+        def record(self, host, new_connections):
+            pass
+
+    jobs = [DashboardJob(run='r', source='grafana', group='svc', name=f'dashboard_{i}', headers={},
+                         url=f'http://grafana:3000/render/d/bad-uid-{i}/name?orgId=1&width=1000&kiosk=',
+                         output_file=str(tmp_path / 'svc' / f'_dashboard_{i}.png'), dashboard_uid=f'bad-uid-{i}',
+                         grid={'width': 1000}) for i in range(4)]
+    scheduler = RenderScheduler(_fetch_job, sessions=Sessions(), max_workers=1, retries=2, backoff_factor=0,
+                                breaker_threshold=2, breaker_reset=60, defer_open=False)
+    results = scheduler.run(jobs)
+
+    # Неверный uid дашборда — ошибка задачи: без повторов, breaker хоста остаётся закрытым
+    assert [result.error for result in results] == ['download failed'] * 4
+    assert len(calls) == 4 and scheduler.stats.retries == 0
+    assert [result.timing.status for result in results] == [404] * 4
@@ -0,0 +1,29 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.ssh_service import _get_transfer_filter, _match_transfer_rule
+
+
+def test_transfer_filter_disabled_without_rules():
+    assert _get_transfer_filter({'host': 'h'}) is None
+
+
+def test_transfer_rules_include_exclude_and_size():
+    rules = _get_transfer_filter({
+        'include': ['js/stats.json', 'js/global_stats.json', 'index.html'],
+        'exclude': ['style'],
+        'max_file_size': '1KB',
+    })
+    assert _match_transfer_rule('js/stats.json', 100, rules) is None
+    assert _match_transfer_rule('simulation.log', 100, rules) == 'include'
+    assert _match_transfer_rule('index.html', 4096, rules) == 'size'
+    assert _match_transfer_rule('style', 0, rules, is_dir=True) == 'exclude'
+    assert _match_transfer_rule('js', 0, rules, is_dir=True) is None
+
+
+def test_parse_report_start_from_folder_name():
+    from src.ssh_service import parse_report_start
+    assert parse_report_start('getbyidsimulation-20251209100339562') == 1765274619.562
+    assert parse_report_start('no-timestamp') is None
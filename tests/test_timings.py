@@ -0,0 +1,24 @@
+import os
+import sys
+import json
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.scheduler import JobResult, RenderJob
+from src.timings import RenderTiming, write_timing_report
+
+
+def test_timing_report_files(tmp_path):
+    job = RenderJob(run='r', source='grafana', group='svc', name='cpu', url='http://grafana:3000/render',
+                    headers={}, output_file='cpu.png', dashboard_uid='spring-boot-2x', panel_id=95)
+    timing = RenderTiming(queue_wait=0.5, connect=0.1, new_connections=1, ttfb=1.0, transfer=0.2,
+                          total=1.2, bytes=40000, status=200)
+    write_timing_report([JobResult(job=job, ok=True, timing=timing)], str(tmp_path))
+
+    records = json.loads((tmp_path / 'render_timings.json').read_text())
+    assert records[0]['host'] == 'grafana:3000'
+    assert records[0]['panel_id'] == 95 and records[0]['ttfb'] == 1.0
+    assert (tmp_path / 'render_timings.csv').read_text().startswith('run,source,service')
+    prom = (tmp_path / 'render_timings.prom').read_text()
+    assert ('grafana_render_duration_seconds_sum{host="grafana:3000",dashboard_uid="spring-boot-2x",'
+            'panel_id="95",service="svc"} 1.2') in prom
@@ -0,0 +1,40 @@
+import os
+import sys
+import json
+import threading
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.tracing import Tracer
+
+
+def test_spans_written_as_chrome_trace(tmp_path):
+    tracer = Tracer()
+    with tracer.span('stage.grafana'):
+        with tracer.span('render', cat='render', panel_id=95) as args:
+            args['bytes'] = 1024
+    def connect():
+        with tracer.span('ssh.connect', cat='ssh'):
+            pass
+
+    worker = threading.Thread(target=connect, name='ssh')
+    worker.start()
+    worker.join()
+
+    trace = json.loads(open(tracer.write(str(tmp_path / 'trace.json'))).read())
+    spans = [event for event in trace['traceEvents'] if event['ph'] == 'X']
+    assert [event['name'] for event in spans] == ['stage.grafana', 'render', 'ssh.connect']
+    assert spans[2]['tid'] != spans[0]['tid']
+    stage, render = spans[0], spans[1]
+    assert stage['ts'] <= render['ts'] and render['dur'] <= stage['dur']
+    assert render['args'] == {'panel_id': 95, 'bytes': 1024}
+    thread_names = {event['args']['name'] for event in trace['traceEvents'] if event['ph'] == 'M'}
+    assert 'ssh' in thread_names
+
+
+def test_disabled_tracer_records_nothing():
+    tracer = Tracer()
+    tracer.enabled = False
+    with tracer.span('stage.gatling'):
+        pass
+    assert tracer.events() == []
@@ -9,3 +9,39 @@ from src.utils import to_utc_iso
 def test_to_utc_iso_moscow():
     result = to_utc_iso('2025-07-21 15:00:00', 'Europe/Moscow')
     assert result == '2025-07-21T12:00:00Z'
+
+
+def test_parse_size_units():
+    from src.utils import parse_size
+    assert parse_size('512KB') == 512 * 1024
+    assert parse_size('1.5 MB') == int(1.5 * 1024 * 1024)
+    assert parse_size(2048) == 2048
+    assert parse_size(None) is None
+
+
+def test_rate_limit_filter_counts_suppressed_records():
+    import logging
+    from src.utils import RateLimitFilter
+
+    def record(level, msg):
+        return logging.LogRecord('panels', level, __file__, 1, msg, (), None)
+
+    rate_filter = RateLimitFilter(interval=60)
+    assert rate_filter.filter(record(logging.INFO, 'first'))
+    assert not rate_filter.filter(record(logging.INFO, 'second'))
+    assert rate_filter.filter(record(logging.WARNING, 'failed'))
+
+    rate_filter._last -= 60
+    passed = record(logging.INFO, 'third')
+    assert rate_filter.filter(passed)
+    assert passed.getMessage() == 'third (+1 похожих сообщений пропущено)'
+
+
+def test_parse_log_level_rejects_unknown_level():
+    import logging
+    import pytest
+    from src.utils import parse_log_level
+
+    assert parse_log_level('warning') == logging.WARNING
+    with pytest.raises(ValueError, match="'FOO' в logging.level"):
+        parse_log_level('FOO')
@@ -0,0 +1,22 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.watch import window_to_main_config, live_run_config
+
+
+def test_window_to_main_config_uses_timezone_and_padding():
+    window = window_to_main_config(1765274619.562, 1765278219.0, 'Europe/Moscow', padding=60)
+    assert window == {'from': '2025-12-09 13:02:39', 'to': '2025-12-09 14:04:39'}
+
+
+def test_live_run_config_follows_simulation_start():
+    cfg = {'mainConfig': {'scenario': 'getById', 'type_of_script': '35rps', 'timezone': 'Europe/Moscow',
+                          'from': '2025-01-01 00:00:00', 'to': '2025-01-01 01:00:00'},
+           'watch': {'padding': 60, 'report_timezone': 'UTC'}}
+    first = live_run_config(cfg, 'getbyidsimulation-20251209100339562', now=1765278219.0)
+    second = live_run_config(cfg, 'getbyidsimulation-20251209120000000', now=1765285000.0)
+    assert first['mainConfig']['from'] == '2025-12-09 13:02:39'
+    assert second['mainConfig']['from'] == '2025-12-09 14:59:00'
+    assert cfg['mainConfig']['from'] == '2025-01-01 00:00:00'